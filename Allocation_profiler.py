@@ -0,0 +1,181 @@
+# ============================================================
+# Opt-In Hot-Path Profiling for the Allocator
+# ============================================================
+#
+# The scoring code marks its hot sections with
+#
+#     with section("rule_c"):
+#         ...
+#
+# Without an active profiler section() returns one shared no-op
+# context manager, so the marks cost a global lookup and a function
+# call. Inside `with profiling(profiler):` every section adds its
+# perf_counter_ns time and one call to the profiler; counters track
+# volumes (e.g. officer-site pairs scored).
+#
+#     profiler = AllocationProfiler(trace=True)
+#     allocate_sites(..., profiler=profiler)
+#     print(profiler.summary().to_string(index=False))
+#     profiler.save_chrome_trace("allocation_trace.json")
+#
+# Section times are inclusive (a site's time contains its rules).
+# Worker processes of mode="parallel" are not profiled.
+# ============================================================
+
+import json
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from time import perf_counter_ns
+
+import pandas as pd
+
+# Chrome-trace events kept per run; later sections are only summed
+MAX_TRACE_EVENTS = 1_000_000
+
+_NULL_SECTION = nullcontext()
+_ACTIVE = None
+
+
+class _Section:
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, perf_counter_ns())
+        return False
+
+
+class AllocationProfiler:
+    """
+    Per-section call counts and total time, named counters and,
+    with trace=True, one Chrome-trace event per section call
+    """
+
+    def __init__(self, trace=False, max_events=MAX_TRACE_EVENTS):
+        self.calls = defaultdict(int)
+        self.total_ns = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.trace = trace
+        self.max_events = max_events
+        self.events = []
+        self.dropped_events = 0
+        self.origin_ns = perf_counter_ns()
+
+    def section(self, name):
+        return _Section(self, name)
+
+    def record(self, name, start_ns, end_ns):
+        self.calls[name] += 1
+        self.total_ns[name] += end_ns - start_ns
+        if self.trace:
+            if len(self.events) < self.max_events:
+                self.events.append(
+                    (name, start_ns, end_ns, threading.get_ident())
+                )
+            else:
+                self.dropped_events += 1
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    # ========================================================
+    # Export
+    # ========================================================
+
+    def summary(self):
+        """
+        One row per section (calls, total / mean time, share of the
+        longest section) and per counter
+        """
+        longest = max(self.total_ns.values(), default=0) or 1
+        rows = [{
+            "section": name,
+            "calls": self.calls[name],
+            "total_ms": round(total / 1e6, 3),
+            "mean_us": round(total / self.calls[name] / 1e3, 3),
+            "share": round(total / longest, 4),
+        } for name, total in self.total_ns.items()]
+        rows.sort(key=lambda row: -row["total_ms"])
+
+        rows += [{
+            "section": f"count:{name}", "calls": n, "total_ms": None,
+            "mean_us": None, "share": None,
+        } for name, n in sorted(self.counters.items())]
+        return pd.DataFrame(
+            rows, columns=["section", "calls", "total_ms", "mean_us", "share"]
+        )
+
+    def chrome_trace(self):
+        """
+        Trace Event Format dict (chrome://tracing, Perfetto)
+        """
+        pid = os.getpid()
+        events = [{
+            "name": name, "cat": "allocation", "ph": "X",
+            "ts": (start - self.origin_ns) / 1e3,
+            "dur": (end - start) / 1e3,
+            "pid": pid, "tid": tid,
+        } for name, start, end, tid in self.events]
+        events += [{
+            "name": name, "cat": "counter", "ph": "C", "ts": 0,
+            "pid": pid, "args": {name: n},
+        } for name, n in self.counters.items()]
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"dropped_events": self.dropped_events},
+        }
+
+    def save_chrome_trace(self, path):
+        if not self.trace:
+            raise ValueError("profiler was created without trace=True")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        os.replace(tmp_path, path)
+
+
+# ============================================================
+# Hot-Path Hooks
+# ============================================================
+
+def section(name):
+    """
+    Timed section of the active profiler, no-op when none is active
+    """
+    if _ACTIVE is None:
+        return _NULL_SECTION
+    return _ACTIVE.section(name)
+
+
+def count(name, n=1):
+    if _ACTIVE is not None:
+        _ACTIVE.count(name, n)
+
+
+@contextmanager
+def profiling(profiler):
+    """
+    Make profiler the active one for the block (None = leave as is)
+    """
+    global _ACTIVE
+    if profiler is None:
+        yield None
+        return
+
+    previous, _ACTIVE = _ACTIVE, profiler
+    try:
+        yield profiler
+    finally:
+        _ACTIVE = previous
@@ -0,0 +1,278 @@
+# ============================================================
+# Streaming Allocation Service
+# ============================================================
+#
+# Long-running asyncio server that keeps officers, zones and indexes
+# in memory and allocates site requests as they arrive.
+#
+# Protocol: one JSON object per line over a local TCP socket
+#
+#   {"op": "assign", "site": {...}}            -> one allocation
+#   {"op": "assign_batch", "sites": [{...}]}   -> list of allocations
+#   {"op": "submit", "site": {...}}            -> one allocation, queued
+#   {"op": "submit_batch", "sites": [{...}]}   -> list, queued
+#   {"op": "queue"}                            -> pending site count
+#   {"op": "officers"}                         -> current officer state
+#
+# A site needs property_latitude / property_longitude; request_id and
+# customer_name are echoed back as in final_site_allocation.xlsx.
+#
+# assign / assign_batch allocate at once, in the given order. submit
+# ops go through a priority heap (Site_queue: is_high_priority, then
+# sla_deadline, then arrival_time) drained one site at a time by a
+# dispatcher task that yields to the event loop between sites, so an
+# urgent site submitted while a large batch is being worked off is
+# allocated next. Replies come back once a client's sites are done.
+#
+# Every assignment is appended to a binary state log (State_log) before
+# it is answered. On restart the officer state comes back from the
+# log's latest snapshot plus the records after it, so Excel is read
+# only at startup.
+# ============================================================
+
+import asyncio
+import json
+import time
+
+from Data_loader import STRIP, read_table
+from Score_engine import SequentialAllocator
+from Site_queue import SiteQueue
+from State_log import StateLog
+from Zone_geometry import zone_polygons
+from Zone_index import ZoneIndex
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+JOURNAL_FILE = "allocation_service.log"
+
+# fsync after every request (power-loss safe, costs ~1 ms per request);
+# otherwise records are flushed to the OS and survive a process crash
+FSYNC_JOURNAL = False
+
+
+class AllocationService:
+
+    def __init__(self, officers_df, zones_df, journal_path=JOURNAL_FILE,
+                 prune=None):
+        self.officers_df = officers_df
+        zone_index = ZoneIndex.from_zones_df(zones_df)
+        self.fo_ids = officers_df["FO Id"].tolist()
+        self.fo_names = officers_df["Field officer Name"].tolist()
+        self.position = {fo_id: pos for pos, fo_id in enumerate(self.fo_ids)}
+
+        self.journal_path = journal_path
+        self.journal = StateLog(journal_path, fsync=FSYNC_JOURNAL)
+        state = self.journal.open(officers_df, zone_index, run=(["service"],))
+        self.replayed = self.journal.seq
+        self.allocator = SequentialAllocator(
+            officers_df, zone_index, prune, state=state
+        )
+
+        self.queue = SiteQueue()
+        self._pending = None
+
+    # ========================================================
+    # Persistence
+    # ========================================================
+
+    def close(self):
+        self.journal.close()
+
+    # ========================================================
+    # Allocation
+    # ========================================================
+
+    def _allocate(self, site):
+        site_lat = float(site["property_latitude"])
+        site_lon = float(site["property_longitude"])
+
+        best, best_score = self.allocator.assign(site_lat, site_lon)
+        self.journal.assign(best, site_lat, site_lon, best_score,
+                            request_id=site.get("request_id"),
+                            customer_name=site.get("customer_name"))
+
+        return {
+            "request_id": site.get("request_id"),
+            "customer_name": site.get("customer_name"),
+            "assigned_FO_Id": self.fo_ids[best],
+            "assigned_FO_Name": self.fo_names[best],
+            "site_lat": site_lat,
+            "site_lon": site_lon,
+            "final_score": round(float(best_score), 3)
+        }
+
+    def assign(self, site):
+        record = self._allocate(site)
+        self.journal.flush()
+        return record
+
+    def assign_batch(self, sites):
+        """
+        Micro-batch: sites are allocated in the given order, one
+        journal flush for the whole batch
+        """
+        records = [self._allocate(site) for site in sites]
+        self.journal.flush()
+        return records
+
+    # ========================================================
+    # Priority Queue
+    # ========================================================
+
+    async def submit(self, sites):
+        """
+        Queue sites by priority and wait until all are allocated;
+        allocations come back in the given order (needs the dispatch
+        task, which serve starts)
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        for site in sites:
+            future = loop.create_future()
+            self.queue.push(site, future)
+            futures.append(future)
+        self._wake().set()
+        return await asyncio.gather(*futures)
+
+    def _wake(self):
+        if self._pending is None:
+            self._pending = asyncio.Event()
+        return self._pending
+
+    async def dispatch(self):
+        """
+        Dispatcher task: allocate queued sites most urgent first
+        """
+        pending = self._wake()
+        while True:
+            await pending.wait()
+            while self.queue:
+                site, future = self.queue.pop()
+                if future.cancelled():
+                    # Client went away while the site was queued
+                    continue
+                try:
+                    future.set_result(self.assign(site))
+                except Exception as exc:
+                    # Fail this site only; the dispatcher keeps running
+                    future.set_exception(exc)
+                # Let newly submitted (possibly urgent) sites in
+                await asyncio.sleep(0)
+            pending.clear()
+
+    def officers(self):
+        state = self.allocator.state
+        return [
+            {
+                "FO Id": self.fo_ids[pos],
+                "Field officer Name": self.fo_names[pos],
+                "lat": float(state.lat[pos]),
+                "long": float(state.lon[pos]),
+                "Active (Y/N)": "Y" if state.idle[pos] else "N",
+            }
+            for pos in range(len(state))
+        ]
+
+    def handle(self, message):
+        """
+        Dispatch one decoded request, returns the reply object
+        """
+        start = time.perf_counter()
+        op = message.get("op")
+
+        if op == "assign":
+            reply = {"allocation": self.assign(message["site"])}
+        elif op == "assign_batch":
+            reply = {"allocations": self.assign_batch(message["sites"])}
+        elif op == "officers":
+            reply = {"officers": self.officers()}
+        elif op == "queue":
+            reply = {"pending": len(self.queue)}
+        else:
+            raise ValueError(f"Unknown op: {op}")
+
+        reply["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return reply
+
+    async def handle_queued(self, message):
+        """
+        submit / submit_batch: reply once the sites are allocated
+        (elapsed_ms includes the time spent waiting in the queue)
+        """
+        start = time.perf_counter()
+        if message["op"] == "submit":
+            reply = {"allocation": (await self.submit([message["site"]]))[0]}
+        else:
+            reply = {"allocations": await self.submit(message["sites"])}
+
+        reply["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return reply
+
+    # ========================================================
+    # Local API
+    # ========================================================
+
+    async def serve_client(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    message = json.loads(line)
+                    if message.get("op") in ("submit", "submit_batch"):
+                        reply = await self.handle_queued(message)
+                    else:
+                        reply = self.handle(message)
+                except Exception as exc:
+                    reply = {"error": f"{type(exc).__name__}: {exc}"}
+                writer.write((json.dumps(reply, default=str) + "\n").encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(service, host=HOST, port=PORT):
+    dispatcher = asyncio.create_task(service.dispatch())
+    server = await asyncio.start_server(service.serve_client, host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        dispatcher.cancel()
+
+
+async def send(message, host=HOST, port=PORT):
+    """
+    Minimal client: send one request, return the decoded reply
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write((json.dumps(message, default=str) + "\n").encode())
+    await writer.drain()
+    reply = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return reply
+
+
+# ============================================================
+# Main Execution
+# ============================================================
+
+if __name__ == "__main__":
+
+    ZONE_FILE =    r"C:\Users\Dell\Pictures\zone.xlsx"
+    OFFICER_FILE = r"C:\Users\Dell\Pictures\off.xlsx"
+
+    officers_df = read_table(OFFICER_FILE, columns=STRIP)
+    zones_df = read_table(ZONE_FILE)
+    zones_df["polygon"] = zone_polygons(zones_df)
+
+    service = AllocationService(officers_df, zones_df)
+    print(f"✅ Allocation service on {HOST}:{PORT} "
+          f"({service.replayed} journaled assignments replayed)")
+
+    try:
+        asyncio.run(serve(service))
+    finally:
+        service.close()
@@ -0,0 +1,268 @@
+# ============================================================
+# Global Batch Assignment (Min-Cost Flow with Capacities)
+# ============================================================
+
+import time
+
+import numpy as np
+import pandas as pd
+from ortools.graph.python import min_cost_flow
+
+from Geo_distance import geodesic_km
+from Officer_state import OfficerStateCache, officer_capacities
+from Score_engine import allocate_sites_vectorized, score_matrix
+from Zone_index import ZoneIndex
+
+# Flow costs are integers: scores are scaled to micro-points
+SCORE_SCALE = 10 ** 6
+
+# Highest possible Rule A-D score (0.3 + 0.4 + 0.4 + 0.2)
+MAX_SCORE = 1.3
+
+# ============================================================
+# Helper Functions
+# ============================================================
+
+def best_per_site(scores, dists):
+    """
+    Unlimited capacity: every site simply takes its best officer
+    (nearest on ties, as in the greedy allocator)
+    """
+    row_max = scores.max(axis=1, keepdims=True)
+    return np.argmin(np.where(scores == row_max, dists, np.inf), axis=1)
+
+
+def solve_assignment(scores, dists, officer_class, capacities):
+    """
+    Maximum total score assignment of sites (rows) to officers (columns),
+    each site at most once, officer j at most capacities[j] sites.
+
+    Solved exactly as a min-cost flow:
+
+        source -> site -> officer            (officer within 10 km)
+        source -> site -> class -> officer   (any officer of the class)
+        officer -> sink (capacity), site -> sink (left unassigned)
+
+    Leaving a site unassigned costs more than the score of every site
+    put together, so the flow covers as many sites as capacity allows
+    and maximises the score among those; a site that scores 0 for
+    everyone is still assigned while some officer has room.
+
+    Beyond 10 km Rule C is zero, so an officer's score only depends on
+    its class (current zone, idle flag) and every far officer of a class
+    is interchangeable. Class arcs carry that far score, which is never
+    more than the officer's real score, so the optimum is unchanged
+    while the graph only needs explicit arcs for nearby officers.
+
+    Returns officer position per site, -1 for unassigned sites.
+    """
+    n_sites, n_officers = scores.shape
+    n_classes = officer_class.max() + 1 if n_officers else 0
+
+    # Far score of each class = real score of any member minus Rule C
+    rep = np.array([np.flatnonzero(officer_class == c)[0]
+                    for c in range(n_classes)], dtype=np.int64)
+    rep_dists = dists[:, rep]
+    far_scores = scores[:, rep] - np.where(
+        rep_dists <= 10, 0.4 - rep_dists * 0.04, 0.0
+    )
+
+    near_site, near_officer = np.nonzero(dists < 10)
+
+    source = 0
+    site_node = 1 + np.arange(n_sites)
+    class_node = 1 + n_sites + np.arange(n_classes)
+    officer_node = 1 + n_sites + n_classes + np.arange(n_officers)
+    sink = 1 + n_sites + n_classes + n_officers
+    unassigned_cost = int(np.ceil(MAX_SCORE * SCORE_SCALE)) * n_sites + 1
+
+    arcs = [
+        # (tail, head, capacity, unit cost)
+        (np.full(n_sites, source), site_node, 1, 0),
+        (site_node[near_site], officer_node[near_officer], 1,
+         -np.round(scores[near_site, near_officer] * SCORE_SCALE)),
+        (np.repeat(site_node, n_classes), np.tile(class_node, n_sites), 1,
+         -np.round(far_scores.ravel() * SCORE_SCALE)),
+        (class_node[officer_class], officer_node, capacities, 0),
+        (officer_node, np.full(n_officers, sink), capacities, 0),
+        (site_node, np.full(n_sites, sink), 1, unassigned_cost),
+    ]
+
+    tails, heads, caps, costs = [], [], [], []
+    for tail, head, cap, cost in arcs:
+        tails.append(tail)
+        heads.append(head)
+        caps.append(np.broadcast_to(cap, tail.shape))
+        costs.append(np.broadcast_to(cost, tail.shape))
+
+    flow = min_cost_flow.SimpleMinCostFlow()
+    arc_ids = flow.add_arcs_with_capacity_and_unit_cost(
+        np.concatenate(tails).astype(np.int64),
+        np.concatenate(heads).astype(np.int64),
+        np.concatenate(caps).astype(np.int64),
+        np.concatenate(costs).astype(np.int64),
+    )
+    supplies = np.zeros(sink + 1, dtype=np.int64)
+    supplies[source], supplies[sink] = n_sites, -n_sites
+    flow.set_nodes_supplies(np.arange(sink + 1), supplies)
+
+    status = flow.solve()
+    if status != flow.OPTIMAL:
+        raise RuntimeError(f"Batch assignment failed: {status}")
+
+    flows = flow.flows(arc_ids)
+    sizes = np.cumsum([0] + [len(t) for t in tails])
+    near_flow = flows[sizes[1]:sizes[2]]
+    class_flow = flows[sizes[2]:sizes[3]].reshape(n_sites, n_classes)
+    member_flow = flows[sizes[3]:sizes[4]]
+
+    assigned = np.full(n_sites, -1, dtype=np.int64)
+    used = near_flow > 0
+    assigned[near_site[used]] = near_officer[used]
+
+    # Hand class-routed sites to the members the flow sent them to
+    for c in range(n_classes):
+        routed_sites = np.flatnonzero(class_flow[:, c])
+        members = np.flatnonzero(officer_class == c)
+        assigned[routed_sites] = np.repeat(members, member_flow[members])
+
+    if capacities.sum() >= n_sites and (assigned < 0).any():
+        raise RuntimeError(
+            f"Batch assignment left {(assigned < 0).sum()} sites "
+            f"unassigned with capacity for all {n_sites}"
+        )
+    return assigned
+
+
+# ============================================================
+# Allocation Engine
+# ============================================================
+
+def allocate_sites_batch(officers_df, sites_df, zones_df, capacity=None,
+                         distance=None):
+    """
+    Allocate all sites at once to maximise the total Rule A-D score,
+    independent of the row order of the sites table.
+
+    Officers are scored from their current location and status (no
+    sequential moves inside a batch). Afterwards, as in the greedy
+    modes, every assigned officer stands at its last site in table
+    order and is marked busy. Sites that no officer has capacity for
+    are returned with an empty assigned_FO_Id.
+    distance: Rule C distance function, None = geodesic
+    """
+    zone_index = ZoneIndex.from_zones_df(zones_df)
+    state = OfficerStateCache(officers_df, zone_index)
+
+    site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+    site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+    scores, dists = score_matrix(
+        site_lat, site_lon, state, zone_index,
+        distance_km=distance or geodesic_km
+    )
+
+    capacities = officer_capacities(officers_df, capacity)
+    if capacities is None:
+        assigned = best_per_site(scores, dists)
+    else:
+        _, officer_class = np.unique(
+            np.stack([state.zone, state.idle]), axis=1, return_inverse=True
+        )
+        assigned = solve_assignment(
+            scores, dists, officer_class.ravel(), capacities
+        )
+
+    done = assigned >= 0
+    pos = np.where(done, assigned, 0)
+    site_rows = np.arange(len(sites_df))
+
+    allocation_df = pd.DataFrame({
+        "request_id": sites_df["request_id"].to_numpy(),
+        "customer_name": sites_df["customer_name"].to_numpy(),
+        "assigned_FO_Id": np.where(
+            done, officers_df["FO Id"].to_numpy(dtype=object)[pos], None
+        ),
+        "assigned_FO_Name": np.where(
+            done,
+            officers_df["Field officer Name"].to_numpy(dtype=object)[pos],
+            None
+        ),
+        "site_lat": site_lat,
+        "site_lon": site_lon,
+        "final_score": np.where(
+            done, np.round(scores[site_rows, pos], 3), np.nan
+        ),
+    })
+
+    # Last site of every assigned officer in table order
+    done_rows = np.flatnonzero(done)[::-1]
+    busy, last = np.unique(assigned[done_rows], return_index=True)
+    state.lat[busy] = site_lat[done_rows[last]]
+    state.lon[busy] = site_lon[done_rows[last]]
+    state.idle[busy] = False
+
+    return allocation_df, state.write_back(officers_df)
+
+
+# ============================================================
+# Batch vs Greedy Report
+# ============================================================
+
+def compare_with_greedy(officers_df, sites_df, zones_df, capacity=None):
+    """
+    Run the greedy and the batch allocator on the same input and
+    report total scores, coverage, officer load and runtime.
+
+    total_score   : sum of final_score as each allocator reports it
+                    (greedy scores officers after their earlier moves)
+    static_score  : both assignments re-scored against the starting
+                    officer state, i.e. the objective the batch solver
+                    maximises
+    """
+    zone_index = ZoneIndex.from_zones_df(zones_df)
+    state = OfficerStateCache(officers_df, zone_index)
+    scores, _ = score_matrix(
+        sites_df["property_latitude"].to_numpy(dtype=np.float64),
+        sites_df["property_longitude"].to_numpy(dtype=np.float64),
+        state, zone_index
+    )
+    capacities = officer_capacities(officers_df, capacity)
+    position = pd.Series(np.arange(len(officers_df)),
+                         index=officers_df["FO Id"])
+
+    runs = {}
+    start = time.perf_counter()
+    runs["greedy"] = allocate_sites_vectorized(
+        officers_df.copy(), sites_df, zones_df
+    )[0]
+    runs["greedy_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    runs["batch"] = allocate_sites_batch(
+        officers_df.copy(), sites_df, zones_df, capacity
+    )[0]
+    runs["batch_seconds"] = time.perf_counter() - start
+
+    report = []
+    for method in ("greedy", "batch"):
+        alloc = runs[method]
+        done = alloc["assigned_FO_Id"].notna().to_numpy()
+        pos = position.reindex(alloc["assigned_FO_Id"][done]).to_numpy()
+        load = np.bincount(pos, minlength=len(officers_df))
+
+        report.append({
+            "method": method,
+            "sites_assigned": int(done.sum()),
+            "sites_unassigned": int((~done).sum()),
+            "total_score": round(float(alloc["final_score"].sum()), 3),
+            "static_score": round(
+                float(scores[np.flatnonzero(done), pos].sum()), 3
+            ),
+            "max_officer_load": int(load.max()) if len(load) else 0,
+            "officers_over_capacity":
+                int((load > capacities).sum())
+                if capacities is not None else 0,
+            "seconds": round(runs[f"{method}_seconds"], 3),
+        })
+
+    return pd.DataFrame(report)
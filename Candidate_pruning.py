@@ -0,0 +1,157 @@
+# ============================================================
+# Exact Candidate Pruning with a k-d Tree
+# ============================================================
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from Allocation_profiler import section
+from Geo_distance import geodesic_km
+from Score_engine import pick_best, score_site
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Rules C and D only add score within this radius
+RULE_RADIUS_KM = 10.0
+
+# Spherical vs WGS-84 distances differ by < 0.5 %; querying 1 % wider
+# guarantees every officer left out is more than RULE_RADIUS_KM away
+SPHERE_MARGIN = 1.01
+
+# Rebuild the tree once this many officers moved since the last build
+REBUILD_EVERY = 64
+
+
+def unit_vectors(lat, lon):
+    """
+    Points on the unit sphere, so chord length bounds great-circle distance
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    return np.column_stack([
+        np.cos(lat) * np.cos(lon),
+        np.cos(lat) * np.sin(lon),
+        np.sin(lat),
+    ])
+
+
+class OfficerPruner:
+    """
+    Scores a site only against the officers near it, with a proof that
+    nobody it skipped could have won.
+
+    Officers outside the query ball are > 10 km from the site, so their
+    Rule C term is zero and their score depends only on their group
+    (current zone, idle flag). The best score any skipped officer could
+    reach is the best group bound; if the nearby winner beats it (or
+    ties it while being nearer than 10 km) the result equals a full
+    scan. Otherwise the members of every group that could still win are
+    scored exactly as well.
+
+    Officers that moved since the tree was built are always scored, and
+    the tree is rebuilt every REBUILD_EVERY moves.
+
+    distance_km must never be shorter than the geodesic (road
+    distances are not), so officers outside the ball stay > 10 km.
+    """
+
+    def __init__(self, state, radius_km=RULE_RADIUS_KM,
+                 distance_km=geodesic_km):
+        self.state = state
+        self.distance_km = distance_km
+        self.radius_km = radius_km
+        angle = radius_km * SPHERE_MARGIN / EARTH_RADIUS_KM
+        self.chord = 2 * np.sin(angle / 2)
+
+        # group = (zone + 1) * 2 + idle, zone -1 (outside) -> 0
+        self.n_groups = (len(state.zone_index) + 1) * 2
+        self.groups = [set() for _ in range(self.n_groups)]
+        for pos, g in enumerate(self._group(np.arange(len(state)))):
+            self.groups[g].add(pos)
+
+        self._build_tree()
+
+    def _group(self, pos):
+        return (self.state.zone[pos] + 1) * 2 + self.state.idle[pos]
+
+    def _build_tree(self):
+        self.tree = cKDTree(unit_vectors(self.state.lat, self.state.lon))
+        self.moved = set()
+
+    def group_bounds(self, in_zone, exit_km):
+        """
+        Score of an officer of each group that is > 10 km from the site,
+        summed in score_site order so it compares exactly
+        """
+        rule_b = np.where(in_zone, 0.4, 0.0)
+        rule_d = np.where(exit_km <= 10, 0.2 - exit_km * 0.02, 0.0)
+        bounds = np.stack([
+            (0.0 + rule_b) + 0.0 + rule_d,
+            (0.3 + rule_b) + 0.0 + rule_d,
+        ], axis=1)
+        # Trailing zone-term row is the "outside every zone" group 0
+        return np.roll(bounds, 1, axis=0).ravel()
+
+    def _score(self, pos, site_lat, site_lon, in_zone, exit_km):
+        state = self.state
+        return score_site(
+            site_lat, site_lon, state.lat[pos], state.lon[pos],
+            state.idle[pos], state.zone[pos], in_zone, exit_km,
+            self.distance_km
+        )
+
+    def best_officer(self, site_lat, site_lon, in_zone, exit_km):
+        """
+        (position, score, distance) of the officer a full scan would pick
+        """
+        with section("candidate_search"):
+            near = self.tree.query_ball_point(
+                unit_vectors(site_lat, site_lon)[0], self.chord
+            )
+        cand = np.union1d(
+            np.asarray(near, dtype=np.int64),
+            np.fromiter(self.moved, dtype=np.int64, count=len(self.moved))
+        )
+
+        skipped = np.bincount(
+            self._group(cand), minlength=self.n_groups
+        ) < np.array([len(g) for g in self.groups])
+        bounds = self.group_bounds(in_zone, exit_km)
+
+        if len(cand):
+            scores, dists = self._score(
+                cand, site_lat, site_lon, in_zone, exit_km
+            )
+            best = pick_best(scores, dists)
+            best_score, best_dist = scores[best], dists[best]
+
+            bound = bounds[skipped].max() if skipped.any() else -np.inf
+            if best_score > bound or (
+                best_score == bound and best_dist <= self.radius_km
+            ):
+                return cand[best], best_score, best_dist
+        else:
+            best_score = -np.inf
+
+        # Some skipped group could still win: score its members exactly
+        contenders = [
+            np.fromiter(self.groups[g], dtype=np.int64)
+            for g in np.flatnonzero(skipped & (bounds >= best_score))
+        ]
+        cand = np.union1d(cand, np.concatenate(contenders))
+        scores, dists = self._score(cand, site_lat, site_lon, in_zone, exit_km)
+        best = pick_best(scores, dists)
+        return cand[best], scores[best], dists[best]
+
+    def move(self, pos, lat, lon):
+        """
+        Relocate officer pos (see OfficerStateCache.move) and keep the
+        group sets and the tree in sync
+        """
+        self.groups[self._group(pos)].discard(pos)
+        self.state.move(pos, lat, lon)
+        self.groups[self._group(pos)].add(pos)
+
+        self.moved.add(pos)
+        if len(self.moved) >= REBUILD_EVERY:
+            self._build_tree()
@@ -0,0 +1,180 @@
+# ============================================================
+# Cached Excel Loading
+# ============================================================
+#
+# read_table parses a workbook sheet once, normalises it and keeps a
+# Parquet copy next to a small JSON stamp (mtime, size, SHA-256 of
+# the workbook). Later reads load the Parquet file unless the
+# workbook changed. Without pyarrow the sheet is read from Excel
+# every time.
+# ============================================================
+
+import hashlib
+import json
+import os
+import re
+
+import pandas as pd
+
+CACHE_DIR = ".data_cache"
+
+# Column name normalisation
+CLEAN = "clean"    # lower case, no whitespace (mapping scripts)
+STRIP = "strip"    # original case, outer whitespace removed (allocator)
+COLUMN_MODES = (CLEAN, STRIP)
+
+# Bump when the normalisation changes, so old caches are rebuilt
+CACHE_VERSION = 2
+
+# lat / long / lon with an optional vertex number, or a *latitude /
+# *longitude name
+COORDINATE_COLUMN = re.compile(r"^(lat|long?)\d*$|(latitude|longitude)$")
+
+HASH_BLOCK = 1 << 20
+
+# ============================================================
+# Normalisation
+# ============================================================
+
+def clean_columns(columns, mode=CLEAN):
+    """
+    Excel-safe column names: drop the _x000D_ carriage return escapes
+    openpyxl leaves in header cells, then
+    CLEAN : lower case with all whitespace removed
+    STRIP : outer whitespace removed, case kept ("FO Id")
+    """
+    columns = (
+        pd.Index(columns).astype(str)
+        .str.replace(r"(?i)_x000d_", "", regex=True)
+    )
+    if mode == CLEAN:
+        return columns.str.lower().str.replace(r"\s+", "", regex=True)
+    if mode == STRIP:
+        return columns.str.strip()
+    raise ValueError(f"Unknown column mode: {mode}")
+
+
+def is_coordinate_column(name):
+    """
+    lat1 / long1 ..., lat / long, property_latitude / property_longitude
+    """
+    return COORDINATE_COLUMN.search(name.lower()) is not None
+
+
+def normalise(df, mode=CLEAN):
+    """
+    Cleaned column names, float lat/long columns (bad cells -> NaN)
+    and mixed-type text columns turned into strings so the frame
+    stores as Parquet
+    """
+    df = df.copy()
+    df.columns = clean_columns(df.columns, mode)
+
+    for col in df.columns:
+        if is_coordinate_column(col):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        elif df[col].dtype == object:
+            values = df[col].dropna()
+            if values.map(type).nunique() > 1:
+                df[col] = df[col].map(
+                    lambda v: v if pd.isna(v) else str(v)
+                )
+
+    return df
+
+
+# ============================================================
+# Cache
+# ============================================================
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_paths(path, sheet_name, mode, cache_dir):
+    """
+    Cache files named by the file stem plus a hash of the resolved
+    path, so same-named workbooks in different folders do not collide
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    source = hashlib.sha256(os.path.realpath(path).encode()).hexdigest()
+    name = f"{stem}.{source[:12]}.{sheet_name}.{mode}"
+    return (os.path.join(cache_dir, name + ".parquet"),
+            os.path.join(cache_dir, name + ".json"))
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return {
+        "source": os.path.abspath(path),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "version": CACHE_VERSION,
+    }
+
+
+def _cache_valid(path, stamp_path, stamp):
+    """
+    Same mtime and size: valid without hashing. Otherwise the
+    workbook is hashed, and a touched but unchanged file keeps its
+    cache (the stamp is refreshed).
+    """
+    if not os.path.exists(stamp_path):
+        return False
+    with open(stamp_path, encoding="utf-8") as f:
+        cached = json.load(f)
+
+    if any(cached.get(key) != stamp[key]
+           for key in ("source", "version")):
+        return False
+    if (cached.get("mtime_ns") == stamp["mtime_ns"]
+            and cached.get("size") == stamp["size"]):
+        return True
+
+    if cached.get("sha256") != file_hash(path):
+        return False
+    _write_stamp(stamp_path, dict(stamp, sha256=cached["sha256"]))
+    return True
+
+
+def _write_stamp(stamp_path, stamp):
+    tmp_path = stamp_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stamp, f)
+    os.replace(tmp_path, stamp_path)
+
+
+def read_table(path, sheet_name=0, columns=CLEAN, cache_dir=CACHE_DIR):
+    """
+    Normalised DataFrame of one workbook sheet, served from the
+    Parquet cache when the workbook is unchanged.
+    columns: CLEAN or STRIP column name normalisation
+    """
+    if columns not in COLUMN_MODES:
+        raise ValueError(f"Unknown column mode: {columns}")
+
+    data_path, stamp_path = _cache_paths(path, sheet_name, columns, cache_dir)
+    stamp = _stamp(path)
+
+    if os.path.exists(data_path) and _cache_valid(path, stamp_path, stamp):
+        try:
+            return pd.read_parquet(data_path)
+        except ImportError:
+            pass
+
+    df = normalise(pd.read_excel(path, sheet_name=sheet_name), columns)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_parquet(data_path + ".tmp", index=False)
+    except ImportError:
+        # No Parquet engine installed: serve the sheet uncached
+        return df
+    os.replace(data_path + ".tmp", data_path)
+    _write_stamp(stamp_path, dict(stamp, sha256=file_hash(path)))
+
+    return df
@@ -0,0 +1,159 @@
+# ============================================================
+# Exact Distance Memoization
+# ============================================================
+#
+# Sites cluster (apartment blocks, repeat addresses) and officers move
+# onto site coordinates, so the allocator keeps asking for the same
+# officer -> site distances.
+#
+# DistanceMemo puts an LRU cache in front of an expensive Rule C
+# distance function, such as a Road_distance.RoadNetwork, where every
+# call snaps both ends to the graph before its own node matrix lookup.
+# Keys are the exact coordinates, so results are identical to the
+# wrapped function. Geodesic distances are cheaper to recompute than
+# to look up; the memo is not meant for them.
+#
+#     memo = DistanceMemo(RoadNetwork.from_osm("city.osm.pbf"))
+#     allocate_sites(..., distance=memo)
+#     print(memo.stats())
+# ============================================================
+
+from collections import OrderedDict
+
+import numpy as np
+
+# Default memory cap of the cache
+MAX_BYTES = 64 * 2 ** 20
+
+# Estimated bookkeeping per entry (OrderedDict node, key tuple, ints,
+# float box); array values add their nbytes
+ENTRY_OVERHEAD_BYTES = 200
+
+_MISSING = object()
+
+
+# ============================================================
+# LRU Cache
+# ============================================================
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by an estimated memory size,
+    with hit / miss / eviction counters
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, nbytes=0):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        size = ENTRY_OVERHEAD_BYTES + nbytes
+        if size > self.max_bytes:
+            return
+
+        self.entries[key] = (value, size)
+        self.nbytes += size
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.nbytes -= evicted
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / calls if calls else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# ============================================================
+# Distance Memo
+# ============================================================
+
+class DistanceMemo:
+    """
+    Memoized Rule C distance function, broadcasting like
+    Geo_distance.geodesic_km.
+
+    distance_km: wrapped distance function (e.g. a
+    Road_distance.RoadNetwork); max_bytes: memory cap of the cache
+    """
+
+    def __init__(self, distance_km, max_bytes=MAX_BYTES):
+        self.distance_km = distance_km
+        self.pairs = LRUCache(max_bytes)
+
+    def __call__(self, lat1, lon1, lat2, lon2):
+        lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+            np.asarray(lat1, dtype=np.float64),
+            np.asarray(lon1, dtype=np.float64),
+            np.asarray(lat2, dtype=np.float64),
+            np.asarray(lon2, dtype=np.float64),
+        )
+        coords = np.column_stack(
+            [a.ravel() for a in (lat1, lon1, lat2, lon2)]
+        )
+        km = np.full(len(coords), np.nan, dtype=np.float64)
+
+        valid = np.flatnonzero(np.isfinite(coords).all(axis=1))
+        if not len(valid):
+            return km.reshape(lat1.shape)
+
+        # Each distinct pair is looked up once per call, keyed by the
+        # bit patterns of its four coordinates
+        pairs, inverse = np.unique(
+            coords[valid].view(np.int64), axis=0, return_inverse=True
+        )
+        pair_km = np.fromiter(
+            (self.pairs.get(pair, np.nan)
+             for pair in map(tuple, pairs.tolist())),
+            dtype=np.float64, count=len(pairs)
+        )
+
+        missing = np.flatnonzero(np.isnan(pair_km))
+        if len(missing):
+            lat_a, lon_a, lat_b, lon_b = pairs[missing].view(np.float64).T
+            pair_km[missing] = self.distance_km(lat_a, lon_a, lat_b, lon_b)
+            for pair, value in zip(map(tuple, pairs[missing].tolist()),
+                                   pair_km[missing].tolist()):
+                self.pairs.put(pair, value)
+
+        km[valid] = pair_km[inverse.ravel()]
+        return km.reshape(lat1.shape)
+
+    def stats(self):
+        """
+        Hit / miss counters of the cache, for tuning max_bytes
+        """
+        return {"distance": self.pairs.stats()}
+
+    def clear(self):
+        self.pairs.clear()
@@ -1,9 +1,17 @@
-import pandas as pd
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import folium
-from shapely.geometry import Polygon, Point, LineString
+import numpy as np
+import pandas as pd
+from shapely.geometry import LineString
 from shapely.ops import split
 from folium.features import DivIcon
 
+from Data_loader import read_table
+from Zone_geometry import zone_polygons
+from Zone_index import ZoneIndex
+
 # ===============================
 # FILE PATHS
 # ===============================
@@ -11,186 +19,287 @@ ZONE_FILE = "Data_Zone-2.xlsx"
 SITE_FILE = "Property_la_lo.xlsx"
 OFFICER_FILE = "officer.xlsx"
 
-TARGET_ZONE = "Z7"   # zone id as string
+# Inner / outer sub-zones (+ unsplit zones), loadable as a zone table
+SUB_ZONE_FILE = "sub_zones.xlsx"
+SPLIT_ERRORS_SHEET = "split_errors"
+MAP_FILE = "zones_inner_outer_with_split_point.html"
 
-# ===============================
-# READ DATA
-# ===============================
-zones_df = pd.read_excel(ZONE_FILE)
-sites_df = pd.read_excel(SITE_FILE)
-officers_df = pd.read_excel(OFFICER_FILE)
+# Split line runs P<SPLIT_FROM> → split point → P<SPLIT_TO>
+SPLIT_FROM = 3
+SPLIT_TO = 6
 
-zones_df.columns = zones_df.columns.str.strip().str.lower()
-sites_df.columns = sites_df.columns.str.strip().str.lower()
-officers_df.columns = officers_df.columns.str.strip().str.lower()
+WORKERS = None   # split processes, None = all cores
 
 # ===============================
-# DETECT LAT/LONG COLUMNS
-# ===============================
-lat_cols = sorted([c for c in zones_df.columns if c.startswith("lat")],
-                  key=lambda x: int(x.replace("lat", "")))
-lon_cols = sorted([c for c in zones_df.columns if c.startswith("long")],
-                  key=lambda x: int(x.replace("long", "")))
-
-# ===============================
-# GET ZONE 7 ROW
-# ===============================
-zones_df["zone"] = zones_df["zone"].astype(str).str.strip()
-zone_df = zones_df[zones_df["zone"] == TARGET_ZONE]
-
-if zone_df.empty:
-    raise Exception(f"Zone {TARGET_ZONE} not found")
-
-row = zone_df.iloc[0]
-
-# ===============================
-# BUILD ZONE POLYGON
-# ===============================
-coords = []
-for lat_c, lon_c in zip(lat_cols, lon_cols):
-    if pd.notna(row[lat_c]) and pd.notna(row[lon_c]):
-        coords.append((row[lon_c], row[lat_c]))
-
-zone_polygon = Polygon(coords)
-
-# ===============================
-# SPLIT LINE: P3 → SPLIT → P6
-# ===============================
-p3 = (row["long3"], row["lat3"])
-split_pt = (row["split_long"], row["split_lat"])
-p6 = (row["long6"], row["lat6"])
-
-cut_line = LineString([p3, split_pt, p6])
-
+# SPLIT ONE ZONE
 # ===============================
-# SPLIT POLYGON
-# ===============================
-result = split(zone_polygon, cut_line)
-
-if len(result.geoms) != 2:
-    raise Exception("Zone split failed – check split point location")
-
-poly1, poly2 = result.geoms
-
-# ===============================
-# INNER / OUTER DECISION
-# ===============================
-if poly1.area < poly2.area:
-    inner_poly, outer_poly = poly1, poly2
-else:
-    inner_poly, outer_poly = poly2, poly1
+def split_zone(polygon, cut_coords):
+    """
+    Split a zone polygon along the cut line.
+    Returns (inner, outer) polygons, the smaller one is inner.
+    """
+    result = split(polygon, LineString(cut_coords))
+
+    if len(result.geoms) != 2:
+        raise ValueError(
+            f"split gave {len(result.geoms)} parts – check split point location"
+        )
 
-# ===============================
-# MAP CENTER
-# ===============================
-center_lat = sum([p[1] for p in coords]) / len(coords)
-center_lon = sum([p[0] for p in coords]) / len(coords)
+    poly1, poly2 = result.geoms
+    if poly1.area < poly2.area:
+        return poly1, poly2
+    return poly2, poly1
 
-m = folium.Map(location=[center_lat, center_lon], zoom_start=13)
 
-zone_layer = folium.FeatureGroup(name="Zone 7 (Inner / Outer)")
-site_layer = folium.FeatureGroup(name="Sites")
-officer_layer = folium.FeatureGroup(name="Officers")
+def _split_job(job):
+    """
+    Pool worker: (zone, inner, outer, None) or (zone, None, None, error)
+    so one bad zone does not stop the batch
+    """
+    zone, polygon, cut_coords = job
+    try:
+        inner, outer = split_zone(polygon, cut_coords)
+        return zone, inner, outer, None
+    except Exception as exc:
+        return zone, None, None, f"{type(exc).__name__}: {exc}"
 
-# ===============================
-# DRAW INNER ZONE
-# ===============================
-folium.Polygon(
-    locations=[[lat, lon] for lon, lat in inner_poly.exterior.coords],
-    color="green",
-    fill=True,
-    fill_opacity=0.5,
-    tooltip="Zone 7 - INNER"
-).add_to(zone_layer)
 
 # ===============================
-# DRAW OUTER ZONE
+# SPLIT EVERY ZONE
 # ===============================
-folium.Polygon(
-    locations=[[lat, lon] for lon, lat in outer_poly.exterior.coords],
-    color="orange",
-    fill=True,
-    fill_opacity=0.4,
-    tooltip="Zone 7 - OUTER"
-).add_to(zone_layer)
+def split_jobs(zones_df, polygons):
+    """
+    One job per zone with a split point filled in
+    """
+    cols = [f"long{SPLIT_FROM}", f"lat{SPLIT_FROM}", "split_long",
+            "split_lat", f"long{SPLIT_TO}", f"lat{SPLIT_TO}"]
+    missing = [c for c in cols if c not in zones_df.columns]
+    if missing:
+        raise ValueError(f"Missing split columns: {missing}")
+
+    points = zones_df[cols].to_numpy(dtype=np.float64).reshape(-1, 3, 2)
+    has_split = zones_df[["split_lat", "split_long"]].notna().all(axis=1)
+
+    return [
+        (zone, polygon, points[i])
+        for i, (zone, polygon) in enumerate(zip(zones_df["zone"], polygons))
+        if has_split.iat[i]
+    ]
+
+
+def split_all_zones(zones_df, polygons, workers=WORKERS):
+    """
+    Split every zone that has split_lat / split_long on a process pool.
+    Returns {zone: (inner, outer)} and {zone: error message}.
+    """
+    jobs = split_jobs(zones_df, polygons)
+
+    # Zones without a polygon fail up front, no need to ship them
+    errors = {zone: "fewer than 3 vertices"
+              for zone, polygon, _ in jobs if polygon is None}
+    jobs = [job for job in jobs if job[1] is not None]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_split_job, jobs, chunksize=16))
+
+    splits = {}
+    for zone, inner, outer, error in results:
+        if error is None:
+            splits[zone] = (inner, outer)
+        else:
+            errors[zone] = error
+    return splits, errors
 
-# ===============================
-# DRAW SPLIT LINE (NO POINT MARKER)
-# ===============================
-folium.PolyLine(
-    locations=[
-        [row["lat3"], row["long3"]],
-        [row["split_lat"], row["split_long"]],
-        [row["lat6"], row["long6"]],
-    ],
-    color="red",
-    weight=3,
-    dash_array="5,5",
-    tooltip="Zone Split Line"
-).add_to(zone_layer)
 
 # ===============================
-# ADD SITES
+# SUB-ZONE TABLE
 # ===============================
-for _, s in sites_df.iterrows():
-    pt = Point(s["property_longitude"], s["property_latitude"])
-
-    if inner_poly.contains(pt) or inner_poly.touches(pt):
-        color = "blue"
-    elif outer_poly.contains(pt) or outer_poly.touches(pt):
-        color = "black"
-    else:
-        continue
-
-    folium.CircleMarker(
-        location=[s["property_latitude"], s["property_longitude"]],
-        radius=6,
-        color=color,
-        fill=True,
-        fill_color=color
-    ).add_to(site_layer)
-
-    folium.Marker(
-        location=[s["property_latitude"], s["property_longitude"]],
-        icon=DivIcon(
-            html=f"""
-            <div style="font-size:10px;font-weight:bold;color:{color}">
-            {s['property_id']}
-            </div>
-            """
-        )
-    ).add_to(site_layer)
+def sub_zone_table(zones_df, polygons, splits):
+    """
+    Zone table in the lat{i} / long{i} layout the allocator reads:
+    split zones become "<zone>_IN" / "<zone>_OUT", the rest stay whole
+    """
+    rows = []
+    for zone, polygon in zip(zones_df["zone"], polygons):
+        if polygon is None:
+            continue
+        if zone in splits:
+            parts = zip(("inner", "outer"), ("_IN", "_OUT"), splits[zone])
+        else:
+            parts = [("whole", "", polygon)]
+
+        for part, suffix, geom in parts:
+            row = {"zone": f"{zone}{suffix}", "parent_zone": zone,
+                   "part": part}
+            for i, (lon, lat) in enumerate(geom.exterior.coords[:-1], 1):
+                row[f"lat{i}"] = lat
+                row[f"long{i}"] = lon
+            rows.append(row)
+
+    if not rows:
+        return pd.DataFrame(columns=["zone", "parent_zone", "part"])
+
+    table = pd.DataFrame(rows)
+    # Keep vertex columns in lat1, long1, lat2, long2 ... order
+    n_vertices = sum(c.startswith("lat") for c in table.columns)
+    vertex_cols = [f"{kind}{i}" for i in range(1, n_vertices + 1)
+                   for kind in ("lat", "long")]
+    return table[["zone", "parent_zone", "part"] + vertex_cols]
+
+
+def save_sub_zones(path, table, errors):
+    errors_df = pd.DataFrame(
+        sorted(errors.items()), columns=["zone", "error"]
+    )
+    with pd.ExcelWriter(path) as writer:
+        table.to_excel(writer, index=False)
+        errors_df.to_excel(writer, sheet_name=SPLIT_ERRORS_SHEET,
+                           index=False)
 
-# ===============================
-# ADD OFFICERS
-# ===============================
-for _, o in officers_df.iterrows():
-    folium.Marker(
-        location=[o["lat"], o["long"]],
-        icon=folium.Icon(color="red", icon="user", prefix="fa"),
-        popup=o["off_id"]
-    ).add_to(officer_layer)
-
-    folium.Marker(
-        location=[o["lat"], o["long"]],
-        icon=DivIcon(
-            html=f"""
-            <div style="font-size:11px;font-weight:bold;color:red">
-            {o['off_id']}
-            </div>
-            """
-        )
-    ).add_to(officer_layer)
 
 # ===============================
-# FINALIZE MAP
+# MAIN
 # ===============================
-zone_layer.add_to(m)
-site_layer.add_to(m)
-officer_layer.add_to(m)
-
-folium.LayerControl(collapsed=False).add_to(m)
-
-m.save("zone7_inner_outer_with_split_point.html")
-
-print("✅ Zone 7 split using split point completed")
+if __name__ == "__main__":
+
+    # ===============================
+    # READ DATA
+    # ===============================
+    zones_df = read_table(ZONE_FILE)
+    sites_df = read_table(SITE_FILE)
+    officers_df = read_table(OFFICER_FILE)
+
+    zones_df["zone"] = zones_df["zone"].astype(str).str.strip()
+    polygons = zone_polygons(zones_df)
+
+    # ===============================
+    # SPLIT ALL ZONES
+    # ===============================
+    splits, errors = split_all_zones(zones_df, polygons)
+
+    table = sub_zone_table(zones_df, polygons, splits)
+    save_sub_zones(SUB_ZONE_FILE, table, errors)
+
+    for zone, error in sorted(errors.items()):
+        print(f"⚠️ Zone {zone} not split: {error}")
+
+    if not splits:
+        raise SystemExit("No zone could be split – nothing to draw")
+
+    # ===============================
+    # MAP CENTER
+    # ===============================
+    bounds = np.array([
+        geom.bounds for parts in splits.values() for geom in parts
+    ])
+    center_lat = (bounds[:, 1].min() + bounds[:, 3].max()) / 2
+    center_lon = (bounds[:, 0].min() + bounds[:, 2].max()) / 2
+
+    m = folium.Map(location=[center_lat, center_lon], zoom_start=13)
+
+    zone_layer = folium.FeatureGroup(name="Split Zones (Inner / Outer)")
+    site_layer = folium.FeatureGroup(name="Sites")
+    officer_layer = folium.FeatureGroup(name="Officers")
+
+    # ===============================
+    # DRAW INNER / OUTER ZONES & SPLIT LINES
+    # ===============================
+    split_points = {zone: cut for zone, _, cut in split_jobs(zones_df, polygons)}
+
+    for zone, (inner_poly, outer_poly) in splits.items():
+        folium.Polygon(
+            locations=[[lat, lon] for lon, lat in inner_poly.exterior.coords],
+            color="green",
+            fill=True,
+            fill_opacity=0.5,
+            tooltip=f"Zone {zone} - INNER"
+        ).add_to(zone_layer)
+
+        folium.Polygon(
+            locations=[[lat, lon] for lon, lat in outer_poly.exterior.coords],
+            color="orange",
+            fill=True,
+            fill_opacity=0.4,
+            tooltip=f"Zone {zone} - OUTER"
+        ).add_to(zone_layer)
+
+        folium.PolyLine(
+            locations=[[lat, lon] for lon, lat in split_points[zone]],
+            color="red",
+            weight=3,
+            dash_array="5,5",
+            tooltip=f"Zone {zone} Split Line"
+        ).add_to(zone_layer)
+
+    # ===============================
+    # ADD SITES
+    # ===============================
+    sub_zone_index = ZoneIndex(
+        [geom for parts in splits.values() for geom in parts],
+        ["blue", "black"] * len(splits)
+    )
+
+    site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+    site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+    site_color = sub_zone_index.labels(
+        sub_zone_index.locate_xy(site_lon, site_lat, predicate="covers")
+    )
+
+    for i, site_id in enumerate(sites_df["property_id"]):
+        color = site_color[i]
+        if color is None:
+            continue
+
+        folium.CircleMarker(
+            location=[site_lat[i], site_lon[i]],
+            radius=6,
+            color=color,
+            fill=True,
+            fill_color=color
+        ).add_to(site_layer)
+
+        folium.Marker(
+            location=[site_lat[i], site_lon[i]],
+            icon=DivIcon(
+                html=f"""
+                <div style="font-size:10px;font-weight:bold;color:{color}">
+                {site_id}
+                </div>
+                """
+            )
+        ).add_to(site_layer)
+
+    # ===============================
+    # ADD OFFICERS
+    # ===============================
+    for _, o in officers_df.iterrows():
+        folium.Marker(
+            location=[o["lat"], o["long"]],
+            icon=folium.Icon(color="red", icon="user", prefix="fa"),
+            popup=o["off_id"]
+        ).add_to(officer_layer)
+
+        folium.Marker(
+            location=[o["lat"], o["long"]],
+            icon=DivIcon(
+                html=f"""
+                <div style="font-size:11px;font-weight:bold;color:red">
+                {o['off_id']}
+                </div>
+                """
+            )
+        ).add_to(officer_layer)
+
+    # ===============================
+    # FINALIZE MAP
+    # ===============================
+    zone_layer.add_to(m)
+    site_layer.add_to(m)
+    officer_layer.add_to(m)
+
+    folium.LayerControl(collapsed=False).add_to(m)
+
+    m.save(MAP_FILE)
+
+    print(f"✅ {len(splits)} zones split, {len(errors)} failed "
+          f"– sub-zones saved to {os.path.abspath(SUB_ZONE_FILE)}")
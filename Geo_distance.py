@@ -0,0 +1,106 @@
+# ============================================================
+# Vectorized Geodesic Distance (WGS-84)
+# ============================================================
+
+import numpy as np
+from geopy.distance import geodesic
+
+# WGS-84 ellipsoid (same model geopy.geodesic uses by default)
+WGS84_A = 6378.137                 # semi-major axis, km
+WGS84_F = 1 / 298.257223563        # flattening
+WGS84_B = WGS84_A * (1 - WGS84_F)  # semi-minor axis, km
+
+VINCENTY_TOL = 1e-12
+VINCENTY_MAX_ITER = 200
+
+# km per degree of latitude / of longitude at the equator, for local
+# planar approximations
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320
+
+
+def geodesic_km(lat1, lon1, lat2, lon2):
+    """
+    Ellipsoidal distance in km between (lat1, lon1) and (lat2, lon2).
+    Arguments broadcast like NumPy arrays.
+
+    Uses Vincenty's inverse formula, which agrees with geopy.geodesic
+    to well below a millimetre. The few near-antipodal pairs where
+    Vincenty does not converge fall back to geopy.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        np.asarray(lat1, dtype=np.float64),
+        np.asarray(lon1, dtype=np.float64),
+        np.asarray(lat2, dtype=np.float64),
+        np.asarray(lon2, dtype=np.float64),
+    )
+
+    f = WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(VINCENTY_MAX_ITER):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.sqrt(
+                (cosU2 * sin_lam) ** 2
+                + (cosU1 * sinU2 - sinU1 * cosU2 * cos_lam) ** 2
+            )
+            cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+
+            sin_alpha = np.where(
+                sin_sigma == 0, 0.0, cosU1 * cosU2 * sin_lam / sin_sigma
+            )
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos2_alpha == 0
+            cos_2sigma_m = np.where(
+                cos2_alpha == 0, 0.0,
+                cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha
+            )
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+
+            lam_prev = lam
+            lam = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (
+                    cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                )
+            )
+
+            converged = np.abs(lam - lam_prev) <= VINCENTY_TOL
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (
+            cos_2sigma_m + B / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                - B / 6 * cos_2sigma_m
+                * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+            )
+        )
+        dist = WGS84_B * A * (sigma - delta_sigma)
+
+    # Coincident points
+    dist = np.where(sin_sigma == 0, 0.0, dist)
+
+    # Near-antipodal fallback (missing coordinates stay NaN)
+    valid = (np.isfinite(lat1) & np.isfinite(lon1)
+             & np.isfinite(lat2) & np.isfinite(lon2))
+    bad = (~converged | ~np.isfinite(dist)) & valid
+    if bad.any():
+        dist = np.array(dist, dtype=np.float64)
+        for i in map(tuple, np.argwhere(bad)):
+            dist[i] = geodesic(
+                (lat1[i], lon1[i]), (lat2[i], lon2[i])
+            ).km
+
+    return dist
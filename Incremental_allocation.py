@@ -0,0 +1,417 @@
+# ============================================================
+# Incremental Re-Allocation
+# ============================================================
+#
+# Keeps one greedy allocation (same result as allocate_sites in
+# vectorized mode) up to date when an officer goes offline, flips
+# Active (Y/N), or a site request is cancelled, without re-running
+# the whole sheet.
+#
+# Cached from the last run, per site: the zone terms, the winner and
+# its score and distance. A change at site position p replays sites
+# p.. against a "dirty" set: officers whose state (or eligibility)
+# differs from the last run at that point. Every other officer is
+# exactly where it was, so its score is unchanged and the old winner
+# is still the best of them.
+#
+# Between two "stops" (a site whose old winner is dirty, an Active
+# flip, a cancelled site) a site only changes hands if a dirty officer
+# beats its old winner, so that stretch is scored as one block of
+# sites x dirty officers. Only stops and upsets are decided one at a
+# time (a full scoring pass where the old winner is dirty), and once
+# no dirty officer can win and no stop is left the replay ends.
+#
+# The last run is replayed alongside, and an officer is clean again
+# as soon as its state matches that run (e.g. both send it to the same
+# site). At 3,000 sites x 300 officers (4 s full run) a change costs
+# about 2 ms; changes that chain through many reassignments take up
+# to ~0.1 s.
+#
+#     allocator = IncrementalAllocator(officers_df, sites_df, zones_df)
+#     allocator.set_offline("FO_17", at=120)
+#     allocator.cancel_site("REQ_0042")
+#     allocation_df = allocator.allocation()
+# ============================================================
+
+import numpy as np
+
+from Allocation_profiler import section
+from Score_engine import (
+    SequentialAllocator, allocation_frame, pick_best, score_site
+)
+from Zone_index import ZoneIndex
+
+UNASSIGNED = -1
+
+# Sites in the first dirty-officer score block; each next block is
+# twice as large, up to REPLAY_BLOCK_MAX
+REPLAY_BLOCK = 32
+REPLAY_BLOCK_MAX = 1024
+
+
+class IncrementalAllocator:
+    """
+    Greedy allocation of sites_df (in table order) that can be updated
+    one change at a time.
+
+    Changes take effect from a site position `at` (sites before it
+    are already dispatched and never change). Every change returns
+    a summary: first replayed site, sites replayed, sites fully
+    re-scored and the request_ids whose officer changed.
+    """
+
+    def __init__(self, officers_df, sites_df, zones_df, prune=None,
+                 distance=None):
+        self.officers_df = officers_df
+        self.sites_df = sites_df
+        self.zone_index = ZoneIndex.from_zones_df(zones_df)
+
+        allocator = SequentialAllocator(
+            officers_df, self.zone_index, prune, distance=distance
+        )
+        state = allocator.state
+        self.state = state
+        self.distance_km = allocator.distance_km
+        self.start = (state.lat.copy(), state.lon.copy(), state.idle.copy(),
+                      state.zone.copy())
+
+        site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+        site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+        self.site_lat, self.site_lon = site_lat, site_lon
+        # Zone an officer is in after moving to the site
+        self.site_zone = self.zone_index.locate_xy(site_lon, site_lat)
+
+        n_sites, n_terms = len(sites_df), len(self.zone_index) + 1
+        self.in_zone = np.zeros((n_sites, n_terms), dtype=bool)
+        self.exit_km = np.zeros((n_sites, n_terms), dtype=np.float64)
+        self.chosen = np.empty(n_sites, dtype=np.int64)
+        self.scores = np.empty(n_sites, dtype=np.float64)
+        self.dists = np.empty(n_sites, dtype=np.float64)
+
+        with section("allocate_sites"):
+            for i in range(n_sites):
+                with section("site"):
+                    terms = allocator.site_terms(
+                        self.site_lat[i], self.site_lon[i]
+                    )
+                    self.in_zone[i], self.exit_km[i] = terms
+                    self.chosen[i], self.scores[i], self.dists[i] = \
+                        allocator.choose(self.site_lat[i], self.site_lon[i],
+                                         terms)
+                    allocator.move(self.chosen[i], self.site_lat[i],
+                                   self.site_lon[i])
+
+        self.cancelled = np.zeros(n_sites, dtype=bool)
+        # Officer takes sites before this position only
+        self.offline_from = np.full(len(state), n_sites, dtype=np.int64)
+        # (site position, officer position, idle) Active (Y/N) flips,
+        # sorted by site position
+        self.active_events = []
+
+        self.officer_position = {
+            fo_id: pos for pos, fo_id in enumerate(state.ids)
+        }
+        self.site_position = {
+            request_id: i
+            for i, request_id in enumerate(sites_df["request_id"])
+        }
+
+    def __len__(self):
+        return len(self.chosen)
+
+    # ========================================================
+    # Changes
+    # ========================================================
+
+    def set_offline(self, fo_id, at=0):
+        """
+        Officer takes no sites from position `at` on
+        """
+        pos = self.officer_position[fo_id]
+        if self.offline_from[pos] <= at:
+            return self._summary(at, 0, 0, [])
+        self.offline_from[pos] = at
+        return self._replay(at, dirty={pos}, excluded={pos})
+
+    def set_active(self, fo_id, active, at=0):
+        """
+        Active (Y/N) of an officer flips before site position `at`
+        (True = idle, Rule A)
+        """
+        pos = self.officer_position[fo_id]
+        event = (at, pos, bool(active))
+        self.active_events.append(event)
+        # Site order; flips at the same site keep their call order
+        self.active_events.sort(key=lambda e: e[0])
+        return self._replay(at, dirty={pos}, new_event=event)
+
+    def cancel_site(self, request_id):
+        """
+        Drop a site request; its officer stays where it was
+        """
+        i = self.site_position[request_id]
+        if self.cancelled[i]:
+            return self._summary(i, 0, 0, [])
+        self.cancelled[i] = True
+        return self._replay(i, dirty=set())
+
+    # ========================================================
+    # Replay
+    # ========================================================
+
+    def _state_at(self, at):
+        """
+        Officer arrays (lat, lon, idle, zone) just before site `at`
+        """
+        lat, lon, idle, zone = (a.copy() for a in self.start)
+
+        wins = self.chosen[:at]
+        taken = np.flatnonzero(wins != UNASSIGNED)
+        last_win = np.full(len(lat), -1, dtype=np.int64)
+        np.maximum.at(last_win, wins[taken], taken)
+
+        moved = np.flatnonzero(last_win >= 0)
+        site = last_win[moved]
+        lat[moved] = self.site_lat[site]
+        lon[moved] = self.site_lon[site]
+        idle[moved] = False
+        zone[moved] = self.site_zone[site]
+
+        for q, pos, value in self.active_events:
+            if last_win[pos] < q < at:
+                idle[pos] = value
+        return lat, lon, idle, zone
+
+    def _score(self, i, cand, lat, lon, idle, zone):
+        return score_site(
+            self.site_lat[i], self.site_lon[i], lat[cand], lon[cand],
+            idle[cand], zone[cand], self.in_zone[i], self.exit_km[i],
+            self.distance_km
+        )
+
+    def _replay(self, at, dirty, excluded=frozenset(), new_event=None):
+        """
+        Re-decide sites at.. after a change. dirty: officers whose state
+        or eligibility differs from the last run at `at`; excluded: the
+        ones only differing in eligibility (went offline); new_event:
+        the Active flip the last run did not have
+        """
+        n_sites = len(self.chosen)
+        lat, lon, idle, zone = self._state_at(at)
+        # The last run, to tell when an officer is back in step with it
+        old_lat, old_lon, old_idle, old_zone = (
+            a.copy() for a in (lat, lon, idle, zone)
+        )
+
+        old_flips = list(self.active_events)
+        if new_event is not None:
+            last = old_flips[::-1].index(new_event)
+            del old_flips[len(old_flips) - 1 - last]
+        events, old_events = {}, {}
+        for flips, by_site in ((self.active_events, events),
+                               (old_flips, old_events)):
+            for q, pos, value in flips:
+                if q >= at:
+                    by_site.setdefault(q, []).append((pos, value))
+        flip_sites = np.array(sorted(set(events) | set(old_events)),
+                              dtype=np.int64)
+
+        dirty = set(dirty)
+        excluded = set(excluded)
+        changed, rescored, replayed = [], 0, 0
+        i = at
+
+        with section("incremental_replay"):
+            while i < n_sites:
+                # Sites up to the next stop keep their winner unless a
+                # dirty officer beats it: one score block for all
+                stop = self._next_stop(i, dirty, flip_sites)
+                cand = np.array(sorted(dirty - excluded), dtype=np.int64)
+                if len(cand) and stop > i:
+                    stop = self._first_upset(i, stop, cand,
+                                             lat, lon, idle, zone)
+                    replayed += stop - i
+                if stop == n_sites:
+                    break
+                self._advance(i, stop, (lat, lon, idle, zone),
+                              (old_lat, old_lon, old_idle, old_zone))
+                i = stop
+                replayed += 1
+
+                touched = set()
+                for pos, value in events.get(i, ()):
+                    idle[pos] = value
+                    touched.add(pos)
+                for pos, value in old_events.get(i, ()):
+                    old_idle[pos] = value
+
+                old = int(self.chosen[i])
+                if self.cancelled[i]:
+                    best, best_score, best_dist = UNASSIGNED, np.nan, np.nan
+                elif old == UNASSIGNED or old in dirty:
+                    # Old winner moved or went offline: full pass
+                    rescored += 1
+                    best, best_score, best_dist = self._full_pass(
+                        i, lat, lon, idle, zone
+                    )
+                else:
+                    best, best_score, best_dist = old, self.scores[i], \
+                        self.dists[i]
+                    cand = [pos for pos in dirty if self.offline_from[pos] > i]
+                    if cand:
+                        cand = np.sort(np.append(cand, old))
+                        scores, dists = self._score(
+                            i, cand, lat, lon, idle, zone
+                        )
+                        # The old winner's score is reused, not recomputed
+                        mine = np.searchsorted(cand, old)
+                        scores[mine], dists[mine] = best_score, best_dist
+                        k = pick_best(scores, dists)
+                        best, best_score, best_dist = \
+                            int(cand[k]), scores[k], dists[k]
+
+                for pos, arrays in ((best, (lat, lon, idle, zone)),
+                                    (old, (old_lat, old_lon, old_idle,
+                                           old_zone))):
+                    if pos != UNASSIGNED:
+                        arrays[0][pos] = self.site_lat[i]
+                        arrays[1][pos] = self.site_lon[i]
+                        arrays[2][pos] = False
+                        arrays[3][pos] = self.site_zone[i]
+                        touched.add(pos)
+
+                if best != old:
+                    dirty.update(pos for pos in (best, old)
+                                 if pos != UNASSIGNED)
+                    changed.append(i)
+
+                # Officers back in the last run's state are clean again
+                for pos in touched - excluded:
+                    if (lat[pos] == old_lat[pos] and lon[pos] == old_lon[pos]
+                            and idle[pos] == old_idle[pos]
+                            and zone[pos] == old_zone[pos]):
+                        dirty.discard(pos)
+                self.chosen[i] = best
+                self.scores[i], self.dists[i] = best_score, best_dist
+                i += 1
+
+        # Only dirty officers end up away from the last run's end state;
+        # Active flips past the last replayed site still apply to them
+        for q, changes in events.items():
+            if q >= i:
+                for pos, value in changes:
+                    idle[pos] = value
+        keep = np.fromiter(dirty, dtype=np.int64, count=len(dirty))
+        state = self.state
+        state.lat[keep], state.lon[keep] = lat[keep], lon[keep]
+        state.idle[keep], state.zone[keep] = idle[keep], zone[keep]
+        return self._summary(at, replayed, rescored, changed)
+
+    def _next_stop(self, start, dirty, flip_sites):
+        """
+        First site from `start` on that has to be re-decided on its
+        own: its old winner is dirty, it has an Active flip, it was
+        just cancelled or had no officer (n_sites if none)
+        """
+        wins = self.chosen[start:]
+        stops = (self.cancelled[start:] == (wins != UNASSIGNED))
+        if dirty:
+            stops |= np.isin(wins, list(dirty))
+        hits = np.flatnonzero(stops)
+        stop = start + hits[0] if len(hits) else len(self.chosen)
+
+        later = flip_sites[np.searchsorted(flip_sites, start):]
+        if len(later):
+            stop = min(stop, int(later[0]))
+        return stop
+
+    def _first_upset(self, start, stop, cand, lat, lon, idle, zone):
+        """
+        First site in start..stop-1 one of the dirty officers `cand`
+        would take from its old winner (stop if none). Scored in blocks
+        of sites x cand, as in score_matrix; upsets come soonest right
+        after a change, so blocks start small and grow
+        """
+        lo, block = start, REPLAY_BLOCK
+        while lo < stop:
+            rows = slice(lo, min(lo + block, stop))
+            scores, dists = score_site(
+                self.site_lat[rows, None], self.site_lon[rows, None],
+                lat[cand], lon[cand], idle[cand], zone[cand],
+                self.in_zone[rows], self.exit_km[rows], self.distance_km
+            )
+            # pick_best order: score, then distance, then table order
+            old_score = self.scores[rows, None]
+            old_dist = self.dists[rows, None]
+            beats = (scores > old_score) | (
+                (scores == old_score)
+                & ((dists < old_dist)
+                   | ((dists == old_dist) & (cand < self.chosen[rows, None])))
+            )
+            beats &= self.offline_from[cand] > np.arange(
+                rows.start, rows.stop
+            )[:, None]
+            hits = np.flatnonzero(beats.any(axis=1))
+            if len(hits):
+                return lo + int(hits[0])
+            lo, block = rows.stop, min(2 * block, REPLAY_BLOCK_MAX)
+        return stop
+
+    def _advance(self, start, stop, *runs):
+        """
+        Move the unchanged winners of sites start..stop-1 in every run's
+        (lat, lon, idle, zone) arrays
+        """
+        wins = self.chosen[start:stop]
+        taken = np.flatnonzero(wins != UNASSIGNED)[::-1]
+        # Last site of the block each officer takes
+        pos, first = np.unique(wins[taken], return_index=True)
+        site = start + taken[first]
+        for lat, lon, idle, zone in runs:
+            lat[pos], lon[pos] = self.site_lat[site], self.site_lon[site]
+            idle[pos] = False
+            zone[pos] = self.site_zone[site]
+
+    def _full_pass(self, i, lat, lon, idle, zone):
+        eligible = np.flatnonzero(self.offline_from > i)
+        if not len(eligible):
+            return UNASSIGNED, np.nan, np.nan
+        scores, dists = self._score(i, eligible, lat, lon, idle, zone)
+        k = pick_best(scores, dists)
+        return int(eligible[k]), scores[k], dists[k]
+
+    def _summary(self, at, replayed, rescored, changed):
+        request_ids = self.sites_df["request_id"].to_numpy()
+        return {
+            "from_site": at,
+            "sites_replayed": replayed,
+            "sites_rescored": rescored,
+            "reassigned": request_ids[changed].tolist(),
+        }
+
+    # ========================================================
+    # Results
+    # ========================================================
+
+    def allocation(self):
+        """
+        final_site_allocation table of the current plan; cancelled
+        sites are left out, sites nobody can take have no officer
+        """
+        assigned = self.chosen != UNASSIGNED
+        allocation_df = allocation_frame(
+            self.sites_df, self.officers_df, self.state,
+            np.where(assigned, self.chosen, 0), self.scores
+        )
+        allocation_df.loc[
+            ~assigned, ["assigned_FO_Id", "assigned_FO_Name", "final_score"]
+        ] = None
+        return allocation_df[~self.cancelled].reset_index(drop=True)
+
+    def officers(self):
+        """
+        Copy of officers_df with end-of-run positions and Active (Y/N)
+        """
+        officers_df = self.state.write_back(self.officers_df.copy())
+        officers_df.loc[self.state.idle, "Active (Y/N)"] = "Y"
+        return officers_df
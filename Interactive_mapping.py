@@ -1,8 +1,12 @@
-import pandas as pd
+import numpy as np
 import folium
 import matplotlib.cm as cm
 import matplotlib.colors as mcolors
-from shapely.geometry import Point, Polygon
+from shapely.geometry import Point
+
+from Data_loader import read_table
+from Zone_geometry import vertex_arrays, zone_polygons
+from Zone_index import ZoneIndex
 
 # ===============================
 # 1. Read Excel files
@@ -11,9 +15,9 @@ zone_file = "ZONE_INFO.xlsx"
 site_file = "Property_la_lo.xlsx"
 officer_file = "officer.xlsx"
 
-zones_df = pd.read_excel(zone_file)
-sites_df = pd.read_excel(site_file)
-officers_df = pd.read_excel(officer_file)
+zones_df = read_table(zone_file)
+sites_df = read_table(site_file)
+officers_df = read_table(officer_file)
 
 # ===============================
 # 2. Prepare colors
@@ -27,8 +31,9 @@ def to_hex(color):
 # ===============================
 # 3. Create base map
 # ===============================
-center_lat = zones_df[["lat1", "lat2", "lat3", "lat4"]].values.mean()
-center_lon = zones_df[["long1", "long2", "long3", "long4"]].values.mean()
+vertex_lat, vertex_lon = vertex_arrays(zones_df)
+center_lat = np.nanmean(vertex_lat)
+center_lon = np.nanmean(vertex_lon)
 
 m = folium.Map(
     location=[center_lat, center_lon],
@@ -36,31 +41,21 @@ m = folium.Map(
     tiles="OpenStreetMap"
 )
 
-zone_polygons = {}
+polygons = {}
 
 # ===============================
 # 4. Add zones
 # ===============================
-for idx, row in zones_df.iterrows():
-    zone_id = row["zone_id"]
+for idx, (zone_id, polygon) in enumerate(
+    zip(zones_df["zone_id"], zone_polygons(zones_df))
+):
+    if polygon is None:
+        continue
     color = to_hex(cmap(idx))
 
-    folium_coords = [
-        [row["lat1"], row["long1"]],
-        [row["lat2"], row["long2"]],
-        [row["lat3"], row["long3"]],
-        [row["lat4"], row["long4"]],
-        [row["lat1"], row["long1"]]
-    ]
-
-    polygon = Polygon([
-        (row["long1"], row["lat1"]),
-        (row["long2"], row["lat2"]),
-        (row["long3"], row["lat3"]),
-        (row["long4"], row["lat4"])
-    ])
+    folium_coords = [[lat, lon] for lon, lat in polygon.exterior.coords]
 
-    zone_polygons[zone_id] = polygon
+    polygons[zone_id] = polygon
 
     folium.Polygon(
         locations=folium_coords,
@@ -72,6 +67,8 @@ for idx, row in zones_df.iterrows():
         popup=f"<b>Zone ID:</b> {zone_id}"
     ).add_to(m)
 
+zone_index = ZoneIndex(polygons.values(), polygons.keys())
+
 # ===============================
 # 5. Add sites (Blue / Black)
 # ===============================
@@ -85,11 +82,10 @@ for _, site in sites_df.iterrows():
     inside_zone = False
     zone_name = "Outside all zones"
 
-    for zid, polygon in zone_polygons.items():
-        if polygon.contains(point) or polygon.touches(point):
-            inside_zone = True
-            zone_name = zid
-            break
+    zid, _ = zone_index.find(point, predicate="covers")
+    if zid is not None:
+        inside_zone = True
+        zone_name = zid
 
     site_color = "blue" if inside_zone else "black"
 
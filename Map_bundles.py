@@ -0,0 +1,258 @@
+# ============================================================
+# Per-Zone Lazy-Loaded Map Bundles
+# ============================================================
+#
+# export_zone_bundles writes
+#
+#     <out_dir>/index.html          zone outlines only
+#     <out_dir>/zones/<zone>-<hash>.js
+#
+# Each zone file holds that zone's sites and officers as compact rows
+# (Map_layers.point_rows) and is pulled in with a <script> tag the
+# first time the zone is clicked, or when the map is zoomed in to
+# LOAD_ZOOM over it. Script tags (not fetch) keep the bundle working
+# when index.html is opened straight from disk.
+#
+# Bundle names carry a hash of their content, so a re-export only
+# writes the zones whose data changed; zone files the new index no
+# longer references are deleted.
+# ============================================================
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import folium
+import numpy as np
+import shapely
+from branca.element import MacroElement, Template
+
+from Map_layers import ZoomLabels, point_callback, point_rows
+
+# Zones inside the view are loaded automatically from this zoom on
+LOAD_ZOOM = 13
+
+BUNDLE_DIR = "zones"
+OUTSIDE_ZONE = "Outside"
+
+SITE_PALETTE = ["blue", "black"]
+OFFICER_PALETTE = ["red"]
+
+
+class LazyZoneBundles(MacroElement):
+    """
+    Loads a zone's bundle on click (click again to hide it) and every
+    zone in view from LOAD_ZOOM on; sites outside every zone (the
+    `outside` bundle) also load from LOAD_ZOOM on
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            var zones = {{ this.zones_layer.get_name() }};
+            var siteMarker = {{ this.site_callback }};
+            var officerMarker = {{ this.officer_callback }};
+            var layers = {}, pending = {};
+
+            window.zoneBundleLoaded = function (zone, bundle) {
+                var group = L.layerGroup();
+                bundle.sites.forEach(function (row) {
+                    group.addLayer(siteMarker(row));
+                });
+                bundle.officers.forEach(function (row) {
+                    group.addLayer(officerMarker(row));
+                });
+                layers[zone] = group.addTo(map);
+            };
+
+            function load(props) {
+                if (layers[props.zone] || pending[props.zone]) return;
+                pending[props.zone] = true;
+                var script = document.createElement("script");
+                script.src = props.bundle;
+                document.head.appendChild(script);
+            }
+
+            zones.eachLayer(function (layer) {
+                var props = layer.feature.properties;
+                layer.on("click", function () {
+                    var group = layers[props.zone];
+                    if (!group) load(props);
+                    else if (map.hasLayer(group)) map.removeLayer(group);
+                    else group.addTo(map);
+                });
+            });
+
+            map.on("moveend", function () {
+                if (map.getZoom() < {{ this.load_zoom }}) return;
+                var view = map.getBounds();
+                zones.eachLayer(function (layer) {
+                    if (view.intersects(layer.getBounds())) {
+                        load(layer.feature.properties);
+                    }
+                });
+                load({{ this.outside_json }});
+            });
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, zones_layer, site_callback, officer_callback,
+                 outside, load_zoom=LOAD_ZOOM):
+        super().__init__()
+        self._name = "LazyZoneBundles"
+        self.zones_layer = zones_layer
+        self.site_callback = site_callback
+        self.officer_callback = officer_callback
+        self.outside_json = json.dumps(outside)
+        self.load_zoom = load_zoom
+
+
+# ============================================================
+# Bundle Files
+# ============================================================
+
+def bundle_slug(zone):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", str(zone)) or "zone"
+
+
+def write_bundle(out_dir, zone, sites, officers):
+    """
+    Write one zone file unless an identical one exists, returns its
+    path relative to out_dir
+    """
+    payload = json.dumps(
+        {"sites": sites, "officers": officers}, separators=(",", ":")
+    )
+    script = f"zoneBundleLoaded({json.dumps(str(zone))}, {payload});\n"
+    digest = hashlib.sha1(script.encode()).hexdigest()[:12]
+
+    rel_path = f"{BUNDLE_DIR}/{bundle_slug(zone)}-{digest}.js"
+    path = os.path.join(out_dir, rel_path)
+    if not os.path.exists(path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(script)
+        os.replace(tmp_path, path)
+    return rel_path
+
+
+def _zone_rows(mask, lat, lon, ids, color_index, popups):
+    return point_rows(
+        lat[mask], lon[mask], np.asarray(ids, dtype=object)[mask],
+        np.asarray(color_index)[mask],
+        [np.asarray(v, dtype=object)[mask] for v in popups],
+    )
+
+
+# ============================================================
+# Export
+# ============================================================
+
+def export_zone_bundles(out_dir, zone_ids, polygons, colors,
+                        site_lat, site_lon, site_ids, site_zone,
+                        officer_lat, officer_lon, officer_ids,
+                        officer_zone, workers=None, zoom_start=12):
+    """
+    Index map plus one lazily loaded file per zone.
+
+    site_zone / officer_zone: zone positions (ZoneIndex.locate_xy),
+    -1 goes to an extra "Outside" bundle.
+    Zone files are written on a thread pool. That only overlaps the
+    file writes: encoding the rows holds the GIL, so it stays
+    serial. (Process workers would re-run the module-level map
+    scripts on platforms that spawn.)
+    """
+    os.makedirs(os.path.join(out_dir, BUNDLE_DIR), exist_ok=True)
+
+    site_lat = np.asarray(site_lat, dtype=np.float64)
+    site_lon = np.asarray(site_lon, dtype=np.float64)
+    officer_lat = np.asarray(officer_lat, dtype=np.float64)
+    officer_lon = np.asarray(officer_lon, dtype=np.float64)
+    site_zone = np.asarray(site_zone)
+    officer_zone = np.asarray(officer_zone)
+
+    zone_labels = list(zone_ids) + [OUTSIDE_ZONE]
+    site_label = np.asarray(zone_labels, dtype=object)[site_zone]
+
+    def build(z):
+        sites = _zone_rows(
+            site_zone == z, site_lat, site_lon, site_ids,
+            (site_zone < 0).astype(np.int64),
+            [site_ids, site_label],
+        )
+        officers = _zone_rows(
+            officer_zone == z, officer_lat, officer_lon, officer_ids,
+            np.zeros(len(officer_lat), dtype=np.int64), [officer_ids],
+        )
+        return write_bundle(out_dir, zone_labels[z], sites, officers)
+
+    positions = list(range(len(zone_ids))) + [-1]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        bundles = dict(zip(positions, pool.map(build, positions)))
+
+    site_counts = np.bincount(site_zone[site_zone >= 0],
+                              minlength=len(zone_ids))
+
+    # Index map: zone outlines only
+    features = []
+    for z, (zone_id, polygon) in enumerate(zip(zone_ids, polygons)):
+        features.append({
+            "type": "Feature",
+            "geometry": json.loads(shapely.to_geojson(polygon)),
+            "properties": {
+                "zone": str(zone_id),
+                "sites": int(site_counts[z]),
+                "color": colors[z],
+                "bundle": bundles[z],
+            },
+        })
+
+    bounds = shapely.total_bounds(np.asarray(list(polygons), dtype=object))
+    m = folium.Map(
+        location=[(bounds[1] + bounds[3]) / 2, (bounds[0] + bounds[2]) / 2],
+        zoom_start=zoom_start, tiles="OpenStreetMap", prefer_canvas=True
+    )
+
+    zones_layer = folium.GeoJson(
+        {"type": "FeatureCollection", "features": features},
+        name="Zones",
+        style_function=lambda f: {
+            "color": f["properties"]["color"],
+            "fillColor": f["properties"]["color"],
+            "fillOpacity": 0.35,
+            "weight": 2,
+        },
+        tooltip=folium.GeoJsonTooltip(
+            fields=["zone", "sites"], aliases=["Zone", "Sites"]
+        ),
+    ).add_to(m)
+
+    m.add_child(LazyZoneBundles(
+        zones_layer,
+        point_callback(SITE_PALETTE, ["Site ID", "Zone"]),
+        point_callback(OFFICER_PALETTE, ["Officer ID"], radius=8),
+        outside={"zone": OUTSIDE_ZONE, "bundle": bundles[-1]},
+    ))
+    m.add_child(ZoomLabels())
+    folium.LayerControl(collapsed=False).add_to(m)
+
+    index_path = os.path.join(out_dir, "index.html")
+    m.save(index_path)
+    remove_stale_bundles(out_dir, bundles.values())
+    return index_path
+
+
+def remove_stale_bundles(out_dir, keep):
+    """
+    Delete zone files (and leftover temp files) of earlier exports
+    that are not in `keep` (paths relative to out_dir)
+    """
+    keep = {os.path.basename(rel_path) for rel_path in keep}
+    bundle_dir = os.path.join(out_dir, BUNDLE_DIR)
+    for name in os.listdir(bundle_dir):
+        if name.endswith((".js", ".js.tmp")) and name not in keep:
+            os.remove(os.path.join(bundle_dir, name))
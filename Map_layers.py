@@ -0,0 +1,131 @@
+# ============================================================
+# High-Volume Map Layers (folium)
+# ============================================================
+#
+# Per-site folium objects cost two HTML/JS fragments per point. Here a
+# whole layer is one compact JSON array of rows
+#
+#     [lat, lon, label, color_index, popup_value, ...]
+#
+# drawn by a FastMarkerCluster callback in the browser. Labels are
+# permanent tooltips hidden by CSS below LABEL_MIN_ZOOM.
+# ============================================================
+
+import json
+
+import numpy as np
+from branca.element import MacroElement, Template
+from folium.plugins import FastMarkerCluster
+
+# Site count from which the toggle maps switch to fast layers
+HIGH_VOLUME_SITES = 2000
+
+# Labels are shown from this zoom level on
+LABEL_MIN_ZOOM = 15
+
+# 6 decimals ~ 0.1 m, enough for site coordinates
+COORD_DECIMALS = 6
+
+LABEL_CLASS = "map-label"
+
+
+class ZoomLabels(MacroElement):
+    """
+    Shows LABEL_CLASS tooltips only at zoom >= min_zoom
+    """
+
+    _template = Template("""
+        {% macro header(this, kwargs) %}
+        <style>
+            .{{ this.label_class }} { display: none; }
+            .show-{{ this.label_class }} .{{ this.label_class }} {
+                display: block;
+            }
+        </style>
+        {% endmacro %}
+
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            function toggleLabels() {
+                map.getContainer().classList.toggle(
+                    "show-{{ this.label_class }}",
+                    map.getZoom() >= {{ this.min_zoom }}
+                );
+            }
+            map.on("zoomend", toggleLabels);
+            toggleLabels();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, min_zoom=LABEL_MIN_ZOOM, label_class=LABEL_CLASS):
+        super().__init__()
+        self._name = "ZoomLabels"
+        self.min_zoom = min_zoom
+        self.label_class = label_class
+
+
+def point_callback(palette, popup_titles, radius=6,
+                   label_class=LABEL_CLASS):
+    """
+    JS marker factory for one row of point_rows
+    """
+    popup_parts = " + '<br>' + ".join(
+        f"'<b>' + {json.dumps(title)} + ':</b> ' + row[{4 + i}]"
+        for i, title in enumerate(popup_titles)
+    ) or "''"
+
+    return f"""
+    function (row) {{
+        var palette = {json.dumps(list(palette))};
+        var color = palette[row[3]];
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {{
+            radius: {radius}, color: color, fillColor: color,
+            fillOpacity: 1, weight: 1
+        }});
+        marker.bindPopup({popup_parts});
+        marker.bindTooltip(String(row[2]), {{
+            permanent: true, direction: "right",
+            className: {json.dumps(label_class)}
+        }});
+        return marker;
+    }}
+    """
+
+
+def point_rows(lat, lon, labels, color_index, popup_values=()):
+    """
+    Compact [lat, lon, label, color_index, *popup] rows, invalid
+    coordinates dropped
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    keep = np.isfinite(lat) & np.isfinite(lon)
+
+    columns = [
+        np.round(lat[keep], COORD_DECIMALS).tolist(),
+        np.round(lon[keep], COORD_DECIMALS).tolist(),
+        [str(v) for v in np.asarray(labels, dtype=object)[keep]],
+        np.asarray(color_index, dtype=np.int64)[keep].tolist(),
+    ]
+    columns += [
+        [str(v) for v in np.asarray(values, dtype=object)[keep]]
+        for values in popup_values
+    ]
+    return [list(row) for row in zip(*columns)]
+
+
+def fast_point_layer(name, lat, lon, labels, color_index, palette,
+                     popups=None, radius=6, show=True):
+    """
+    One clustered layer for many points.
+    popups: {title: values} shown in each point's popup
+    """
+    popups = popups or {}
+    return FastMarkerCluster(
+        point_rows(lat, lon, labels, color_index, popups.values()),
+        callback=point_callback(palette, popups.keys(), radius),
+        name=name,
+        show=show,
+    )
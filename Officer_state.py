@@ -0,0 +1,99 @@
+# ============================================================
+# Officer State Cache for the Allocation Loop
+# ============================================================
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from Allocation_profiler import section
+
+ID_COLUMN = "FO Id"
+CAPACITY_COLUMN = "Capacity"
+
+
+class OfficerStateCache:
+    """
+    Coordinates, idle flag and current zone of every officer, held as
+    contiguous arrays (float64 lat / lon, bool idle, int zone position)
+    next to the officers_df index and FO Ids.
+
+    Zones are resolved once for the whole fleet up front. After each
+    assignment only the officer that moved is re-resolved, so the zone
+    lookup cost is per assignment instead of per officer-site pair.
+    The allocators work on these arrays only; write_back turns them
+    into the updated officer table once at the end.
+    """
+
+    def __init__(self, officers_df, zone_index):
+        self.zone_index = zone_index
+        self.index = officers_df.index
+        self.ids = (
+            officers_df[ID_COLUMN].to_numpy(dtype=object, copy=True)
+            if ID_COLUMN in officers_df.columns else self.index.to_numpy()
+        )
+
+        self.lat = officers_df["lat"].to_numpy(dtype=np.float64, copy=True)
+        self.lon = officers_df["long"].to_numpy(dtype=np.float64, copy=True)
+        self.idle = (officers_df["Active (Y/N)"] == "Y").to_numpy(copy=True)
+        self.zone = zone_index.locate_xy(self.lon, self.lat)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def position(self, idx):
+        """
+        Array position of an officers_df index label
+        """
+        return self.index.get_loc(idx)
+
+    def zone_polygon(self, pos):
+        """
+        Prepared polygon of the officer's current zone (None if outside)
+        """
+        z = self.zone[pos]
+        return None if z < 0 else self.zone_index.polygons[z]
+
+    def move(self, pos, lat, lon):
+        """
+        Officer at pos takes a site: relocate, mark busy and
+        re-resolve the zone for this officer only
+        """
+        self.lat[pos] = lat
+        self.lon[pos] = lon
+        self.idle[pos] = False
+        with section("zone_resolution"):
+            self.zone[pos] = self.zone_index.locate(shapely.points(lon, lat))
+
+    def write_back(self, officers_df):
+        """
+        Copy positions into officers_df and mark officers that took a
+        site as busy ("N"); other Active values are left untouched
+        """
+        officers_df["lat"] = self.lat
+        officers_df["long"] = self.lon
+        turned_busy = (
+            (officers_df["Active (Y/N)"] == "Y").to_numpy() & ~self.idle
+        )
+        officers_df.loc[turned_busy, "Active (Y/N)"] = "N"
+        return officers_df
+
+
+def officer_capacities(officers_df, capacity=None):
+    """
+    Per-officer capacity: the Capacity column where filled in,
+    otherwise `capacity`. None everywhere means unlimited.
+    """
+    if CAPACITY_COLUMN not in officers_df.columns:
+        if capacity is None:
+            return None
+        return np.full(len(officers_df), int(capacity), dtype=np.int64)
+
+    caps = pd.to_numeric(officers_df[CAPACITY_COLUMN], errors="coerce")
+    if caps.isna().any():
+        if capacity is None:
+            raise ValueError(
+                f"Missing {CAPACITY_COLUMN} values and no default capacity"
+            )
+        caps = caps.fillna(capacity)
+    return caps.to_numpy(dtype=np.int64)
@@ -0,0 +1,333 @@
+# ============================================================
+# Zone-Sharded Parallel Allocation
+# ============================================================
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.spatial import cKDTree
+
+from Candidate_pruning import (
+    EARTH_RADIUS_KM, RULE_RADIUS_KM, SPHERE_MARGIN, unit_vectors
+)
+from Officer_state import OfficerStateCache
+from Score_engine import (
+    SequentialAllocator, allocation_frame, pick_best, score_site,
+    site_zone_terms_batch
+)
+from Zone_index import ZoneIndex
+
+# Exit distances are measured to the boundary point nearest in lon/lat
+# degrees; the truly nearest boundary point can be up to 1 / cos(lat)
+# times closer. The Rule C reach around a site is widened by that
+# factor at the zones' highest latitude, times this slack for the
+# ellipsoid (1.05 / cos(45°) ~ 1.48).
+BOUNDARY_SLACK = 1.05
+
+# Sites per zone terms task on the pool
+TERMS_CHUNK = 4096
+
+# ============================================================
+# Shard Planning
+# ============================================================
+
+def boundary_margin(zone_index):
+    """
+    Factor on the Rule C radius that keeps other zones out of reach
+    of an interior site (see BOUNDARY_SLACK)
+    """
+    if not len(zone_index):
+        return BOUNDARY_SLACK
+    bounds = shapely.bounds(np.asarray(zone_index.polygons, dtype=object))
+    max_lat = np.abs(bounds[:, [1, 3]]).max()
+    return BOUNDARY_SLACK / max(np.cos(np.radians(max_lat)), 1e-9)
+
+
+def interior_sites(site_lat, site_lon, state, zone_index, terms=None):
+    """
+    Zone position of every site that only officers of its own zone
+    can win, -1 for boundary sites.
+
+    A site is interior to zone z when it lies in z and in no other
+    zone, is more than boundary_margin x 10 km from every other zone,
+    from every officer outside all zones and from every site outside
+    all zones (an officer may end up there), and zone z has officers.
+    Other-zone officers then score at most 0.3 (Rule A) and officers
+    outside all zones at most 0.5 (Rules A and D), while any officer
+    of zone z scores at least 0.6 (Rules B and D).
+    terms: the sites' (in_zone, exit_km) if already computed
+    """
+    site_lat = np.asarray(site_lat, dtype=np.float64)
+    site_lon = np.asarray(site_lon, dtype=np.float64)
+    n_zones = len(zone_index)
+    reach_km = RULE_RADIUS_KM * boundary_margin(zone_index)
+
+    if terms is None:
+        terms = site_zone_terms_batch(site_lat, site_lon, zone_index.polygons)
+    in_zone, exit_km = terms[0][:, :n_zones], terms[1][:, :n_zones]
+
+    # Exactly one containing zone, every other zone out of reach
+    single = in_zone.sum(axis=1) == 1
+    far = ((exit_km > reach_km) | in_zone).all(axis=1)
+    site_zone = np.where(single & far, np.argmax(in_zone, axis=1), -1)
+
+    # Zones without officers have nobody to win their sites
+    staffed = np.append(np.bincount(
+        state.zone[state.zone >= 0], minlength=n_zones
+    ) > 0, False)
+    site_zone[~staffed[site_zone]] = -1
+
+    outside = np.flatnonzero(state.zone < 0)
+    stray = np.flatnonzero(~in_zone.any(axis=1))
+    if len(outside) or len(stray):
+        tree = cKDTree(unit_vectors(
+            np.concatenate([state.lat[outside], site_lat[stray]]),
+            np.concatenate([state.lon[outside], site_lon[stray]])
+        ))
+        angle = reach_km * SPHERE_MARGIN / EARTH_RADIUS_KM
+        near_outside = tree.query_ball_point(
+            unit_vectors(site_lat, site_lon), 2 * np.sin(angle / 2),
+            return_length=True
+        )
+        site_zone[near_outside > 0] = -1
+
+    return site_zone
+
+
+# ============================================================
+# Pool Workers
+# ============================================================
+
+_WORKER_ZONE_INDEX = None
+
+
+def _init_worker(polygons, zones):
+    """
+    Build the zone index once per worker process
+    """
+    global _WORKER_ZONE_INDEX
+    _WORKER_ZONE_INDEX = ZoneIndex(polygons, zones)
+
+
+def zone_terms_chunk(site_lat, site_lon, zone_index=None):
+    """
+    site_zone_terms_batch of one chunk of sites
+    """
+    if zone_index is None:
+        zone_index = _WORKER_ZONE_INDEX
+    return site_zone_terms_batch(site_lat, site_lon, zone_index.polygons)
+
+
+def allocate_shard(officer_lat, officer_lon, officer_idle, site_lat,
+                   site_lon, in_zone, exit_km, prune=None, distance=None,
+                   zone_index=None):
+    """
+    Greedy allocation of one zone's interior sites to that zone's
+    officers. Returns shard-local officer positions, scores and
+    distances.
+    """
+    if zone_index is None:
+        zone_index = _WORKER_ZONE_INDEX
+
+    shard_officers = pd.DataFrame({
+        "lat": officer_lat,
+        "long": officer_lon,
+        "Active (Y/N)": np.where(officer_idle, "Y", "N"),
+    })
+    allocator = SequentialAllocator(
+        shard_officers, zone_index, prune, distance=distance
+    )
+
+    chosen = np.empty(len(site_lat), dtype=np.int64)
+    scores = np.empty(len(site_lat), dtype=np.float64)
+    dists = np.empty(len(site_lat), dtype=np.float64)
+    for i, (lat, lon) in enumerate(zip(site_lat, site_lon)):
+        chosen[i], scores[i], dists[i] = allocator.choose(
+            lat, lon, (in_zone[i], exit_km[i])
+        )
+        allocator.move(chosen[i], lat, lon)
+
+    return chosen, scores, dists
+
+
+# ============================================================
+# Allocation Engine
+# ============================================================
+
+def allocate_sites_parallel(officers_df, sites_df, zones_df, workers=None,
+                            prune=None, distance=None):
+    """
+    Greedy allocation with one shard per zone; same result as
+    mode="vectorized".
+
+    On the process pool: the zone terms of every site (chunks of
+    TERMS_CHUNK), then one shard per zone that allocates the zone's
+    interior sites (see interior_sites) to its officers, in table
+    order and from the starting officer state.
+
+    Then every site is walked in table order over the whole fleet,
+    as in the sequential allocator. Officers whose state differs from
+    where the shards have them (they took a boundary site, or a site
+    a shard gave to someone else) are "diverged". An interior site
+    keeps its shard winner unless that winner diverged or a diverged
+    officer now in the zone beats it, so only those officers are
+    scored; boundary sites and sites whose shard winner diverged are
+    scored against the whole fleet. The walk stays serial: the pool
+    takes the zone terms and the shards, and the more officers cross
+    zone lines, the more of the scoring is left to the walk.
+
+    workers: process count, None = every core; 1 runs everything
+    inline
+    distance: Rule C distance function, None = geodesic (road
+    distances are never shorter, so the interior test still holds)
+    """
+    zone_index = ZoneIndex.from_zones_df(zones_df)
+    state = OfficerStateCache(officers_df, zone_index)
+
+    site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+    site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+    n_sites = len(sites_df)
+
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(list(zone_index.polygons), list(zone_index.zones)),
+        )
+
+    try:
+        # Zone terms do not depend on officer state: one pass up front
+        starts = range(0, n_sites, TERMS_CHUNK)
+        chunks = [(site_lat[s:s + TERMS_CHUNK], site_lon[s:s + TERMS_CHUNK])
+                  for s in starts]
+        if pool is None or len(chunks) <= 1:
+            parts = [zone_terms_chunk(lat, lon, zone_index)
+                     for lat, lon in chunks]
+        else:
+            parts = list(pool.map(zone_terms_chunk, *zip(*chunks)))
+        n_terms = len(zone_index) + 1
+        in_zone = np.concatenate(
+            [p[0] for p in parts] or [np.zeros((0, n_terms), dtype=bool)]
+        )
+        exit_km = np.concatenate(
+            [p[1] for p in parts] or [np.zeros((0, n_terms))]
+        )
+
+        site_zone = interior_sites(site_lat, site_lon, state, zone_index,
+                                   (in_zone, exit_km))
+
+        # Largest shards first so the pool stays busy to the end
+        shard_zones = np.unique(site_zone[site_zone >= 0])
+        shard_zones = shard_zones[np.argsort(
+            -np.bincount(site_zone[site_zone >= 0])[shard_zones],
+            kind="stable"
+        )]
+        shards = []
+        for z in shard_zones:
+            officers = np.flatnonzero(state.zone == z)
+            sites = np.flatnonzero(site_zone == z)
+            shards.append((officers, sites, (
+                state.lat[officers], state.lon[officers],
+                state.idle[officers], site_lat[sites], site_lon[sites],
+                in_zone[sites], exit_km[sites], prune, distance
+            )))
+
+        if pool is None or len(shards) <= 1:
+            results = [
+                allocate_shard(*args, zone_index=zone_index)
+                for _, _, args in shards
+            ]
+        else:
+            results = list(pool.map(
+                allocate_shard, *zip(*(args for _, _, args in shards))
+            ))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # Shard answers, in fleet positions
+    shard_best = np.full(n_sites, -1, dtype=np.int64)
+    shard_scores = np.full(n_sites, np.nan, dtype=np.float64)
+    shard_dists = np.full(n_sites, np.nan, dtype=np.float64)
+    for (officers, sites, _), (local, scores, dists) in zip(shards, results):
+        shard_best[sites] = officers[local]
+        shard_scores[sites], shard_dists[sites] = scores, dists
+
+    allocator = SequentialAllocator(
+        officers_df, zone_index, prune, state, distance
+    )
+    chosen, scores = _walk(
+        allocator, site_lat, site_lon, site_zone, (in_zone, exit_km),
+        shard_best, shard_scores, shard_dists
+    )
+
+    allocation_df = allocation_frame(
+        sites_df, officers_df, state, chosen, scores
+    )
+    return allocation_df, state.write_back(officers_df)
+
+
+def _walk(allocator, site_lat, site_lon, site_zone, terms, shard_best,
+          shard_scores, shard_dists):
+    """
+    Table-order pass of allocate_sites_parallel; returns (chosen,
+    scores) and leaves the allocator's state at the end of the run
+    """
+    state = allocator.state
+    in_zone, exit_km = terms
+    n_sites = len(site_lat)
+    chosen = np.empty(n_sites, dtype=np.int64)
+    scores = np.empty(n_sites, dtype=np.float64)
+
+    # Officers as the shards moved them, and where that differs
+    shard_state = (state.lat.copy(), state.lon.copy(), state.idle.copy(),
+                   state.zone.copy())
+    diverged = np.zeros(len(state), dtype=bool)
+
+    for row in range(n_sites):
+        lat, lon, z = site_lat[row], site_lon[row], site_zone[row]
+        mine = shard_best[row]
+
+        if z >= 0 and not diverged[mine]:
+            # Officers outside zone z cannot win; the rest of the zone
+            # stands where the shard had it and lost to `mine` there
+            best, best_score = mine, shard_scores[row]
+            rivals = np.flatnonzero(diverged & (state.zone == z))
+            if len(rivals):
+                cand = np.sort(np.append(rivals, mine))
+                cand_scores, cand_dists = score_site(
+                    lat, lon, state.lat[cand], state.lon[cand],
+                    state.idle[cand], state.zone[cand], in_zone[row],
+                    exit_km[row], allocator.distance_km
+                )
+                k = np.searchsorted(cand, mine)
+                cand_scores[k], cand_dists[k] = best_score, shard_dists[row]
+                k = pick_best(cand_scores, cand_dists)
+                best, best_score = cand[k], cand_scores[k]
+        else:
+            best, best_score, _ = allocator.choose(
+                lat, lon, (in_zone[row], exit_km[row])
+            )
+
+        allocator.move(best, lat, lon)
+        chosen[row], scores[row] = best, best_score
+
+        touched = [best]
+        if z >= 0:
+            shard_state[0][mine], shard_state[1][mine] = lat, lon
+            shard_state[2][mine], shard_state[3][mine] = False, z
+            touched.append(mine)
+        for pos in touched:
+            diverged[pos] = not (
+                state.lat[pos] == shard_state[0][pos]
+                and state.lon[pos] == shard_state[1][pos]
+                and state.idle[pos] == shard_state[2][pos]
+                and state.zone[pos] == shard_state[3][pos]
+            )
+
+    return chosen, scores
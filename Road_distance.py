@@ -0,0 +1,313 @@
+# ============================================================
+# Offline Road-Network Distances
+# ============================================================
+#
+# RoadNetwork loads a local OSM extract (.osm.pbf, via pyrosm) once,
+# keeps the drivable network as a sparse graph and answers bulk
+# officer -> site distance queries with SciPy's multi-source Dijkstra.
+# The parsed graph is saved next to the extract, so later runs skip
+# the OSM parsing.
+#
+# Points are snapped to their nearest graph node; a query distance is
+# the geodesic access leg at both ends plus the road path between the
+# nodes, so it is never shorter than the straight line. Node-to-node
+# results go to a persistent matrix cache keyed by the snapped nodes:
+# sorted int64 pair keys looked up with np.searchsorted, bounded to
+# MATRIX_MAX_PAIRS (oldest pairs dropped first).
+#
+# Searches stop at SEARCH_LIMIT_KM. Pairs farther apart by road get
+# max(limit, geodesic): still beyond Rule C / D range, never shorter
+# than the straight line, and finite for route sequencing. The cache
+# stores such a pair as -limit ("no path within limit km"), so it
+# stays valid when the limit changes: a larger limit solves the pair
+# again, a smaller one reads cached distances above it as beyond.
+#
+# Each Dijkstra call returns one dense row of n_nodes per destination;
+# calls are sized to DIJKSTRA_MAX_MB.
+#
+# A RoadNetwork is a drop-in distance function for the allocator:
+#
+#     allocate_sites(..., distance=RoadNetwork.from_osm("city.osm.pbf"))
+# ============================================================
+
+import os
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from Candidate_pruning import unit_vectors
+from Geo_distance import geodesic_km
+
+GRAPH_SUFFIX = ".graph.npz"
+MATRIX_SUFFIX = ".matrix.npz"
+
+# Dijkstra stops here (None = whole graph). Rules C and D stop
+# scoring at 10 km; the margin covers the access legs.
+SEARCH_LIMIT_KM = 25.0
+
+# Memory of the distance rows of one Dijkstra call
+# (destinations x n_nodes x 8 bytes)
+DIJKSTRA_MAX_MB = 256
+
+# Node pairs kept in the matrix cache
+MATRIX_MAX_PAIRS = 1_000_000
+
+# ============================================================
+# Road Graph
+# ============================================================
+
+def _graph_from_osm(osm_path, network_type="driving"):
+    """
+    (node_lat, node_lon, tail, head, length_km) of the drivable network
+    """
+    # pyrosm is only needed to parse a new extract
+    from pyrosm import OSM
+
+    nodes, edges = OSM(osm_path).get_network(
+        network_type=network_type, nodes=True
+    )
+    node_ids = nodes["id"].to_numpy()
+    position = {node_id: pos for pos, node_id in enumerate(node_ids)}
+
+    tail = edges["u"].map(position).to_numpy()
+    head = edges["v"].map(position).to_numpy()
+    keep = ~(np.isnan(tail.astype(np.float64))
+             | np.isnan(head.astype(np.float64)))
+    tail = tail[keep].astype(np.int64)
+    head = head[keep].astype(np.int64)
+    length_km = edges["length"].to_numpy(dtype=np.float64)[keep] / 1000
+
+    # pyrosm lists two-way streets once
+    oneway = edges["oneway"].fillna("no").astype(str).str.lower()
+    two_way = ~oneway.isin(["yes", "true", "1", "-1"]).to_numpy()[keep]
+    tail, head = (np.concatenate([tail, head[two_way]]),
+                  np.concatenate([head, tail[two_way]]))
+    length_km = np.concatenate([length_km, length_km[two_way]])
+
+    return (nodes["lat"].to_numpy(dtype=np.float64),
+            nodes["lon"].to_numpy(dtype=np.float64),
+            tail, head, length_km)
+
+
+class RoadNetwork:
+
+    def __init__(self, node_lat, node_lon, tail, head, length_km,
+                 matrix_path=None, limit_km=SEARCH_LIMIT_KM,
+                 max_pairs=MATRIX_MAX_PAIRS):
+        self.node_lat = np.asarray(node_lat, dtype=np.float64)
+        self.node_lon = np.asarray(node_lon, dtype=np.float64)
+        n_nodes = len(self.node_lat)
+        self.n_nodes = n_nodes
+
+        # Parallel edges: csr_matrix sums duplicates, keep the shortest
+        order = np.lexsort((length_km, head, tail))
+        tail, head, length_km = tail[order], head[order], length_km[order]
+        first = np.ones(len(tail), dtype=bool)
+        first[1:] = (tail[1:] != tail[:-1]) | (head[1:] != head[:-1])
+
+        self.graph = csr_matrix(
+            (length_km[first], (tail[first], head[first])),
+            shape=(n_nodes, n_nodes)
+        )
+        # Dijkstra from a site on the reversed graph gives
+        # officer -> site distances with one-way streets respected
+        self.reverse = self.graph.T.tocsr()
+        self.tree = cKDTree(unit_vectors(self.node_lat, self.node_lon))
+        self.limit_km = np.inf if limit_km is None else float(limit_km)
+        self.dijkstra_rows = max(
+            1, DIJKSTRA_MAX_MB * 2 ** 20 // (8 * max(n_nodes, 1))
+        )
+
+        # Matrix cache: sorted src * n_nodes + dst keys, road km (or
+        # -limit, see above) and insertion order
+        self.matrix_path = matrix_path
+        self.max_pairs = max_pairs
+        self.keys = np.empty(0, dtype=np.int64)
+        self.km = np.empty(0, dtype=np.float64)
+        self.age = np.empty(0, dtype=np.int64)
+        self.clock = 0
+        if matrix_path and os.path.exists(matrix_path):
+            self.load_matrix(matrix_path)
+
+    @classmethod
+    def from_osm(cls, osm_path, network_type="driving", **kwargs):
+        """
+        Network of a local OSM extract; the parsed graph and the
+        distance matrix are cached next to it
+        """
+        graph_path = osm_path + GRAPH_SUFFIX
+        if (os.path.exists(graph_path)
+                and os.path.getmtime(graph_path) >= os.path.getmtime(osm_path)):
+            with np.load(graph_path) as data:
+                arrays = [data[k] for k in
+                          ("node_lat", "node_lon", "tail", "head", "length_km")]
+        else:
+            arrays = _graph_from_osm(osm_path, network_type)
+            np.savez(graph_path, **dict(zip(
+                ("node_lat", "node_lon", "tail", "head", "length_km"), arrays
+            )))
+
+        kwargs.setdefault("matrix_path", osm_path + MATRIX_SUFFIX)
+        return cls(*arrays, **kwargs)
+
+    # ========================================================
+    # Snapping
+    # ========================================================
+
+    def snap(self, lat, lon):
+        """
+        Nearest graph node of every point and the access leg in km
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        _, nodes = self.tree.query(unit_vectors(lat.ravel(), lon.ravel()))
+        nodes = nodes.reshape(lat.shape)
+        access_km = geodesic_km(
+            lat, lon, self.node_lat[nodes], self.node_lon[nodes]
+        )
+        return nodes, access_km
+
+    # ========================================================
+    # Node-to-Node Matrix
+    # ========================================================
+
+    def node_distances(self, src_nodes, dst_nodes):
+        """
+        Road km from src_nodes[i] to dst_nodes[i] (inf beyond the
+        search limit), through the matrix cache; missing pairs are
+        solved one Dijkstra per destination, dijkstra_rows at a time
+        """
+        src_nodes = np.asarray(src_nodes, dtype=np.int64).ravel()
+        dst_nodes = np.asarray(dst_nodes, dtype=np.int64).ravel()
+        keys = src_nodes * self.n_nodes + dst_nodes
+        km = self._lookup(keys)
+
+        missing = np.flatnonzero(np.isnan(km))
+        if len(missing):
+            targets, target_pos = np.unique(
+                dst_nodes[missing], return_inverse=True
+            )
+            solved = np.empty(len(missing), dtype=np.float64)
+            rows = self.dijkstra_rows
+            for start in range(0, len(targets), rows):
+                block = (target_pos >= start) & (target_pos < start + rows)
+                to_target = dijkstra(
+                    self.reverse, limit=self.limit_km,
+                    indices=targets[start:start + rows]
+                )
+                solved[block] = to_target[
+                    target_pos[block] - start, src_nodes[missing[block]]
+                ]
+            km[missing] = solved
+            self._store(keys[missing], solved)
+        return km
+
+    def _lookup(self, keys):
+        """
+        Cached road km of pair keys under the current limit, NaN where
+        the pair is not cached or was only searched to a smaller limit
+        """
+        km = np.full(len(keys), np.nan)
+        if not len(self.keys):
+            return km
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        hit = self.keys[pos] == keys
+        value = self.km[pos[hit]]
+        km[hit] = np.where(
+            value >= 0,
+            np.where(value <= self.limit_km, value, np.inf),
+            np.where(self.limit_km <= -value, np.inf, np.nan)
+        )
+        return km
+
+    def _store(self, keys, km):
+        """
+        Add solved pairs (inf = no path within the current limit)
+        """
+        keys, first = np.unique(keys, return_index=True)
+        value = np.where(np.isinf(km[first]), -self.limit_km, km[first])
+        # Insertion order: position in this batch
+        age = self.clock + first
+        self.clock += len(km)
+
+        pos = np.searchsorted(self.keys, keys)
+        known = pos < len(self.keys)
+        known[known] = self.keys[pos[known]] == keys[known]
+        # Searched again with a larger limit: replace
+        self.km[pos[known]], self.age[pos[known]] = value[known], age[known]
+
+        new = ~known
+        self.keys = np.insert(self.keys, pos[new], keys[new])
+        self.km = np.insert(self.km, pos[new], value[new])
+        self.age = np.insert(self.age, pos[new], age[new])
+        self._trim_matrix()
+
+    def _trim_matrix(self):
+        excess = len(self.keys) - self.max_pairs
+        if excess > 0:
+            # Drop the oldest pairs
+            keep = self.age >= np.partition(self.age, excess)[excess]
+            self.keys, self.km = self.keys[keep], self.km[keep]
+            self.age = self.age[keep]
+
+    def load_matrix(self, path):
+        """
+        Matrix cache from a save_matrix file (replaces the current one)
+        """
+        with np.load(path) as data:
+            src, dst, km = data["src"], data["dst"], data["km"]
+        # Files list pairs oldest first; plain inf pairs of older files
+        # lack the limit they were searched to
+        keep = np.flatnonzero(~np.isposinf(km))
+        self.keys, first = np.unique(
+            src[keep] * self.n_nodes + dst[keep], return_index=True
+        )
+        self.km = km[keep][first]
+        self.age = keep[first].astype(np.int64)
+        self.clock = len(km)
+        self._trim_matrix()
+
+    def save_matrix(self, path=None):
+        """
+        Persist the node-to-node matrix (call once after a run)
+        """
+        path = path or self.matrix_path
+        if not path:
+            return
+        order = np.argsort(self.age)
+        keys = self.keys[order]
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, src=keys // self.n_nodes,
+                 dst=keys % self.n_nodes, km=self.km[order])
+        os.replace(tmp_path, path)
+
+    # ========================================================
+    # Distance Function
+    # ========================================================
+
+    def __call__(self, lat1, lon1, lat2, lon2):
+        """
+        Road km from (lat1, lon1) to (lat2, lon2), broadcasting like
+        Geo_distance.geodesic_km
+        """
+        lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+            np.asarray(lat1, dtype=np.float64),
+            np.asarray(lon1, dtype=np.float64),
+            np.asarray(lat2, dtype=np.float64),
+            np.asarray(lon2, dtype=np.float64),
+        )
+        src, src_access = self.snap(lat1, lon1)
+        dst, dst_access = self.snap(lat2, lon2)
+        road = self.node_distances(src, dst).reshape(src.shape)
+        km = np.asarray(src_access + road + dst_access, dtype=np.float64)
+
+        # Beyond the search limit: out of scoring range, finite
+        far = np.isinf(km)
+        if far.any():
+            km[far] = np.maximum(
+                self.limit_km,
+                geodesic_km(lat1[far], lon1[far], lat2[far], lon2[far])
+            )
+        return km
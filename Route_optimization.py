@@ -4,9 +4,18 @@
 
 import pandas as pd
 import math
+import numpy as np
 from shapely.geometry import Point, Polygon
 from geopy.distance import geodesic
 
+from Allocation_profiler import profiling, section
+from Data_loader import STRIP, read_table
+from Officer_state import OfficerStateCache
+from Site_queue import priority_order
+from Score_engine import allocate_sites_vectorized, zone_exit_km
+from Zone_geometry import vertex_columns, zone_polygons
+from Zone_index import ZoneIndex
+
 # ============================================================
 # Helper Functions
 # ============================================================
@@ -18,21 +27,24 @@ def calculate_distance(lat1, lon1, lat2, lon2):
 def build_zone_polygon(row):
     """
     Build polygon from zone table:
-    lat1,long1 ... lat4,long4
+    lat1,long1 ... latN,longN
+    (whole tables: Zone_geometry.zone_polygons)
     """
     coords = []
-    for i in range(1, 5):
-        lat_col = f"lat{i}"
-        lon_col = f"long{i}"
+    for lat_col, lon_col in vertex_columns(row.index):
         if not pd.isna(row[lat_col]) and not pd.isna(row[lon_col]):
             coords.append((row[lon_col], row[lat_col]))
     return Polygon(coords)
 
 
-def find_current_zone(point, zones_df):
+def find_current_zone(point, zones_df, zone_index=None):
     """
     Find zone where officer is currently present
+    (zone_index: prebuilt ZoneIndex over zones_df, skips the row scan)
     """
+    if zone_index is not None:
+        return zone_index.find(point)
+
     for _, zone in zones_df.iterrows():
         if zone["polygon"].contains(point):
             return zone["zone"], zone["polygon"]
@@ -60,43 +72,74 @@ def distance_after_current_zone_exit(current_zone_polygon, site_point):
     ).km
 
 
+def distances_after_current_zone_exit(current_zone_polygon, site_lats,
+                                      site_lons):
+    """
+    Rule 4 for an array of sites against one zone, in one batched pass
+    """
+    if current_zone_polygon is None:
+        return np.zeros(np.shape(site_lats), dtype=np.float64)
+
+    return zone_exit_km(current_zone_polygon, site_lats, site_lons)
+
+
 # ============================================================
 # Scoring Logic
 # ============================================================
 
-def calculate_officer_score(officer, site, zones_df):
+def calculate_officer_score(officer, site, zones_df, zone_index=None,
+                            officer_state=None):
+    """
+    officer_state: OfficerStateCache holding the officer's current zone,
+    skips the zone lookup for this pair
+    """
     score = 0.0
 
-    officer_point = Point(officer["long"], officer["lat"])
-    site_point = Point(site["property_longitude"], site["property_latitude"])
+    with section("row_access"):
+        officer_lat, officer_lon = officer["lat"], officer["long"]
+        site_lat = site["property_latitude"]
+        site_lon = site["property_longitude"]
+        officer_point = Point(officer_lon, officer_lat)
+        site_point = Point(site_lon, site_lat)
 
     # Rule A: Idle / Active
-    if officer["Active (Y/N)"] == "Y":
-        score += 0.3
+    with section("rule_a"):
+        if officer["Active (Y/N)"] == "Y":
+            score += 0.3
 
     # Find officer current zone
-    _, current_zone_polygon = find_current_zone(officer_point, zones_df)
+    with section("zone_resolution"):
+        if officer_state is not None:
+            current_zone_polygon = officer_state.zone_polygon(
+                officer_state.position(officer.name)
+            )
+        else:
+            _, current_zone_polygon = find_current_zone(
+                officer_point, zones_df, zone_index
+            )
 
     # Rule B: Site inside officer current zone
-    if current_zone_polygon and current_zone_polygon.contains(site_point):
-        score += 0.4
+    with section("rule_b"):
+        if current_zone_polygon and current_zone_polygon.contains(site_point):
+            score += 0.4
 
     # Rule C: Distance from officer to site
-    dist_to_site = calculate_distance(
-        officer["lat"], officer["long"],
-        site["property_latitude"], site["property_longitude"]
-    )
+    with section("rule_c"):
+        dist_to_site = calculate_distance(
+            officer_lat, officer_lon, site_lat, site_lon
+        )
 
-    if dist_to_site <= 10:
-        score += (0.4 - dist_to_site * 0.04)
+        if dist_to_site <= 10:
+            score += (0.4 - dist_to_site * 0.04)
 
     # Rule D: Distance after crossing CURRENT zone
-    outside_distance = distance_after_current_zone_exit(
-        current_zone_polygon, site_point
-    )
+    with section("rule_d"):
+        outside_distance = distance_after_current_zone_exit(
+            current_zone_polygon, site_point
+        )
 
-    if outside_distance <= 10:
-        score += (0.2 - outside_distance * 0.02)
+        if outside_distance <= 10:
+            score += (0.2 - outside_distance * 0.02)
 
     return score, dist_to_site
 
@@ -105,40 +148,133 @@ def calculate_officer_score(officer, site, zones_df):
 # Allocation Engine
 # ============================================================
 
-def allocate_sites(officers_df, sites_df, zones_df):
+def allocate_sites(officers_df, sites_df, zones_df, mode="vectorized",
+                   capacity=None, prune=None, workers=None, distance=None,
+                   profiler=None, time_limit=None, prioritize=False,
+                   state_log=None):
+    """
+    mode = "vectorized" : batched NumPy scoring (Score_engine),
+                          optionally pruned to nearby officers
+    mode = "scalar"     : one calculate_officer_score call per pair
+    Both modes give the same allocations.
+
+    distance (not in scalar mode, which raises): Rule C distance function,
+    None = geodesic, Road_distance.RoadNetwork = road km,
+    Distance_cache.DistanceMemo = road km memoized by exact
+    coordinates (same results)
+
+    mode = "batch"      : global max-score assignment of the whole sheet
+                          with per-officer capacities (Batch_assignment)
+
+    mode = "parallel"   : greedy allocation sharded by zone on a process
+                          pool of `workers` (Parallel_allocation), same
+                          allocations as the vectorized mode
+
+    mode = "vrp"        : allocation + visiting order under capacity,
+                          shift, service time and time windows, large
+                          neighbourhood search for `time_limit` seconds
+                          (Vrp_allocation)
+
+    profiler: Allocation_profiler.AllocationProfiler collecting per-rule
+    timings for this run, None = off
+
+    prioritize: allocate is_high_priority sites first, then by SLA
+    deadline and arrival time (Site_queue.priority_order); the
+    allocation table follows that order
+
+    state_log (vectorized): State_log.StateLog that records every
+    assignment (with periodic officer snapshots); an interrupted run
+    of the same sheet resumes where its log ends
+    """
+    if prioritize:
+        sites_df = sites_df.iloc[priority_order(sites_df)]
+
+    with profiling(profiler), section("allocate_sites"):
+        return _allocate_sites(
+            officers_df, sites_df, zones_df, mode, capacity, prune,
+            workers, distance, time_limit, state_log
+        )
+
+
+def _allocate_sites(officers_df, sites_df, zones_df, mode, capacity, prune,
+                    workers, distance, time_limit, state_log):
+    if mode == "vectorized":
+        return allocate_sites_vectorized(
+            officers_df, sites_df, zones_df, prune=prune, distance=distance,
+            state_log=state_log
+        )
+    if state_log is not None:
+        raise ValueError(f"state_log is not supported in {mode} mode")
+    if mode == "batch":
+        # OR-Tools is only needed for batch mode
+        from Batch_assignment import allocate_sites_batch
+
+        return allocate_sites_batch(
+            officers_df, sites_df, zones_df, capacity=capacity,
+            distance=distance
+        )
+    if mode == "parallel":
+        from Parallel_allocation import allocate_sites_parallel
+
+        return allocate_sites_parallel(
+            officers_df, sites_df, zones_df, workers=workers, prune=prune,
+            distance=distance
+        )
+    if mode == "vrp":
+        from Vrp_allocation import TIME_LIMIT_S, allocate_sites_vrp
+
+        return allocate_sites_vrp(
+            officers_df, sites_df, zones_df, capacity=capacity,
+            distance=distance,
+            time_limit=TIME_LIMIT_S if time_limit is None else time_limit
+        )
+    if mode != "scalar":
+        raise ValueError(f"Unknown allocation mode: {mode}")
+    if distance is not None:
+        raise ValueError("scalar mode only supports geodesic distances")
+
     allocations = []
+    zone_index = ZoneIndex.from_zones_df(zones_df)
+    officer_state = OfficerStateCache(officers_df, zone_index)
 
     for _, site in sites_df.iterrows():
-
-        best_score = -math.inf
-        best_idx = None
-        best_distance = math.inf
-
-        for idx, officer in officers_df.iterrows():
-            score, dist = calculate_officer_score(officer, site, zones_df)
-
-            # Tie-breaker: nearest officer
-            if score > best_score or (score == best_score and dist < best_distance):
-                best_score = score
-                best_idx = idx
-                best_distance = dist
-
-        chosen_officer = officers_df.loc[best_idx]
-
-        allocations.append({
-            "request_id": site["request_id"],
-            "customer_name": site["customer_name"],
-            "assigned_FO_Id": chosen_officer["FO Id"],
-            "assigned_FO_Name": chosen_officer["Field officer Name"],
-            "site_lat": site["property_latitude"],
-            "site_lon": site["property_longitude"],
-            "final_score": round(best_score, 3)
-        })
-
-        # Sequential update of officer location & status
-        officers_df.at[best_idx, "lat"] = site["property_latitude"]
-        officers_df.at[best_idx, "long"] = site["property_longitude"]
-        officers_df.at[best_idx, "Active (Y/N)"] = "N"
+        with section("site"):
+            best_score = -math.inf
+            best_idx = None
+            best_distance = math.inf
+
+            for idx, officer in officers_df.iterrows():
+                score, dist = calculate_officer_score(
+                    officer, site, zones_df, zone_index, officer_state
+                )
+
+                # Tie-breaker: nearest officer
+                if score > best_score or (score == best_score and dist < best_distance):
+                    best_score = score
+                    best_idx = idx
+                    best_distance = dist
+
+            chosen_officer = officers_df.loc[best_idx]
+
+            allocations.append({
+                "request_id": site["request_id"],
+                "customer_name": site["customer_name"],
+                "assigned_FO_Id": chosen_officer["FO Id"],
+                "assigned_FO_Name": chosen_officer["Field officer Name"],
+                "site_lat": site["property_latitude"],
+                "site_lon": site["property_longitude"],
+                "final_score": round(best_score, 3)
+            })
+
+            # Sequential update of officer location & status
+            with section("state_update"):
+                officers_df.at[best_idx, "lat"] = site["property_latitude"]
+                officers_df.at[best_idx, "long"] = site["property_longitude"]
+                officers_df.at[best_idx, "Active (Y/N)"] = "N"
+                officer_state.move(
+                    officer_state.position(best_idx),
+                    site["property_latitude"], site["property_longitude"]
+                )
 
     return pd.DataFrame(allocations), officers_df
 
@@ -150,27 +286,104 @@ def allocate_sites(officers_df, sites_df, zones_df):
 if __name__ == "__main__":
     
     SITE_FILE =    r"C:\Users\Dell\Pictures\sites.xlsx"
-    ZONE_FILE =    r"C:\Users\Dell\Pictures\zone.xlsx"
+    ZONE_FILE =    r"C:\Users\Dell\Pictures\zone.xlsx"   # or Divide_zone's sub_zones.xlsx
     OFFICER_FILE = r"C:\Users\Dell\Pictures\off.xlsx"
 
     OUTPUT_ALLOC = "final_site_allocation.xlsx"
     OUTPUT_UPDATED_OFFICERS = "updated_field_officers.xlsx"
 
-    # Load Excel files
-    officers_df = pd.read_excel(OFFICER_FILE)
-    sites_df = pd.read_excel(SITE_FILE)
-    zones_df = pd.read_excel(ZONE_FILE)
-
-    # Build zone polygons
-    zones_df["polygon"] = zones_df.apply(build_zone_polygon, axis=1)
-
-    # Run allocation
-    allocation_df, updated_officers_df = allocate_sites(
-        officers_df, sites_df, zones_df
-    )
+    ALLOCATION_MODE = "vectorized"   # "vectorized" | "scalar" | "batch" | "parallel" | "vrp"
+    OFFICER_CAPACITY = None          # batch / vrp default, None = unlimited
+    VRP_TIME_LIMIT = 120             # vrp mode search seconds
+    PRIORITIZE_SITES = True          # is_high_priority / SLA / arrival order
+    WORKERS = None                   # parallel mode processes, None = all cores
+    ROAD_NETWORK_FILE = None         # local .osm.pbf for road km, None = geodesic
+    DISTANCE_CACHE_MB = None         # road distance memo (MB), None = off
+    SEQUENCE_ROUTES = True           # visiting order per officer
+    OUTPUT_ROUTES = "officer_routes.xlsx"
+    PROFILE = False                  # per-rule timing summary
+    PROFILE_TRACE_FILE = None        # Chrome-trace JSON path (needs PROFILE)
+    STATE_LOG_FILE = "allocation_events.log"  # event log, archived on success
+
+    # Load Excel files (cached, officer columns keep "FO Id" etc.)
+    officers_df = read_table(OFFICER_FILE, columns=STRIP)
+    # Starting locations for route sequencing (allocation moves officers)
+    start_df = officers_df[["FO Id", "lat", "long"]].copy()
+    sites_df = read_table(SITE_FILE)
+    zones_df = read_table(ZONE_FILE)
+
+    # Build zone polygons (cached, prepared)
+    zones_df["polygon"] = zone_polygons(zones_df)
+
+    road_network = None
+    if ROAD_NETWORK_FILE:
+        from Road_distance import RoadNetwork
+
+        road_network = RoadNetwork.from_osm(ROAD_NETWORK_FILE)
+
+    distance = road_network
+    if DISTANCE_CACHE_MB and road_network is not None:
+        from Distance_cache import DistanceMemo
+
+        distance = DistanceMemo(
+            road_network, max_bytes=DISTANCE_CACHE_MB * 2 ** 20
+        )
+
+    profiler = None
+    if PROFILE:
+        from Allocation_profiler import AllocationProfiler
+
+        profiler = AllocationProfiler(trace=PROFILE_TRACE_FILE is not None)
+
+    state_log = None
+    if STATE_LOG_FILE and ALLOCATION_MODE == "vectorized":
+        from State_log import StateLog
+
+        state_log = StateLog(STATE_LOG_FILE)
+
+    # Run allocation (resumes from the state log after a crash)
+    try:
+        allocation_df, updated_officers_df = allocate_sites(
+            officers_df, sites_df, zones_df,
+            mode=ALLOCATION_MODE, capacity=OFFICER_CAPACITY, workers=WORKERS,
+            distance=distance, profiler=profiler, time_limit=VRP_TIME_LIMIT,
+            prioritize=PRIORITIZE_SITES, state_log=state_log
+        )
+    finally:
+        if state_log is not None:
+            state_log.close()
+
+    if profiler is not None:
+        print(profiler.summary().to_string(index=False))
+        if PROFILE_TRACE_FILE:
+            profiler.save_chrome_trace(PROFILE_TRACE_FILE)
+
+    if road_network is not None:
+        road_network.save_matrix()
+
+    if hasattr(distance, "stats") and ALLOCATION_MODE != "scalar":
+        for name, s in distance.stats().items():
+            print(f"{name} cache: {s['hits']} hits, {s['misses']} misses "
+                  f"({s['hit_rate']:.1%}), {s['entries']} entries")
 
     # Save output
     allocation_df.to_excel(OUTPUT_ALLOC, index=False)
     updated_officers_df.to_excel(OUTPUT_UPDATED_OFFICERS, index=False)
 
+    # Kept for replay; the next run starts a new log
+    if state_log is not None:
+        print(f"Event log archived to {state_log.archive()}")
+
+    # vrp mode already returns each officer's visiting order
+    if SEQUENCE_ROUTES and ALLOCATION_MODE != "vrp":
+        from Route_sequencing import sequence_routes
+
+        routes_df, route_summary_df = sequence_routes(
+            allocation_df, start_df, workers=WORKERS, distance=distance
+        )
+        with pd.ExcelWriter(OUTPUT_ROUTES) as writer:
+            routes_df.to_excel(writer, sheet_name="routes", index=False)
+            route_summary_df.to_excel(writer, sheet_name="summary",
+                                      index=False)
+
     print("✅ Allocation completed successfully")
@@ -0,0 +1,280 @@
+# ============================================================
+# Multi-Stop Route Sequencing per Officer
+# ============================================================
+#
+# After allocation every officer has a set of sites but no visiting
+# order. sequence_stops builds one short tour per officer:
+#
+#   1. distance matrix over start + stops (any distance function)
+#   2. nearest-neighbour construction from the start
+#   3. 2-opt and Or-opt local search until neither improves
+#
+# Tours are open paths from the officer's starting location (or closed
+# back to it with return_to_start). A zero-cost dummy end node turns
+# the open path into a fixed-endpoint one, so both moves always have
+# a next node. Move deltas are evaluated with NumPy for all positions
+# at once and include the reversed-segment cost, so asymmetric road
+# distances are handled exactly.
+# ============================================================
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Geo_distance import geodesic_km
+
+# Or-opt moves chains of up to this many stops
+OR_OPT_MAX_SEGMENT = 3
+
+# Local search rounds (2-opt + Or-opt) before giving up
+MAX_ROUNDS = 100
+
+IMPROVEMENT_EPS = 1e-9
+
+# Fewer officers than this are sequenced inline, not on the pool
+MIN_PARALLEL_OFFICERS = 8
+
+# ============================================================
+# Tour Construction
+# ============================================================
+
+def tour_matrix(start_lat, start_lon, stop_lat, stop_lon,
+                distance_km=geodesic_km, return_to_start=False):
+    """
+    (n + 2) x (n + 2) km matrix: node 0 = start, 1..n = stops,
+    n + 1 = end (free for open tours, the start for closed ones)
+    """
+    lat = np.concatenate([[start_lat], stop_lat])
+    lon = np.concatenate([[start_lon], stop_lon])
+    n = len(lat)
+
+    d = np.zeros((n + 1, n + 1), dtype=np.float64)
+    d[:n, :n] = distance_km(lat[:, None], lon[:, None], lat[None, :],
+                            lon[None, :])
+    if return_to_start:
+        d[:n, n] = d[:n, 0]
+    # Missing coordinates would poison every delta
+    d[~np.isfinite(d)] = np.inf
+    return d
+
+
+def nearest_neighbour(d):
+    """
+    Route start -> nearest unvisited stop -> ... -> end
+    """
+    n_stops = len(d) - 2
+    route = [0]
+    unvisited = np.ones(len(d), dtype=bool)
+    unvisited[[0, -1]] = False
+
+    for _ in range(n_stops):
+        row = np.where(unvisited, d[route[-1]], np.inf)
+        nxt = int(np.argmin(row))
+        route.append(nxt)
+        unvisited[nxt] = False
+
+    route.append(len(d) - 1)
+    return np.asarray(route, dtype=np.int64)
+
+
+def route_km(route, d):
+    return float(d[route[:-1], route[1:]].sum())
+
+
+# ============================================================
+# Local Search
+# ============================================================
+
+def two_opt(route, d):
+    """
+    Best 2-opt move (reverse route[i..j]) for every i, first improving
+    i applied; returns (route, improved)
+    """
+    route = route.copy()
+    improved = False
+    n = len(route)
+    i = 1
+
+    while i < n - 2:
+        # Prefix sums of the forward and reversed edge costs
+        fwd = np.concatenate([[0.0], np.cumsum(d[route[:-1], route[1:]])])
+        bwd = np.concatenate([[0.0], np.cumsum(d[route[1:], route[:-1]])])
+
+        j = np.arange(i + 1, n - 1)
+        a, b = route[i - 1], route[i]
+        c, e = route[j], route[j + 1]
+        delta = (d[a, c] + d[b, e] - d[a, b] - d[c, e]
+                 + (bwd[j] - bwd[i]) - (fwd[j] - fwd[i]))
+
+        best = int(np.argmin(delta))
+        if delta[best] < -IMPROVEMENT_EPS:
+            route[i:j[best] + 1] = route[i:j[best] + 1][::-1].copy()
+            improved = True
+        else:
+            i += 1
+
+    return route, improved
+
+
+def or_opt(route, d, max_segment=OR_OPT_MAX_SEGMENT):
+    """
+    Move chains of 1..max_segment stops (order kept) to their best
+    position elsewhere in the route; returns (route, improved)
+    """
+    improved = False
+
+    for length in range(1, max_segment + 1):
+        i = 1
+        while i + length < len(route):
+            last = i + length - 1
+            prev_, next_ = route[i - 1], route[last + 1]
+            first_stop, last_stop = route[i], route[last]
+            remove_gain = (d[prev_, first_stop] + d[last_stop, next_]
+                           - d[prev_, next_])
+
+            # Insert between route[p] and route[p + 1], p outside chain
+            p = np.arange(len(route) - 1)
+            p = p[(p < i - 1) | (p > last)]
+            before, after = route[p], route[p + 1]
+            insert_cost = (d[before, first_stop] + d[last_stop, after]
+                           - d[before, after])
+
+            best = int(np.argmin(insert_cost)) if len(p) else -1
+            if (best >= 0 and
+                    insert_cost[best] - remove_gain < -IMPROVEMENT_EPS):
+                chain = route[i:last + 1]
+                rest = np.concatenate([route[:i], route[last + 1:]])
+                at = p[best] + 1 if p[best] < i else p[best] + 1 - length
+                route = np.concatenate([rest[:at], chain, rest[at:]])
+                improved = True
+            else:
+                i += 1
+
+    return route, improved
+
+
+def improve(route, d, max_rounds=MAX_ROUNDS):
+    for _ in range(max_rounds):
+        route, moved_2opt = two_opt(route, d)
+        route, moved_or = or_opt(route, d)
+        if not (moved_2opt or moved_or):
+            break
+    return route
+
+
+# ============================================================
+# One Officer
+# ============================================================
+
+def sequence_stops(start_lat, start_lon, stop_lat, stop_lon,
+                   distance_km=geodesic_km, return_to_start=False):
+    """
+    (order, leg_km, total_km): visiting order of the stops (positions
+    into stop_lat / stop_lon), km of each leg from the start or the
+    previous stop, and the tour length (with the way back for closed
+    tours)
+    """
+    stop_lat = np.asarray(stop_lat, dtype=np.float64)
+    stop_lon = np.asarray(stop_lon, dtype=np.float64)
+    if len(stop_lat) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), 0.0
+
+    d = tour_matrix(start_lat, start_lon, stop_lat, stop_lon,
+                    distance_km, return_to_start)
+    route = nearest_neighbour(d)
+    if len(stop_lat) > 1:
+        route = improve(route, d)
+
+    stops = route[1:-1]
+    leg_km = d[route[:-2], stops]
+    return stops - 1, leg_km, route_km(route, d)
+
+
+# Distance function of this worker process, set once by the pool
+# initializer instead of being pickled into every job
+_DISTANCE_KM = geodesic_km
+
+
+def _init_worker(distance_km):
+    global _DISTANCE_KM
+    _DISTANCE_KM = distance_km
+
+
+def _sequence_job(job):
+    start_lat, start_lon, stop_lat, stop_lon, closed = job
+    return sequence_stops(start_lat, start_lon, stop_lat, stop_lon,
+                          _DISTANCE_KM, closed)
+
+
+# ============================================================
+# All Officers
+# ============================================================
+
+def sequence_routes(allocation_df, start_df, workers=None, distance=None,
+                    return_to_start=False, id_column="FO Id"):
+    """
+    Visiting order for every officer of an allocation table.
+
+    start_df: officers at their starting location (id_column, lat,
+    long), i.e. the officer table from BEFORE allocate_sites moved
+    them. Officers are sequenced on a process pool of `workers`
+    (None = every core, 1 = inline).
+
+    Returns the allocation rows ordered by officer and visit, with
+    visit_order (1-based) and leg_km, plus one summary row per
+    officer (stops, route_km).
+    """
+    distance_km = distance or geodesic_km
+    starts = start_df.drop_duplicates(id_column).set_index(id_column)
+
+    assigned = allocation_df[allocation_df["assigned_FO_Id"].notna()]
+    groups = [
+        (officer_id, rows) for officer_id, rows
+        in assigned.groupby("assigned_FO_Id", sort=False)
+    ]
+    missing = [o for o, _ in groups if o not in starts.index]
+    if missing:
+        raise ValueError(f"No starting location for officers: {missing}")
+
+    jobs = [(
+        float(starts.at[officer_id, "lat"]),
+        float(starts.at[officer_id, "long"]),
+        rows["site_lat"].to_numpy(dtype=np.float64),
+        rows["site_lon"].to_numpy(dtype=np.float64),
+        return_to_start,
+    ) for officer_id, rows in groups]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < MIN_PARALLEL_OFFICERS:
+        results = [sequence_stops(*job[:4], distance_km, job[4])
+                   for job in jobs]
+    else:
+        # Biggest tours first so the pool stays busy to the end
+        order = sorted(range(len(jobs)), key=lambda k: -len(jobs[k][2]))
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_worker,
+                                 initargs=(distance_km,)) as pool:
+            done = pool.map(_sequence_job, [jobs[k] for k in order])
+            results = [None] * len(jobs)
+            for k, result in zip(order, done):
+                results[k] = result
+
+    routes, summary = [], []
+    for (officer_id, rows), result in zip(groups, results):
+        stops, leg_km, total_km = result
+        route = rows.iloc[stops].copy()
+        route["visit_order"] = np.arange(1, len(stops) + 1)
+        route["leg_km"] = np.round(leg_km, 3)
+        routes.append(route)
+        summary.append({
+            "assigned_FO_Id": officer_id,
+            "stops": len(stops),
+            "route_km": round(total_km, 3),
+        })
+
+    if not routes:
+        return (allocation_df.iloc[:0].assign(visit_order=[], leg_km=[]),
+                pd.DataFrame(columns=["assigned_FO_Id", "stops", "route_km"]))
+    return pd.concat(routes, ignore_index=True), pd.DataFrame(summary)
@@ -0,0 +1,354 @@
+# ============================================================
+# Vectorized Officer x Site Scoring Engine
+# ============================================================
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from Allocation_profiler import count, section
+from Geo_distance import geodesic_km
+from Officer_state import OfficerStateCache
+from Zone_index import ZoneIndex
+
+# Fleet size from which candidate pruning pays off
+PRUNE_MIN_OFFICERS = 200
+
+# Zone boundaries kept ready for Rule D projections
+BOUNDARY_CACHE_SIZE = 4096
+
+# ============================================================
+# Zone Terms
+# ============================================================
+
+def site_zone_terms(site_lat, site_lon, polygons):
+    """
+    Per-zone Rule B flag and Rule D exit distance for one site.
+
+    Both arrays carry one extra trailing entry for officers outside
+    every zone (no Rule B, zero exit distance), so they can be indexed
+    directly with the -1 zone ids of officers outside every zone.
+    """
+    n_zones = len(polygons)
+    in_zone = np.zeros(n_zones + 1, dtype=bool)
+    exit_km = np.zeros(n_zones + 1, dtype=np.float64)
+    if n_zones == 0:
+        return in_zone, exit_km
+
+    polygons = np.asarray(polygons, dtype=object)
+    site_point = shapely.points(site_lon, site_lat)
+
+    in_zone[:n_zones] = shapely.contains_xy(polygons, site_lon, site_lat)
+
+    outside = ~in_zone[:n_zones]
+    if outside.any():
+        exteriors = shapely.get_exterior_ring(polygons[outside])
+        boundary_points = shapely.line_interpolate_point(
+            exteriors, shapely.line_locate_point(exteriors, site_point)
+        )
+        exit_km[:n_zones][outside] = geodesic_km(
+            shapely.get_y(boundary_points), shapely.get_x(boundary_points),
+            site_lat, site_lon
+        )
+
+    return in_zone, exit_km
+
+
+@lru_cache(maxsize=BOUNDARY_CACHE_SIZE)
+def zone_boundary(polygon):
+    """
+    Prepared exterior ring of a zone polygon, built once per zone
+    """
+    exterior = polygon.exterior
+    shapely.prepare(exterior)
+    return exterior
+
+
+def zone_exit_km(polygon, site_lat, site_lon, inside=None):
+    """
+    Rule D exit distance from one zone to many sites at once.
+
+    Same as distance_after_current_zone_exit for every site: 0 inside
+    the zone, otherwise the geodesic from the nearest boundary point
+    (projected in lon/lat degrees) to the site.
+    inside: contains flags if the caller already has them
+    """
+    site_lat = np.asarray(site_lat, dtype=np.float64)
+    site_lon = np.asarray(site_lon, dtype=np.float64)
+    if inside is None:
+        inside = shapely.contains_xy(polygon, site_lon, site_lat)
+
+    exit_km = np.zeros(site_lat.shape, dtype=np.float64)
+    outside = ~inside
+    if outside.any():
+        exterior = zone_boundary(polygon)
+        boundary_points = shapely.line_interpolate_point(
+            exterior,
+            shapely.line_locate_point(
+                exterior,
+                shapely.points(site_lon[outside], site_lat[outside])
+            )
+        )
+        exit_km[outside] = geodesic_km(
+            shapely.get_y(boundary_points), shapely.get_x(boundary_points),
+            site_lat[outside], site_lon[outside]
+        )
+    return exit_km
+
+
+def site_zone_terms_batch(site_lat, site_lon, polygons):
+    """
+    site_zone_terms for many sites at once:
+    (n_sites, n_zones + 1) Rule B flags and Rule D exit distances
+    """
+    site_lat = np.asarray(site_lat, dtype=np.float64)
+    site_lon = np.asarray(site_lon, dtype=np.float64)
+    n_sites, n_zones = len(site_lat), len(polygons)
+
+    in_zone = np.zeros((n_sites, n_zones + 1), dtype=bool)
+    exit_km = np.zeros((n_sites, n_zones + 1), dtype=np.float64)
+
+    for z, polygon in enumerate(polygons):
+        inside = shapely.contains_xy(polygon, site_lon, site_lat)
+        in_zone[:, z] = inside
+        exit_km[:, z] = zone_exit_km(polygon, site_lat, site_lon, inside)
+
+    return in_zone, exit_km
+
+
+# ============================================================
+# Scoring Logic
+# ============================================================
+
+def score_site(site_lat, site_lon, officer_lat, officer_lon,
+               officer_idle, officer_zone, in_zone, exit_km,
+               distance_km=geodesic_km):
+    """
+    Rules A-D for one site against every officer at once.
+    Terms are accumulated in the same order as calculate_officer_score
+    so the floating point results match the scalar version.
+
+    Also scores a block of sites: pass site_lat / site_lon as
+    (n_sites, 1) columns and the (n_sites, n_zones + 1) zone terms.
+
+    distance_km: officer -> site distance for Rule C (geodesic, or a
+    Road_distance.RoadNetwork)
+    """
+    # Rule A: Idle / Active
+    with section("rule_a"):
+        score = np.where(officer_idle, 0.3, 0.0)
+
+    # Rule B: Site inside officer current zone
+    with section("rule_b"):
+        score = score + np.where(in_zone[..., officer_zone], 0.4, 0.0)
+
+    # Rule C: Distance from officer to site
+    with section("rule_c"):
+        dist_to_site = distance_km(
+            officer_lat, officer_lon, site_lat, site_lon
+        )
+        score = score + np.where(
+            dist_to_site <= 10, 0.4 - dist_to_site * 0.04, 0.0
+        )
+
+    # Rule D: Distance after crossing CURRENT zone
+    with section("rule_d"):
+        outside_distance = exit_km[..., officer_zone]
+        score = score + np.where(
+            outside_distance <= 10, 0.2 - outside_distance * 0.02, 0.0
+        )
+
+    count("pairs_scored", np.size(score))
+    return score, dist_to_site
+
+
+def score_matrix(site_lat, site_lon, state, zone_index, chunk=256,
+                 distance_km=geodesic_km):
+    """
+    Full (n_sites, n_officers) score and distance matrices against a
+    fixed officer state, built in blocks of `chunk` sites
+    """
+    site_lat = np.asarray(site_lat, dtype=np.float64)
+    site_lon = np.asarray(site_lon, dtype=np.float64)
+    n_sites, n_officers = len(site_lat), len(state)
+
+    scores = np.empty((n_sites, n_officers), dtype=np.float64)
+    dists = np.empty((n_sites, n_officers), dtype=np.float64)
+
+    for start in range(0, n_sites, chunk):
+        block = slice(start, start + chunk)
+        with section("zone_terms"):
+            in_zone, exit_km = site_zone_terms_batch(
+                site_lat[block], site_lon[block], zone_index.polygons
+            )
+        scores[block], dists[block] = score_site(
+            site_lat[block, None], site_lon[block, None],
+            state.lat, state.lon, state.idle, state.zone,
+            in_zone, exit_km, distance_km
+        )
+
+    return scores, dists
+
+
+def pick_best(scores, dists):
+    """
+    Highest score wins; ties go to the nearest officer, then to the
+    earliest officer in table order (as in the sequential scan)
+    """
+    tied = np.flatnonzero(scores == scores.max())
+    return tied[np.argmin(dists[tied])]
+
+
+# ============================================================
+# Allocation Engine
+# ============================================================
+
+class SequentialAllocator:
+    """
+    Greedy allocator state: sites are assigned one at a time and the
+    chosen officer moves to the site (and turns busy) before the next.
+
+    prune: score only officers near each site (Candidate_pruning),
+    same result as the full pass; None = only for fleets of at
+    least PRUNE_MIN_OFFICERS
+    state: OfficerStateCache to continue from instead of officers_df
+    distance: Rule C distance function, None = geodesic
+    """
+
+    def __init__(self, officers_df, zone_index, prune=None, state=None,
+                 distance=None):
+        # Candidate_pruning builds on this module's scoring functions
+        from Candidate_pruning import OfficerPruner
+
+        self.zone_index = zone_index
+        self.state = (
+            OfficerStateCache(officers_df, zone_index) if state is None
+            else state
+        )
+        self.distance_km = distance or geodesic_km
+        if prune is None:
+            prune = len(self.state) >= PRUNE_MIN_OFFICERS
+        self.pruner = (
+            OfficerPruner(self.state, distance_km=self.distance_km)
+            if prune else None
+        )
+
+    def site_terms(self, site_lat, site_lon):
+        """
+        (in_zone, exit_km) zone terms of one site, see site_zone_terms
+        """
+        with section("zone_terms"):
+            return site_zone_terms(
+                site_lat, site_lon, self.zone_index.polygons
+            )
+
+    def choose(self, site_lat, site_lon, terms=None):
+        """
+        (position, score, distance) of the officer the site goes to
+        right now; terms: the site's zone terms if already computed
+        """
+        in_zone, exit_km = (
+            self.site_terms(site_lat, site_lon) if terms is None else terms
+        )
+
+        if self.pruner is not None:
+            return self.pruner.best_officer(
+                site_lat, site_lon, in_zone, exit_km
+            )
+
+        state = self.state
+        scores, dists = score_site(
+            site_lat, site_lon, state.lat, state.lon,
+            state.idle, state.zone, in_zone, exit_km, self.distance_km
+        )
+        best = pick_best(scores, dists)
+        return best, scores[best], dists[best]
+
+    def best_officer(self, site_lat, site_lon):
+        """
+        (position, score) of the officer the site goes to right now
+        """
+        best, best_score, _ = self.choose(site_lat, site_lon)
+        return best, best_score
+
+    def move(self, pos, site_lat, site_lon):
+        """
+        Sequential update of officer location & status
+        """
+        with section("state_update"):
+            (self.pruner or self.state).move(pos, site_lat, site_lon)
+
+    def assign(self, site_lat, site_lon):
+        best, best_score = self.best_officer(site_lat, site_lon)
+        self.move(best, site_lat, site_lon)
+        return best, best_score
+
+
+def allocate_sites_vectorized(officers_df, sites_df, zones_df, prune=None,
+                              distance=None, state_log=None):
+    """
+    Same allocation as the scalar allocate_sites, one batched
+    scoring pass per site (see SequentialAllocator).
+    Officers are only touched through the allocator's arrays;
+    officers_df is updated once at the end.
+
+    state_log: State_log.StateLog every assignment is appended to; a
+    log of an interrupted run of the same sheet is resumed after its
+    last site
+    """
+    zone_index = ZoneIndex.from_zones_df(zones_df)
+    state, first = None, 0
+    if state_log is not None:
+        state = state_log.open(officers_df, zone_index, run=(
+            sites_df["request_id"], sites_df["property_latitude"],
+            sites_df["property_longitude"],
+            [type(distance).__name__, prune],
+        ))
+        first = state_log.next_site
+
+    allocator = SequentialAllocator(
+        officers_df, zone_index, prune, state=state, distance=distance
+    )
+
+    site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+    site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+    chosen = np.empty(len(sites_df), dtype=np.int64)
+    scores = np.empty(len(sites_df), dtype=np.float64)
+    if first:
+        chosen[:first], scores[:first] = state_log.assignments(first)
+
+    request_ids = sites_df["request_id"].to_numpy()
+    customers = sites_df["customer_name"].to_numpy()
+
+    for i in range(first, len(sites_df)):
+        with section("site"):
+            chosen[i], scores[i] = allocator.assign(site_lat[i], site_lon[i])
+            if state_log is not None:
+                state_log.assign(chosen[i], site_lat[i], site_lon[i],
+                                 scores[i], i, request_ids[i], customers[i])
+
+    if state_log is not None:
+        state_log.flush()
+
+    allocation_df = allocation_frame(
+        sites_df, officers_df, allocator.state, chosen, scores
+    )
+    return allocation_df, allocator.state.write_back(officers_df)
+
+
+def allocation_frame(sites_df, officers_df, state, chosen, scores):
+    """
+    final_site_allocation table from per-site officer positions
+    """
+    return pd.DataFrame({
+        "request_id": sites_df["request_id"].to_numpy(),
+        "customer_name": sites_df["customer_name"].to_numpy(),
+        "assigned_FO_Id": state.ids[chosen],
+        "assigned_FO_Name":
+            officers_df["Field officer Name"].to_numpy(dtype=object)[chosen],
+        "site_lat": sites_df["property_latitude"].to_numpy(),
+        "site_lon": sites_df["property_longitude"].to_numpy(),
+        "final_score": np.round(scores, 3),
+    })
@@ -0,0 +1,365 @@
+# ============================================================
+# Event-Sourced Officer State Log
+# ============================================================
+#
+# Append-only binary log of assignments. Every record is one officer
+# move (officer position, site lat / lon, score, site position, the
+# site's request_id / customer_name), framed as
+#
+#   u32 payload length | u32 CRC-32 of payload | payload
+#
+# behind a file header with digests of the starting officer table
+# (FO Ids, positions, Active flags) and of the run (site ids and
+# coordinates); a log is only resumed for the exact same input. A
+# record cut short by a crash fails its CRC and is dropped on the next
+# open.
+#
+# Every SNAPSHOT_EVERY records the officer arrays (lat, lon, idle)
+# and the log offset they correspond to are written to
+# <log>.snapshot.npz (atomic replace). open() loads the snapshot and
+# replays only the records after it, so a restart costs one small
+# .npz read plus at most SNAPSHOT_EVERY records. replay_allocation
+# rebuilds the allocation table of any prefix of the log. A finished
+# run's log is archived under a timestamped name, so the next run
+# starts a new one and every past allocation can still be replayed.
+#
+#     log = StateLog("allocation_events.log")
+#     allocate_sites(..., state_log=log)   # resumes after a crash
+#     log.archive()   # -> allocation_events.20260101-120000.<run>.log
+# ============================================================
+
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from Officer_state import OfficerStateCache
+
+MAGIC = b"FOALLOC\x00"
+LOG_VERSION = 1
+
+# magic, version, officer table digest, run digest
+FILE_HEADER = struct.Struct("<8sH16s16s")
+# payload length, CRC-32 of the payload
+RECORD_HEADER = struct.Struct("<II")
+# kind, seq, officer, site, lat, lon, score; JSON site ids follow
+ASSIGN = struct.Struct("<BQiQddd")
+
+KIND_ASSIGN = 1
+
+# Records between snapshots (bounds the replay on restart)
+SNAPSHOT_EVERY = 10_000
+
+AssignEvent = namedtuple(
+    "AssignEvent",
+    "seq officer site lat lon score request_id customer_name offset end"
+)
+
+
+def digest(*columns):
+    """
+    16-byte fingerprint of columns of ids / coordinates (floats are
+    hashed exactly)
+    """
+    text = json.dumps(
+        [[_plain(v) for v in column] for column in columns], default=str
+    )
+    return hashlib.sha256(text.encode()).digest()[:16]
+
+
+def officers_digest(ids, lat, lon, idle):
+    return digest(ids, lat, lon, idle)
+
+
+def _plain(value):
+    """
+    JSON-safe id: NumPy scalars unwrapped, missing values as None
+    """
+    if hasattr(value, "item"):
+        value = value.item()
+    if value is not None and not isinstance(value, str) and pd.isna(value):
+        return None
+    return value
+
+
+# ============================================================
+# Reading
+# ============================================================
+
+def read_header(f):
+    raw = f.read(FILE_HEADER.size)
+    if len(raw) < FILE_HEADER.size:
+        raise ValueError("Truncated state log header")
+    magic, version, officers_key, run_key = FILE_HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError("Not an allocation state log")
+    if version != LOG_VERSION:
+        raise ValueError(
+            f"State log version {version}, expected {LOG_VERSION}"
+        )
+    return officers_key, run_key
+
+
+def read_events(path, offset=FILE_HEADER.size):
+    """
+    Records from byte `offset` on, stopping at the end of the file or
+    the first torn / corrupt record
+    """
+    with open(path, "rb") as f:
+        read_header(f)
+        f.seek(offset)
+        data = f.read()
+
+    pos = 0
+    while pos + RECORD_HEADER.size <= len(data):
+        length, crc = RECORD_HEADER.unpack_from(data, pos)
+        start = pos + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+
+        kind, seq, officer, site, lat, lon, score = \
+            ASSIGN.unpack_from(payload)
+        if kind != KIND_ASSIGN:
+            raise ValueError(f"Unknown state log record kind {kind}")
+        request_id, customer_name = json.loads(payload[ASSIGN.size:])
+
+        end = start + length
+        yield AssignEvent(seq, officer, site, lat, lon, score, request_id,
+                          customer_name, offset + pos, offset + end)
+        pos = end
+
+
+def replay_allocation(path, officers_df, upto=None):
+    """
+    (allocation_df, officers_df) as they stood after the first `upto`
+    records (None = whole log), exactly as originally allocated.
+    officers_df: the officer table the run started from
+    """
+    with open(path, "rb") as f:
+        officers_key, _ = read_header(f)
+    ids = officers_df["FO Id"].to_numpy(dtype=object)
+    if officers_digest(
+        ids, officers_df["lat"].to_numpy(dtype=np.float64),
+        officers_df["long"].to_numpy(dtype=np.float64),
+        (officers_df["Active (Y/N)"] == "Y").to_numpy()
+    ) != officers_key:
+        raise ValueError(f"{path} was written for another officer table")
+
+    rows = []
+    lat = officers_df["lat"].to_numpy(dtype=np.float64, copy=True)
+    lon = officers_df["long"].to_numpy(dtype=np.float64, copy=True)
+    moved = np.zeros(len(officers_df), dtype=bool)
+    names = officers_df["Field officer Name"].to_numpy(dtype=object)
+
+    for event in read_events(path):
+        if upto is not None and event.seq >= upto:
+            break
+        lat[event.officer], lon[event.officer] = event.lat, event.lon
+        moved[event.officer] = True
+        rows.append({
+            "request_id": event.request_id,
+            "customer_name": event.customer_name,
+            "assigned_FO_Id": ids[event.officer],
+            "assigned_FO_Name": names[event.officer],
+            "site_lat": event.lat,
+            "site_lon": event.lon,
+            "final_score": round(event.score, 3),
+        })
+
+    officers_df = officers_df.copy()
+    officers_df["lat"] = lat
+    officers_df["long"] = lon
+    officers_df.loc[
+        moved & (officers_df["Active (Y/N)"] == "Y").to_numpy(),
+        "Active (Y/N)"
+    ] = "N"
+    columns = ["request_id", "customer_name", "assigned_FO_Id",
+               "assigned_FO_Name", "site_lat", "site_lon", "final_score"]
+    return pd.DataFrame(rows, columns=columns), officers_df
+
+
+# ============================================================
+# Log Writer
+# ============================================================
+
+class StateLog:
+    """
+    Append side of the log plus snapshot / restore of one officer
+    state. Call assign() after the allocator moved the officer, so a
+    snapshot taken there already includes the move.
+
+    fsync: fsync every flush (power-loss safe); otherwise records
+    reach the OS on flush and survive a process crash
+    """
+
+    def __init__(self, path, snapshot_every=SNAPSHOT_EVERY, fsync=False):
+        self.path = path
+        self.snapshot_path = path + ".snapshot.npz"
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.file = None
+        self.state = None
+        self.seq = 0
+        self.next_site = 0
+        self.replayed = 0
+
+    def open(self, officers_df, zone_index, run=()):
+        """
+        OfficerStateCache at the end of the log (officers_df as is for
+        a new log); run: columns identifying the site sheet (request_ids,
+        coordinates, ...), a log of other input is refused
+        """
+        state = OfficerStateCache(officers_df, zone_index)
+        self.officers_key = officers_digest(
+            state.ids, state.lat, state.lon, state.idle
+        )
+        self.run_key = digest(*run)
+        self.state = state
+
+        if not os.path.exists(self.path):
+            # A snapshot without its log is stale
+            if os.path.exists(self.snapshot_path):
+                os.remove(self.snapshot_path)
+            with open(self.path, "wb") as f:
+                f.write(FILE_HEADER.pack(MAGIC, LOG_VERSION,
+                                         self.officers_key, self.run_key))
+            self.file = open(self.path, "ab")
+            return state
+
+        with open(self.path, "rb") as f:
+            officers_key, run_key = read_header(f)
+        if (officers_key, run_key) != (self.officers_key, self.run_key):
+            raise ValueError(
+                f"{self.path} belongs to another officer table or site "
+                f"sheet; move it away to start a new log"
+            )
+
+        offset = self._restore_snapshot()
+        end = offset
+        for event in read_events(self.path, offset):
+            state.lat[event.officer] = event.lat
+            state.lon[event.officer] = event.lon
+            state.idle[event.officer] = False
+            self.seq = event.seq + 1
+            self.next_site = event.site + 1
+            self.replayed += 1
+            end = event.end
+        state.zone = zone_index.locate_xy(state.lon, state.lat)
+
+        # Drop a record torn by a crash
+        if end < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        self.file = open(self.path, "ab")
+        return state
+
+    def _restore_snapshot(self):
+        """
+        Load the snapshot into the state if it matches this log,
+        returns the log offset to replay from
+        """
+        offset = FILE_HEADER.size
+        if not os.path.exists(self.snapshot_path):
+            return offset
+
+        with np.load(self.snapshot_path) as snap:
+            valid = (
+                snap["officers_key"].tobytes() == self.officers_key
+                and snap["run_key"].tobytes() == self.run_key
+                and len(snap["lat"]) == len(self.state)
+                and int(snap["offset"]) <= os.path.getsize(self.path)
+            )
+            if not valid:
+                return offset
+            self.state.lat[:] = snap["lat"]
+            self.state.lon[:] = snap["lon"]
+            self.state.idle[:] = snap["idle"]
+            self.seq = int(snap["seq"])
+            self.next_site = int(snap["next_site"])
+            return int(snap["offset"])
+
+    def assign(self, pos, site_lat, site_lon, score, site=None,
+               request_id=None, customer_name=None):
+        """
+        Append one assignment (officer pos moved to the site); site:
+        position in the run's site sheet, default the next one
+        """
+        site = self.next_site if site is None else site
+        payload = ASSIGN.pack(
+            KIND_ASSIGN, self.seq, pos, site, site_lat, site_lon, score
+        ) + json.dumps(
+            [_plain(request_id), _plain(customer_name)], default=str
+        ).encode()
+        self.file.write(
+            RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        )
+        self.seq += 1
+        self.next_site = site + 1
+
+        if self.seq % self.snapshot_every == 0:
+            self.snapshot()
+
+    def flush(self):
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def snapshot(self):
+        """
+        Write the officer arrays and the matching log offset
+        """
+        self.flush()
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f, lat=self.state.lat, lon=self.state.lon,
+                idle=self.state.idle, seq=self.seq, next_site=self.next_site,
+                offset=self.file.tell(),
+                officers_key=np.frombuffer(self.officers_key, np.uint8),
+                run_key=np.frombuffer(self.run_key, np.uint8),
+            )
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def assignments(self, n_sites):
+        """
+        (officer, score) arrays of sites 0..n_sites-1 from the whole
+        log (officer -1 where a site has no record)
+        """
+        chosen = np.full(n_sites, -1, dtype=np.int64)
+        scores = np.full(n_sites, np.nan)
+        for event in read_events(self.path):
+            if event.site < n_sites:
+                chosen[event.site] = event.officer
+                scores[event.site] = event.score
+        return chosen, scores
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def archive(self):
+        """
+        Close the log of a finished run and rename it to
+        <name>.<UTC time>.<run digest>.<ext>; returns the new path.
+        The snapshot only serves restarts and is deleted
+        """
+        self.close()
+        root, ext = os.path.splitext(self.path)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        archived = f"{root}.{stamp}.{self.run_key.hex()[:8]}{ext}"
+        os.replace(self.path, archived)
+        if os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
+        return archived
@@ -0,0 +1,579 @@
+# ============================================================
+# Capacity- and Time-Window-Aware Allocation (VRP Mode)
+# ============================================================
+#
+# Sites are allocated AND sequenced per officer, subject to
+#
+#   - daily capacity      (Capacity column / `capacity`)
+#   - shift hours         (Shift Start / Shift End, default SHIFT_*)
+#   - service time        (sites' service_min, default SERVICE_MIN)
+#   - time windows        (sites' window_start / window_end, optional)
+#
+# Objective (minimised):
+#
+#     KM_COST x route km  -  SCORE_WEIGHT x Rule A-D score of every
+#     assigned (site, officer)  +  UNASSIGNED_PENALTY per open site
+#
+# Rule scores come from Score_engine.score_matrix against the starting
+# officer state, so the rules still decide who is a good fit; the km
+# term is Rule C's own 0.04 / km slope, now charged along the route.
+#
+# Solved with large neighbourhood search: greedy insertion builds a
+# start solution, then random / related / worst removal plus greedy
+# re-insertion under simulated-annealing acceptance until time_limit.
+# Insertions only try each site's CANDIDATES best officers, and a
+# route keeps its schedule (begin times, latest feasible starts), so
+# an insertion is checked for every position in one NumPy pass. Sites
+# none of their candidates can fit stay open and are only re-priced
+# after a removal frees one of those candidates.
+#
+# Travel inside the search uses local planar km (well under 1 % off
+# the geodesic at city scale) at SPEED_KMH; reported legs are geodesic.
+# ============================================================
+
+import math
+import time
+from datetime import datetime, time as day_time
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from Geo_distance import KM_PER_DEG_LAT, KM_PER_DEG_LON, geodesic_km
+from Officer_state import OfficerStateCache, officer_capacities
+from Score_engine import score_matrix
+from Zone_index import ZoneIndex
+
+SHIFT_START_COLUMN = "Shift Start"
+SHIFT_END_COLUMN = "Shift End"
+SERVICE_COLUMN = "service_min"
+WINDOW_START_COLUMN = "window_start"
+WINDOW_END_COLUMN = "window_end"
+
+SHIFT_START = "09:00"
+SHIFT_END = "18:00"
+SERVICE_MIN = 20.0
+SPEED_KMH = 25.0              # scooter in city traffic
+
+# Objective weights
+KM_COST = 0.04
+SCORE_WEIGHT = 1.0
+UNASSIGNED_PENALTY = 10.0
+
+# Officers tried per site on insertion
+CANDIDATES = 25
+
+# Removal size per LNS iteration
+REMOVE_MIN = 5
+REMOVE_MAX = 60
+REMOVE_SHARE = 0.05
+
+# Worst removal picks rank r with probability ~ u ** WORST_POWER
+WORST_POWER = 4
+
+# Simulated annealing: a START_WORSE share worse solution is accepted
+# with probability 1/2 at the start, temperatures fall to 1/1000
+START_WORSE = 0.02
+END_TEMPERATURE_RATIO = 1e-3
+
+TIME_LIMIT_S = 120.0
+
+
+# ============================================================
+# Input Parsing
+# ============================================================
+
+def minutes_of_day(values, default):
+    """
+    Minutes after midnight from times, timestamps, "HH:MM" strings or
+    numbers of hours; missing values take `default` ("HH:MM")
+    """
+    def parse(value):
+        if value is None or pd.isna(value):
+            value = default
+        if isinstance(value, (pd.Timestamp, datetime, day_time)):
+            return value.hour * 60 + value.minute + value.second / 60
+        if isinstance(value, str):
+            hours, _, minutes = value.strip().partition(":")
+            return int(hours) * 60 + float(minutes or 0)
+        return float(value) * 60
+
+    return np.array([parse(v) for v in values], dtype=np.float64)
+
+
+def _column(df, name, n, default):
+    return df[name].tolist() if name in df.columns else [default] * n
+
+
+def planar_km(lat, lon, lat0, lon0):
+    """
+    Local x / y in km around (lat0, lon0)
+    """
+    return np.column_stack([
+        (np.asarray(lon) - lon0) * KM_PER_DEG_LON * np.cos(np.radians(lat0)),
+        (np.asarray(lat) - lat0) * KM_PER_DEG_LAT,
+    ])
+
+
+# ============================================================
+# Problem
+# ============================================================
+
+class VrpProblem:
+    """
+    Static data of one VRP run: planar coordinates, time windows,
+    shifts, capacities, Rule A-D scores and insertion candidates
+    """
+
+    def __init__(self, site_xy, start_xy, scores, service, early, late,
+                 shift_start, shift_end, capacity, speed_kmh=SPEED_KMH,
+                 candidates=CANDIDATES):
+        self.site_xy = site_xy
+        self.start_xy = start_xy
+        self.scores = scores
+        self.service = service
+        self.early = early
+        self.late = late
+        self.shift_start = shift_start
+        self.shift_end = shift_end
+        self.capacity = capacity
+        self.min_per_km = 60.0 / speed_kmh
+        self.n_sites, self.n_officers = scores.shape
+
+        # Candidates: best rule score net of the km from the start
+        start_km = np.hypot(
+            site_xy[:, None, 0] - start_xy[None, :, 0],
+            site_xy[:, None, 1] - start_xy[None, :, 1],
+        )
+        fit = SCORE_WEIGHT * scores - KM_COST * start_km
+        n_cand = min(candidates, self.n_officers)
+        self.candidates = np.argpartition(
+            -fit, n_cand - 1, axis=1
+        )[:, :n_cand] if self.n_officers else np.zeros((self.n_sites, 0),
+                                                       dtype=np.int64)
+        self.is_candidate = np.zeros(scores.shape, dtype=bool)
+        np.put_along_axis(self.is_candidate, self.candidates, True, axis=1)
+
+        # Sites without coordinates never fit a route; park them far off
+        self.tree = cKDTree(np.nan_to_num(site_xy, nan=1e9)) \
+            if self.n_sites else None
+
+    # ========================================================
+    # Route Schedule
+    # ========================================================
+
+    def schedule(self, k, route):
+        """
+        (stops, legs_km, begin, depart, latest) of officer k's route:
+        service begin per stop, departure from the start and from each
+        stop, and the latest begin that keeps the rest feasible
+        """
+        stops = np.asarray(route, dtype=np.int64)
+        n = len(stops)
+        prev_xy = np.vstack([self.start_xy[k:k + 1],
+                             self.site_xy[stops[:-1]]])
+        legs = np.hypot(*(self.site_xy[stops] - prev_xy).T) if n \
+            else np.zeros(0)
+
+        begin = np.empty(n)
+        t = self.shift_start[k]
+        for i, site in enumerate(stops.tolist()):
+            t = max(self.early[site], t + legs[i] * self.min_per_km)
+            begin[i] = t
+            t += self.service[site]
+
+        latest = np.empty(n)
+        limit = self.shift_end[k]
+        for i in range(n - 1, -1, -1):
+            site = stops[i]
+            latest[i] = min(self.late[site], limit - self.service[site])
+            limit = latest[i] - legs[i] * self.min_per_km
+
+        depart = np.concatenate([[self.shift_start[k]],
+                                 begin + self.service[stops]])
+        return stops, legs, begin, depart, latest
+
+    def best_insertion(self, k, sched, site):
+        """
+        (cost, position) of the cheapest feasible insertion of site
+        into officer k's route, (inf, -1) if none fits
+        """
+        stops, legs, _, depart, latest = sched
+        n = len(stops)
+        if n >= self.capacity[k]:
+            return math.inf, -1
+
+        xy = self.site_xy[site]
+        prev_xy = np.vstack([self.start_xy[k:k + 1], self.site_xy[stops]])
+        d_prev = np.hypot(*(prev_xy - xy).T)
+        d_next = np.hypot(*(self.site_xy[stops] - xy).T) if n \
+            else np.zeros(0)
+
+        begin = np.maximum(self.early[site],
+                           depart + d_prev * self.min_per_km)
+        ok = begin <= self.late[site]
+        finish = begin + self.service[site]
+        ok[:n] &= np.maximum(
+            self.early[stops], finish[:n] + d_next * self.min_per_km
+        ) <= latest
+        ok[n] &= finish[n] <= self.shift_end[k]
+        if not ok.any():
+            return math.inf, -1
+
+        km = d_prev + np.append(d_next - legs, 0.0)
+        cost = np.where(ok, KM_COST * km, np.inf)
+        pos = int(np.argmin(cost))
+        return cost[pos] - SCORE_WEIGHT * self.scores[site, k], pos
+
+    def contributions(self, sched, k):
+        """
+        Net value of each stop of officer k's route: its rule score
+        minus the km it adds (low = candidate for removal)
+        """
+        stops, legs, _, _, _ = sched
+        saved = legs.copy()
+        if len(stops) > 1:
+            # Removing stop i joins its predecessor to stop i + 1
+            prev_xy = np.vstack([self.start_xy[k:k + 1],
+                                 self.site_xy[stops[:-2]]])
+            bridge = np.hypot(*(self.site_xy[stops[1:]] - prev_xy).T)
+            saved[:-1] += legs[1:] - bridge
+        return SCORE_WEIGHT * self.scores[stops, k] - KM_COST * saved
+
+
+# ============================================================
+# Solution
+# ============================================================
+
+class VrpSolution:
+    """
+    Routes (site lists per officer) with cached schedules
+    """
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.routes = [[] for _ in range(problem.n_officers)]
+        self.scheds = [problem.schedule(k, [])
+                       for k in range(problem.n_officers)]
+        self.officer = np.full(problem.n_sites, -1, dtype=np.int64)
+        self.cost = UNASSIGNED_PENALTY * problem.n_sites
+
+    def copy(self):
+        other = VrpSolution.__new__(VrpSolution)
+        other.problem = self.problem
+        other.routes = [route[:] for route in self.routes]
+        other.scheds = list(self.scheds)
+        other.officer = self.officer.copy()
+        other.cost = self.cost
+        return other
+
+    def _route_cost(self, k):
+        stops, legs = self.scheds[k][:2]
+        return (KM_COST * legs.sum()
+                - SCORE_WEIGHT * self.problem.scores[stops, k].sum())
+
+    def insert(self, site, k, pos):
+        before = self._route_cost(k)
+        self.routes[k].insert(pos, site)
+        self.scheds[k] = self.problem.schedule(k, self.routes[k])
+        self.officer[site] = k
+        self.cost += self._route_cost(k) - before - UNASSIGNED_PENALTY
+
+    def remove(self, sites):
+        touched = set()
+        for site in sites:
+            k = self.officer[site]
+            if k < 0:
+                continue
+            if k not in touched:
+                self.cost -= self._route_cost(k)
+                touched.add(k)
+            self.routes[k].remove(site)
+            self.officer[site] = -1
+            self.cost += UNASSIGNED_PENALTY
+        for k in touched:
+            self.scheds[k] = self.problem.schedule(k, self.routes[k])
+            self.cost += self._route_cost(k)
+
+    def unassigned(self):
+        return np.flatnonzero(self.officer < 0)
+
+
+# ============================================================
+# Construction / Repair
+# ============================================================
+
+def greedy_insert(solution, sites, fallback=False):
+    """
+    Insert sites cheapest-first, re-pricing only the sites whose
+    candidate route changed; fallback also tries every officer for
+    sites no candidate can take
+    """
+    problem = solution.problem
+    pending = {int(s) for s in sites}
+
+    def price(site, officers):
+        best = (math.inf, -1, -1)
+        for k in officers:
+            cost, pos = problem.best_insertion(k, solution.scheds[k], site)
+            if cost < best[0]:
+                best = (cost, k, pos)
+        return best
+
+    offers = {s: price(s, problem.candidates[s]) for s in pending}
+    while pending:
+        site = min(pending, key=lambda s: offers[s][0])
+        cost, k, pos = offers[site]
+        if k < 0:
+            break
+        solution.insert(site, k, pos)
+        pending.discard(site)
+        for s in pending:
+            if problem.is_candidate[s, k]:
+                offers[s] = price(s, problem.candidates[s])
+
+    if fallback:
+        for site in sorted(pending):
+            cost, k, pos = price(site, range(problem.n_officers))
+            if k >= 0:
+                solution.insert(site, k, pos)
+
+
+def initial_solution(problem):
+    """
+    Tightest time windows first, each site to its cheapest candidate
+    insertion, then every officer for the leftovers
+    """
+    solution = VrpSolution(problem)
+    order = np.lexsort((-problem.scores.max(axis=1) if problem.n_officers
+                        else np.zeros(problem.n_sites),
+                        problem.late - problem.early))
+    left = []
+    for site in order.tolist():
+        best = (math.inf, -1, -1)
+        for k in problem.candidates[site]:
+            cost, pos = problem.best_insertion(k, solution.scheds[k], site)
+            if cost < best[0]:
+                best = (cost, k, pos)
+        if best[1] >= 0:
+            solution.insert(site, best[1], best[2])
+        else:
+            left.append(site)
+    greedy_insert(solution, left, fallback=True)
+    return solution
+
+
+# ============================================================
+# Destroy Operators
+# ============================================================
+
+def random_removal(solution, q, rng):
+    assigned = np.flatnonzero(solution.officer >= 0)
+    return rng.choice(assigned, size=min(q, len(assigned)), replace=False)
+
+
+def related_removal(solution, q, rng):
+    """
+    A random assigned site and its nearest assigned neighbours
+    """
+    problem = solution.problem
+    assigned = np.flatnonzero(solution.officer >= 0)
+    if not len(assigned):
+        return assigned
+    seed = rng.choice(assigned)
+    k = min(problem.n_sites, 4 * q)
+    _, near = problem.tree.query(problem.site_xy[seed], k=k)
+    near = np.atleast_1d(near)
+    near = near[solution.officer[near] >= 0]
+    return near[:q]
+
+
+def worst_removal(solution, q, rng):
+    """
+    Sites that earn least for their place in the route, randomised
+    """
+    problem = solution.problem
+    sites, gains = [], []
+    for k, sched in enumerate(solution.scheds):
+        if len(sched[0]):
+            sites.append(sched[0])
+            gains.append(problem.contributions(sched, k))
+    if not sites:
+        return np.zeros(0, dtype=np.int64)
+    sites = np.concatenate(sites)
+    order = sites[np.argsort(np.concatenate(gains))]
+    q = min(q, len(order))
+    picks = np.unique(
+        (rng.random(q) ** WORST_POWER * len(order)).astype(np.int64)
+    )
+    return order[picks]
+
+
+DESTROY_OPERATORS = (random_removal, related_removal, worst_removal)
+
+
+# ============================================================
+# Large Neighbourhood Search
+# ============================================================
+
+def stuck_sites(solution, removed):
+    """
+    Open sites worth retrying after `removed` leave their routes: those
+    with a freed officer among their candidates. Every open site of a
+    solution already failed all its candidates, and nothing else
+    makes room for it.
+    """
+    problem = solution.problem
+    freed = np.unique(solution.officer[removed])
+    freed = freed[freed >= 0]
+    stuck = solution.unassigned()
+    if not len(freed) or not len(stuck):
+        return stuck[:0]
+    return stuck[problem.is_candidate[np.ix_(stuck, freed)].any(axis=1)]
+
+
+def solve(problem, time_limit=TIME_LIMIT_S, seed=0, max_iterations=None):
+    """
+    Best solution found within time_limit seconds
+    """
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+
+    current = initial_solution(problem)
+    best = current.copy()
+    if problem.n_sites == 0 or problem.n_officers == 0:
+        return best
+
+    t0 = START_WORSE * max(abs(current.cost), 1.0) / math.log(2)
+    iteration = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= time_limit or (
+                max_iterations is not None and iteration >= max_iterations):
+            break
+        iteration += 1
+
+        temperature = t0 * END_TEMPERATURE_RATIO ** (elapsed / time_limit)
+        q = int(np.clip(REMOVE_SHARE * problem.n_sites, REMOVE_MIN,
+                        REMOVE_MAX))
+        q = int(rng.integers(max(1, q // 2), q + 1))
+
+        candidate = current.copy()
+        operator = DESTROY_OPERATORS[rng.integers(len(DESTROY_OPERATORS))]
+        removed = operator(candidate, q, rng)
+        retry = stuck_sites(candidate, removed)
+        candidate.remove(removed)
+        greedy_insert(candidate, np.concatenate([removed, retry]))
+
+        delta = candidate.cost - current.cost
+        if delta < 0 or rng.random() < math.exp(-delta / temperature):
+            current = candidate
+            if current.cost < best.cost - 1e-9:
+                best = current.copy()
+
+    return best
+
+
+# ============================================================
+# Allocation Engine
+# ============================================================
+
+def allocate_sites_vrp(officers_df, sites_df, zones_df, capacity=None,
+                       distance=None, time_limit=TIME_LIMIT_S, seed=0,
+                       speed_kmh=SPEED_KMH):
+    """
+    Allocate and sequence all sites under capacity, shift and time
+    window limits (see module notes).
+
+    Returns the allocation table (plus visit_order, arrival, leg_km;
+    sites no officer can fit get an empty assigned_FO_Id) and the
+    officer table with every used officer at their last stop and busy.
+    distance: Rule C distance function for the scores, None = geodesic
+    """
+    zone_index = ZoneIndex.from_zones_df(zones_df)
+    state = OfficerStateCache(officers_df, zone_index)
+    n_sites, n_officers = len(sites_df), len(officers_df)
+
+    site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+    site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+    scores, _ = score_matrix(site_lat, site_lon, state, zone_index,
+                             distance_km=distance or geodesic_km)
+
+    lat0 = np.nanmean(np.concatenate([site_lat, state.lat]))
+    lon0 = np.nanmean(np.concatenate([site_lon, state.lon]))
+
+    capacities = officer_capacities(officers_df, capacity)
+    if capacities is None:
+        capacities = np.full(n_officers, n_sites, dtype=np.int64)
+
+    problem = VrpProblem(
+        planar_km(site_lat, site_lon, lat0, lon0),
+        planar_km(state.lat, state.lon, lat0, lon0),
+        scores,
+        service=pd.to_numeric(
+            pd.Series(_column(sites_df, SERVICE_COLUMN, n_sites, None)),
+            errors="coerce"
+        ).fillna(SERVICE_MIN).to_numpy(dtype=np.float64),
+        early=minutes_of_day(
+            _column(sites_df, WINDOW_START_COLUMN, n_sites, None), "00:00"
+        ),
+        late=minutes_of_day(
+            _column(sites_df, WINDOW_END_COLUMN, n_sites, None), "24:00"
+        ),
+        shift_start=minutes_of_day(
+            _column(officers_df, SHIFT_START_COLUMN, n_officers, None),
+            SHIFT_START
+        ),
+        shift_end=minutes_of_day(
+            _column(officers_df, SHIFT_END_COLUMN, n_officers, None),
+            SHIFT_END
+        ),
+        capacity=capacities,
+        speed_kmh=speed_kmh,
+    )
+    solution = solve(problem, time_limit=time_limit, seed=seed)
+
+    visit_order = np.zeros(n_sites, dtype=np.int64)
+    arrival = np.full(n_sites, np.nan)
+    leg_km = np.full(n_sites, np.nan)
+    for k, (stops, _, begin, _, _) in enumerate(solution.scheds):
+        if not len(stops):
+            continue
+        visit_order[stops] = np.arange(1, len(stops) + 1)
+        arrival[stops] = begin
+        prev_lat = np.concatenate([[state.lat[k]], site_lat[stops[:-1]]])
+        prev_lon = np.concatenate([[state.lon[k]], site_lon[stops[:-1]]])
+        leg_km[stops] = geodesic_km(prev_lat, prev_lon,
+                                    site_lat[stops], site_lon[stops])
+
+    assigned = solution.officer
+    done = assigned >= 0
+    pos = np.where(done, assigned, 0)
+
+    allocation_df = pd.DataFrame({
+        "request_id": sites_df["request_id"].to_numpy(),
+        "customer_name": sites_df["customer_name"].to_numpy(),
+        "assigned_FO_Id": np.where(done, state.ids[pos], None),
+        "assigned_FO_Name": np.where(
+            done,
+            officers_df["Field officer Name"].to_numpy(dtype=object)[pos],
+            None
+        ),
+        "site_lat": site_lat,
+        "site_lon": site_lon,
+        "final_score": np.where(
+            done, np.round(scores[np.arange(n_sites), pos], 3), np.nan
+        ),
+        "visit_order": np.where(done, visit_order, None),
+        "arrival": [
+            f"{int(t // 60):02d}:{int(t % 60):02d}" if ok else None
+            for t, ok in zip(arrival, done)
+        ],
+        "leg_km": np.round(leg_km, 3),
+    })
+
+    # Officers end the day at their last stop
+    for k, stops in enumerate(solution.routes):
+        if stops:
+            state.move(k, site_lat[stops[-1]], site_lon[stops[-1]])
+    return allocation_df, state.write_back(officers_df)
@@ -0,0 +1,130 @@
+# ============================================================
+# Zone Geometry: Vectorized Polygon Building with WKB Cache
+# ============================================================
+#
+# Zone tables store vertex i as lat{i} / long{i}, any number of
+# vertices, trailing ones may be empty. zone_polygons builds every
+# zone in one shapely pass, prepares the polygons and keeps them as
+# WKB in the data cache, keyed by the vertex coordinates themselves,
+# so an unchanged zone table loads its polygons without rebuilding.
+# ============================================================
+
+import hashlib
+import os
+import re
+
+import numpy as np
+import shapely
+
+from Data_loader import CACHE_DIR
+
+VERTEX_COLUMN = re.compile(r"^(lat|long)(\d+)$", re.IGNORECASE)
+
+# ============================================================
+# Building
+# ============================================================
+
+def vertex_columns(columns):
+    """
+    [(lat_col, long_col), ...] ordered by vertex number
+    """
+    found = {}
+    for col in columns:
+        match = VERTEX_COLUMN.match(str(col).strip())
+        if match:
+            kind, i = match.group(1).lower(), int(match.group(2))
+            found.setdefault(i, {})[kind] = col
+
+    return [
+        (found[i]["lat"], found[i]["long"])
+        for i in sorted(found)
+        if "lat" in found[i] and "long" in found[i]
+    ]
+
+
+def vertex_arrays(zones_df):
+    """
+    (n_zones, n_vertices) float64 lat and lon matrices, NaN where empty
+    """
+    pairs = vertex_columns(zones_df.columns)
+    if not pairs:
+        raise ValueError(
+            f"No lat/long columns found: {zones_df.columns.tolist()}"
+        )
+    lat_cols, lon_cols = zip(*pairs)
+    lat = zones_df[list(lat_cols)].to_numpy(dtype=np.float64)
+    lon = zones_df[list(lon_cols)].to_numpy(dtype=np.float64)
+    return lat, lon
+
+
+def build_zone_polygons(lat, lon):
+    """
+    One polygon per row of the vertex matrices, in a single shapely
+    call. Empty vertices are skipped; rows with fewer than 3 vertices
+    give None.
+    """
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    rows = np.flatnonzero(valid.sum(axis=1) >= 3)
+
+    polygons = np.full(len(lat), None, dtype=object)
+    if len(rows):
+        keep = valid[rows]
+        ring_idx = np.repeat(np.arange(len(rows)), keep.sum(axis=1))
+        coords = np.column_stack([lon[rows][keep], lat[rows][keep]])
+        polygons[rows] = shapely.polygons(
+            shapely.linearrings(coords, indices=ring_idx)
+        )
+    return polygons
+
+
+# ============================================================
+# WKB Cache
+# ============================================================
+
+def _cache_path(lat, lon, cache_dir):
+    digest = hashlib.sha256()
+    digest.update(np.asarray(lat.shape, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(lat).tobytes())
+    digest.update(np.ascontiguousarray(lon).tobytes())
+    return os.path.join(cache_dir, f"zones-{digest.hexdigest()[:32]}.npz")
+
+
+def save_polygons(path, polygons):
+    """
+    WKB blobs packed into one byte buffer plus offsets (no pickle)
+    """
+    blobs = [b"" if p is None else p for p in shapely.to_wkb(polygons)]
+    offsets = np.cumsum([0] + [len(b) for b in blobs], dtype=np.int64)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, offsets=offsets,
+             wkb=np.frombuffer(b"".join(blobs), dtype=np.uint8))
+    os.replace(tmp_path, path)
+
+
+def load_polygons(path):
+    with np.load(path) as data:
+        offsets, wkb = data["offsets"], data["wkb"].tobytes()
+    blobs = np.array(
+        [wkb[a:b] or None for a, b in zip(offsets[:-1], offsets[1:])],
+        dtype=object
+    )
+    return shapely.from_wkb(blobs)
+
+
+def zone_polygons(zones_df, cache_dir=CACHE_DIR):
+    """
+    Prepared polygon per zone row (None for < 3 vertices), read from
+    the WKB cache when the vertex table is unchanged
+    """
+    lat, lon = vertex_arrays(zones_df)
+    path = _cache_path(lat, lon, cache_dir)
+
+    if os.path.exists(path):
+        polygons = load_polygons(path)
+    else:
+        polygons = build_zone_polygons(lat, lon)
+        os.makedirs(cache_dir, exist_ok=True)
+        save_polygons(path, polygons)
+
+    shapely.prepare(polygons)
+    return polygons
@@ -0,0 +1,92 @@
+# ============================================================
+# Spatial Index for Zone Lookup
+# ============================================================
+
+import numpy as np
+import shapely
+from shapely import STRtree
+
+# zone relation -> STRtree predicate (point <predicate> zone)
+PREDICATES = {
+    "contains": "within",       # zone.contains(point)
+    "covers": "covered_by",     # zone.contains(point) or zone.touches(point)
+}
+
+
+class ZoneIndex:
+    """
+    STRtree over zone polygons, built once.
+
+    Answers "which zone contains this point" for single points and for
+    arrays of points. When zones overlap, the first zone in table order
+    wins, exactly like the old row-by-row scan.
+    """
+
+    def __init__(self, polygons, zones=None):
+        self.polygons = np.asarray(list(polygons), dtype=object)
+        self.zones = (
+            np.arange(len(self.polygons)) if zones is None
+            else np.asarray(list(zones), dtype=object)
+        )
+        shapely.prepare(self.polygons)
+        self.tree = STRtree(self.polygons)
+
+    @classmethod
+    def from_zones_df(cls, zones_df, zone_col="zone", polygon_col="polygon"):
+        return cls(zones_df[polygon_col], zones_df[zone_col])
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def locate_xy(self, lons, lats, predicate="contains"):
+        """
+        Zone position (row order) for every point, -1 if outside all zones
+        """
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        positions = np.full(lons.shape, len(self.polygons), dtype=np.int64)
+
+        if lons.size and len(self.polygons):
+            points = shapely.points(lons, lats)
+            point_idx, zone_idx = self.tree.query(
+                points.ravel(), predicate=PREDICATES[predicate]
+            )
+            np.minimum.at(positions.reshape(-1), point_idx, zone_idx)
+
+        positions[positions == len(self.polygons)] = -1
+        return positions
+
+    def locate(self, point, predicate="contains"):
+        """
+        Zone position for a single shapely Point, -1 if outside all zones
+        """
+        hits = self.tree.query(point, predicate=PREDICATES[predicate])
+        return int(hits.min()) if len(hits) else -1
+
+    def find(self, point, predicate="contains"):
+        """
+        (zone, polygon) for a single point, (None, None) if outside
+        """
+        pos = self.locate(point, predicate)
+        if pos == -1:
+            return None, None
+        return self.zones[pos], self.polygons[pos]
+
+    def counts(self, positions):
+        """
+        Points per zone (row order) from locate_xy positions
+        """
+        positions = np.asarray(positions).ravel()
+        return np.bincount(
+            positions[positions >= 0], minlength=len(self.polygons)
+        )
+
+    def labels(self, positions, outside=None):
+        """
+        Map zone positions back to zone labels
+        """
+        positions = np.asarray(positions)
+        out = np.full(positions.shape, outside, dtype=object)
+        inside = positions >= 0
+        out[inside] = self.zones[positions[inside]]
+        return out
@@ -0,0 +1,151 @@
+# ============================================================
+# Density-Driven Zone Partitioning
+# ============================================================
+#
+# Recursively bisects the bounding box of historical sites so every
+# zone gets (nearly) the same number of sites. Each step cuts the cell
+# across its longer side (in km) at the site-count quantile that
+# matches the number of zones on each side, found with
+# np.argpartition in O(n), so a full partition costs O(n log k).
+#
+# Output is a zone table in the lat{i} / long{i} layout that
+# Zone_geometry and the allocator read.
+# ============================================================
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from Data_loader import read_table
+from Geo_distance import KM_PER_DEG_LAT, KM_PER_DEG_LON
+from Zone_index import ZoneIndex
+
+# Outer box padding, keeps edge sites strictly inside a zone
+BOX_PAD_DEG = 1e-6
+
+# ============================================================
+# Partitioning
+# ============================================================
+
+def _cut(values, k_left, k):
+    """
+    Split positions into the k_left / k share with the smallest values
+    and the rest, plus the cut value between the two groups
+    """
+    n = len(values)
+    m = int(round(n * k_left / k))
+    m = min(max(m, 1), n - 1)
+
+    order = np.argpartition(values, m)
+    left, right = order[:m], order[m:]
+    cut = (values[left].max() + values[order[m]]) / 2
+    return left, right, cut
+
+
+def partition_sites(site_lat, site_lon, n_zones):
+    """
+    Bisect the sites' bounding box into n_zones boxes of equal site
+    count (within one site per cut, ties on a cut line aside).
+
+    Returns (polygons, site_zone): one shapely box per zone and the
+    zone position of every site (-1 for missing coordinates).
+    """
+    site_lat = np.asarray(site_lat, dtype=np.float64)
+    site_lon = np.asarray(site_lon, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(site_lat) & np.isfinite(site_lon))
+    if n_zones < 1:
+        raise ValueError("n_zones must be at least 1")
+    if len(valid) < n_zones:
+        raise ValueError(
+            f"{len(valid)} sites cannot fill {n_zones} zones"
+        )
+
+    box = [
+        site_lon[valid].min() - BOX_PAD_DEG,
+        site_lat[valid].min() - BOX_PAD_DEG,
+        site_lon[valid].max() + BOX_PAD_DEG,
+        site_lat[valid].max() + BOX_PAD_DEG,
+    ]
+
+    boxes = []
+    site_zone = np.full(len(site_lat), -1, dtype=np.int64)
+    stack = [(valid, box, n_zones)]
+
+    while stack:
+        idx, (x0, y0, x1, y1), k = stack.pop()
+        if k == 1:
+            site_zone[idx] = len(boxes)
+            boxes.append((x0, y0, x1, y1))
+            continue
+
+        k_left = k // 2
+        mid_lat = np.radians((y0 + y1) / 2)
+        width_km = (x1 - x0) * KM_PER_DEG_LON * np.cos(mid_lat)
+        height_km = (y1 - y0) * KM_PER_DEG_LAT
+
+        if width_km >= height_km:
+            left, right, cut = _cut(site_lon[idx], k_left, k)
+            left_box, right_box = (x0, y0, cut, y1), (cut, y0, x1, y1)
+        else:
+            left, right, cut = _cut(site_lat[idx], k_left, k)
+            left_box, right_box = (x0, y0, x1, cut), (x0, cut, x1, y1)
+
+        # Right pushed first so zones are numbered left / bottom first
+        stack.append((idx[right], right_box, k - k_left))
+        stack.append((idx[left], left_box, k_left))
+
+    boxes = np.asarray(boxes, dtype=np.float64)
+    polygons = shapely.box(boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3])
+    return polygons, site_zone
+
+
+def zone_counts(polygons, site_lat, site_lon):
+    """
+    Sites per zone for any site set (e.g. the current month against
+    a partition built from history), via the zone spatial index
+    """
+    zone_index = ZoneIndex(polygons)
+    return zone_index.counts(
+        zone_index.locate_xy(site_lon, site_lat, predicate="covers")
+    )
+
+
+def partition_table(polygons, prefix="Z"):
+    """
+    Zone table: zone, lat1..lat4 / long1..long4 (box corners)
+    """
+    rows = []
+    for z, polygon in enumerate(polygons, 1):
+        row = {"zone": f"{prefix}{z}"}
+        for i, (lon, lat) in enumerate(polygon.exterior.coords[:-1], 1):
+            row[f"lat{i}"] = lat
+            row[f"long{i}"] = lon
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+# ============================================================
+# Main Execution
+# ============================================================
+
+if __name__ == "__main__":
+
+    SITE_FILE = "Property_la_lo.xlsx"       # historical sites
+    OUTPUT_ZONES = "partitioned_zones.xlsx"
+
+    N_ZONES = 16                            # fewer for small sheets
+
+    sites_df = read_table(SITE_FILE)
+    site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+    site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+
+    n_zones = min(N_ZONES, len(sites_df))
+    polygons, site_zone = partition_sites(site_lat, site_lon, n_zones)
+    counts = zone_counts(polygons, site_lat, site_lon)
+
+    partition_table(polygons).assign(sites=counts).to_excel(
+        OUTPUT_ZONES, index=False
+    )
+
+    print(f"✅ {n_zones} zones saved to {OUTPUT_ZONES} "
+          f"({counts.min()}–{counts.max()} sites per zone)")
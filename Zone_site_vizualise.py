@@ -1,7 +1,10 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
-from shapely.geometry import Point, Polygon
+from shapely.geometry import Point
+
+from Data_loader import read_table
+from Zone_geometry import zone_polygons
+from Zone_index import ZoneIndex
 
 # ===============================
 # 1. Read Excel files
@@ -9,8 +12,8 @@ from shapely.geometry import Point, Polygon
 zone_file = "ZONE_INFO.xlsx"
 site_file = "Property_la_lo.xlsx"
 
-zones_df = pd.read_excel(zone_file)
-sites_df = pd.read_excel(site_file)
+zones_df = read_table(zone_file)
+sites_df = read_table(site_file)
 
 # ===============================
 # 2. Prepare colors
@@ -19,27 +22,24 @@ num_zones = len(zones_df)
 colors = cm.get_cmap("tab20", num_zones)
 
 # Store polygons for point-in-polygon check
-zone_polygons = {}
+zone_data = {}
 
 # ===============================
 # 3. Plot zones
 # ===============================
 plt.figure(figsize=(10, 8))
 
-for idx, row in zones_df.iterrows():
-    zone_id = row["zone_id"]
+for idx, (zone_id, polygon) in enumerate(
+    zip(zones_df["zone_id"], zone_polygons(zones_df))
+):
+    if polygon is None:
+        continue
     color = colors(idx)
 
     # Polygon coordinates (lon, lat)
-    coords = [
-        (row["long1"], row["lat1"]),
-        (row["long2"], row["lat2"]),
-        (row["long3"], row["lat3"]),
-        (row["long4"], row["lat4"])
-    ]
-
-    polygon = Polygon(coords)
-    zone_polygons[zone_id] = {
+    coords = list(polygon.exterior.coords)[:-1]
+
+    zone_data[zone_id] = {
         "polygon": polygon,
         "color": color
     }
@@ -62,6 +62,11 @@ for idx, row in zones_df.iterrows():
         va="center"
     )
 
+zone_index = ZoneIndex(
+    [data["polygon"] for data in zone_data.values()],
+    zone_data.keys()
+)
+
 # ===============================
 # 4. Plot sites & detect zones
 # ===============================
@@ -75,14 +80,11 @@ for _, site in sites_df.iterrows():
     site_color = "black"
     assigned_zone = None
 
-    for zone_id, data in zone_polygons.items():
-        polygon = data["polygon"]
-
-        # inside OR on boundary
-        if polygon.contains(point) or polygon.touches(point):
-            site_color = data["color"]
-            assigned_zone = zone_id
-            break
+    # inside OR on boundary
+    zone_id, _ = zone_index.find(point, predicate="covers")
+    if zone_id is not None:
+        site_color = zone_data[zone_id]["color"]
+        assigned_zone = zone_id
 
     # Plot site
     plt.scatter(lon, lat, color=site_color, marker="o", zorder=5)
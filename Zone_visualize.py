@@ -1,12 +1,13 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 
+from Data_loader import read_table
+
 # ===============================
 # 1. Read Excel file
 # ===============================
 file_path = "ZONE_INFO.xlsx"   # change path if needed
-df = pd.read_excel(file_path)
+df = read_table(file_path)
 
 # ===============================
 # 2. Prepare color map
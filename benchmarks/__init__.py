@@ -0,0 +1,12 @@
+# ============================================================
+# Synthetic-Scale Benchmarks
+# ============================================================
+#
+#     python -m benchmarks --sites 1000 100000 --out report.json
+#     python -m benchmarks --sites 1000 --compare old_report.json
+#
+# synthetic : seeded zone / officer / site tables in the workbook
+#             layouts the scripts read
+# suite     : timed cases (allocation, zone labelling, Excel I/O,
+#             map export) and the JSON report
+# ============================================================
@@ -0,0 +1,61 @@
+# ============================================================
+# Benchmark Command Line
+# ============================================================
+
+import argparse
+import sys
+
+from benchmarks.suite import (
+    ALLOCATION_MAX_SITES, ALLOCATION_MODES, CASES, MISMATCH,
+    REGRESSION_TOLERANCE, compare, format_comparison, load_report,
+    run_suite, save_report
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Time the allocator, zone labelling, Excel I/O and "
+                    "map export on seeded synthetic data"
+    )
+    parser.add_argument("--sites", type=int, nargs="+", default=[1000],
+                        help="site counts to run (e.g. 1000 100000 1000000)")
+    parser.add_argument("--cases", nargs="+", choices=CASES,
+                        default=list(CASES))
+    parser.add_argument("--modes", nargs="+", default=list(ALLOCATION_MODES),
+                        choices=["vectorized", "scalar", "batch", "parallel",
+                                 "vrp"],
+                        help="allocate_sites modes")
+    parser.add_argument("--max-alloc-sites", type=int,
+                        default=ALLOCATION_MAX_SITES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip tracemalloc (faster, no peak memory)")
+    parser.add_argument("--out", default="benchmark_report.json")
+    parser.add_argument("--compare", metavar="OLD_REPORT",
+                        help="report of an earlier version to compare to")
+    parser.add_argument("--tolerance", type=float,
+                        default=REGRESSION_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run_suite(
+        args.sites, cases=args.cases, modes=args.modes, seed=args.seed,
+        max_alloc_sites=args.max_alloc_sites,
+        trace_memory=not args.no_memory,
+    )
+    save_report(report, args.out)
+    print(f"✅ Report saved to {args.out}")
+
+    if any(row.get("error") == MISMATCH for row in report["results"]):
+        return 1
+
+    if args.compare:
+        rows = compare(load_report(args.compare), report, args.tolerance)
+        print(format_comparison(rows))
+        if any(row["regression"] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
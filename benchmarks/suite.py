@@ -0,0 +1,412 @@
+# ============================================================
+# Benchmark Cases and JSON Report
+# ============================================================
+#
+# Every case runs on a fresh copy of the synthetic tables and records
+# wall time (perf_counter) and peak Python heap (tracemalloc, which
+# also tracks NumPy buffers). Process pools in the parallel allocation
+# mode are outside tracemalloc; their peak is not included.
+#
+# A report is one JSON file: environment, configuration and one row
+# per (case, variant, sites). compare() matches two reports on those
+# keys, so runs on different versions line up row by row.
+#
+# Allocation modes in EXACT_MODES must give the same allocation as
+# mode="vectorized"; when both run, a differing result turns the row
+# into an error.
+# ============================================================
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.synthetic import generate
+
+REPORT_SCHEMA = 1
+
+CASES = ("excel", "labelling", "allocation", "maps")
+ALLOCATION_MODES = ("vectorized",)
+
+# Modes with the same result as "vectorized"
+EXACT_MODES = ("scalar", "parallel")
+MISMATCH = "allocation differs from vectorized mode"
+
+# Sequential modes scale with sites x nearby officers; larger runs
+# are recorded as skipped unless the limit is raised
+ALLOCATION_MAX_SITES = 100_000
+SCALAR_MAX_SITES = 2_000
+
+# Excel sheets end at 1,048,576 rows (header included)
+EXCEL_MAX_ROWS = 1_048_575
+
+# compare(): slower / bigger by more than this share is a regression
+REGRESSION_TOLERANCE = 0.10
+
+
+# ============================================================
+# Measurement
+# ============================================================
+
+def measure(fn, *args, trace_memory=True, **kwargs):
+    """
+    (result, seconds, peak_mb) of one call; peak_mb is None without
+    memory tracing
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    finally:
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    peak_mb = peak / 2 ** 20 if trace_memory else None
+    return result, seconds, peak_mb
+
+
+def _git_info():
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+
+    try:
+        return {
+            "commit": git("rev-parse", "HEAD"),
+            "dirty": bool(git("status", "--porcelain", "-uno")),
+        }
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def _environment():
+    versions = {}
+    for name in ("numpy", "pandas", "shapely", "scipy", "folium"):
+        module = sys.modules.get(name)
+        if module is None:
+            try:
+                module = __import__(name)
+            except ImportError:
+                continue
+        versions[name] = getattr(module, "__version__", None)
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+# ============================================================
+# Cases
+# ============================================================
+
+def _prepared_zones(zones_df, cache_dir):
+    from Zone_geometry import zone_polygons
+
+    zones_df = zones_df.copy()
+    zones_df["polygon"] = zone_polygons(zones_df, cache_dir=cache_dir)
+    return zones_df
+
+
+def excel_cases(tables, work_dir):
+    """
+    Workbook write, first (Excel) read and cached (Parquet) read
+    """
+    from Data_loader import CLEAN, STRIP, read_table
+
+    zones_df, officers_df, sites_df = tables
+    cache_dir = os.path.join(work_dir, "excel_cache")
+    paths = {
+        "zones": (os.path.join(work_dir, "zones.xlsx"), zones_df, CLEAN),
+        "officers": (os.path.join(work_dir, "officers.xlsx"), officers_df,
+                     STRIP),
+        "sites": (os.path.join(work_dir, "sites.xlsx"), sites_df, CLEAN),
+    }
+
+    def write():
+        for path, df, _ in paths.values():
+            df.to_excel(path, index=False)
+
+    def read():
+        for path, _, columns in paths.values():
+            read_table(path, columns=columns, cache_dir=cache_dir)
+
+    yield "write", write
+    yield "read_cold", read
+    yield "read_cached", read
+
+
+def labelling_cases(tables, work_dir):
+    """
+    Zone polygons from the vertex table and one bulk site labelling
+    """
+    from Zone_index import ZoneIndex
+
+    zones_df, _, sites_df = tables
+    cache_dir = os.path.join(work_dir, "zone_cache")
+    site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+    site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+
+    def label():
+        zones = _prepared_zones(zones_df, cache_dir)
+        zone_index = ZoneIndex.from_zones_df(zones)
+        return zone_index.counts(
+            zone_index.locate_xy(site_lon, site_lat, predicate="covers")
+        )
+
+    yield "polygons_cold", lambda: _prepared_zones(zones_df, cache_dir)
+    yield "locate_covers", label
+
+
+def allocation_cases(tables, work_dir, modes=ALLOCATION_MODES,
+                     max_sites=ALLOCATION_MAX_SITES):
+    """
+    allocate_sites in every requested mode; yields None for runs over
+    the size limit
+    """
+    from Route_optimization import allocate_sites
+
+    zones_df, officers_df, sites_df = tables
+    zones = _prepared_zones(zones_df, os.path.join(work_dir, "zone_cache"))
+
+    # The reference for EXACT_MODES runs first
+    if "vectorized" in modes:
+        modes = ["vectorized"] + [m for m in modes if m != "vectorized"]
+
+    for mode in modes:
+        limit = min(max_sites, SCALAR_MAX_SITES) if mode == "scalar" \
+            else max_sites
+        if len(sites_df) > limit:
+            yield mode, None
+            continue
+        yield mode, lambda mode=mode: allocate_sites(
+            officers_df.copy(), sites_df, zones, mode=mode
+        )
+
+
+def check_allocation(row, result, reference):
+    """
+    Mark an EXACT_MODES row as an error when its allocation differs
+    from the vectorized one; returns the (new) reference
+    """
+    allocation_df = result[0]
+    if row["variant"] == "vectorized":
+        return allocation_df
+    if row["variant"] in EXACT_MODES and reference is not None:
+        columns = ["request_id", "assigned_FO_Id", "final_score"]
+        if not allocation_df[columns].equals(reference[columns]):
+            row.update(status="error", error=MISMATCH)
+    return reference
+
+
+def map_cases(tables, work_dir):
+    """
+    One clustered fast layer map and the per-zone bundle export
+    """
+    import folium
+
+    from Map_bundles import export_zone_bundles
+    from Map_layers import fast_point_layer
+    from Zone_index import ZoneIndex
+
+    zones_df, officers_df, sites_df = tables
+    zones = _prepared_zones(zones_df, os.path.join(work_dir, "zone_cache"))
+    zone_index = ZoneIndex.from_zones_df(zones)
+
+    site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+    site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+    officer_lat = officers_df["lat"].to_numpy(dtype=np.float64)
+    officer_lon = officers_df["long"].to_numpy(dtype=np.float64)
+    site_zone = zone_index.locate_xy(site_lon, site_lat, predicate="covers")
+
+    def fast_map():
+        m = folium.Map(location=[site_lat.mean(), site_lon.mean()],
+                       zoom_start=12, prefer_canvas=True)
+        fast_point_layer(
+            "Sites", site_lat, site_lon, sites_df["property_id"],
+            (site_zone < 0).astype(np.int64), ["blue", "black"],
+            popups={"Site ID": sites_df["property_id"],
+                    "Zone": zone_index.labels(site_zone, outside="Outside")},
+        ).add_to(m)
+        path = os.path.join(work_dir, "fast_map.html")
+        m.save(path)
+        return os.path.getsize(path)
+
+    def bundles():
+        return export_zone_bundles(
+            os.path.join(work_dir, "bundles"),
+            list(zone_index.zones), zone_index.polygons,
+            ["blue"] * len(zone_index),
+            site_lat, site_lon, sites_df["property_id"], site_zone,
+            officer_lat, officer_lon, officers_df["off_id"],
+            zone_index.locate_xy(officer_lon, officer_lat, predicate="covers"),
+        )
+
+    yield "fast_layer", fast_map
+    yield "zone_bundles", bundles
+
+
+# ============================================================
+# Runner
+# ============================================================
+
+def run_suite(site_counts, cases=CASES, modes=ALLOCATION_MODES, seed=0,
+              max_alloc_sites=ALLOCATION_MAX_SITES, trace_memory=True,
+              log=print):
+    """
+    Run every case at every scale, returns the report dict
+    """
+    results = []
+
+    for n_sites in site_counts:
+        tables = generate(n_sites, seed=seed)
+        zones_df, officers_df, _ = tables
+        scale = {"sites": n_sites, "officers": len(officers_df),
+                 "zones": len(zones_df)}
+
+        with tempfile.TemporaryDirectory(prefix="route_bench_") as work_dir:
+            for case in cases:
+                if case == "excel":
+                    variants = (
+                        excel_cases(tables, work_dir)
+                        if n_sites <= EXCEL_MAX_ROWS
+                        else [("write", None)]
+                    )
+                elif case == "labelling":
+                    variants = labelling_cases(tables, work_dir)
+                elif case == "allocation":
+                    variants = allocation_cases(
+                        tables, work_dir, modes, max_alloc_sites
+                    )
+                elif case == "maps":
+                    variants = map_cases(tables, work_dir)
+                else:
+                    raise ValueError(f"Unknown benchmark case: {case}")
+
+                reference = None
+                for variant, fn in variants:
+                    row = dict(case=case, variant=variant, **scale)
+                    if fn is None:
+                        row.update(status="skipped", seconds=None,
+                                   peak_mb=None)
+                    else:
+                        try:
+                            result, seconds, peak_mb = measure(
+                                fn, trace_memory=trace_memory
+                            )
+                            row.update(status="ok", seconds=seconds,
+                                       peak_mb=peak_mb)
+                            if case == "allocation":
+                                reference = check_allocation(
+                                    row, result, reference
+                                )
+                        except Exception as exc:
+                            row.update(status="error", seconds=None,
+                                       peak_mb=None,
+                                       error=f"{type(exc).__name__}: {exc}")
+                    results.append(row)
+                    log(format_row(row))
+
+    return {
+        "schema": REPORT_SCHEMA,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": _git_info(),
+        "environment": _environment(),
+        "config": {
+            "seed": seed, "sites": list(site_counts), "cases": list(cases),
+            "modes": list(modes), "max_alloc_sites": max_alloc_sites,
+            "trace_memory": trace_memory,
+        },
+        "results": results,
+    }
+
+
+# ============================================================
+# Report
+# ============================================================
+
+def format_row(row):
+    name = f"{row['case']}/{row['variant']}"
+    if row["status"] != "ok":
+        detail = row.get("error", "")
+        return f"{name:<28} {row['sites']:>9,} sites  {row['status']} {detail}"
+    peak = "" if row["peak_mb"] is None else f"  {row['peak_mb']:9.1f} MB"
+    return (f"{name:<28} {row['sites']:>9,} sites  "
+            f"{row['seconds']:9.3f} s{peak}")
+
+
+def save_report(report, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    if report.get("schema") != REPORT_SCHEMA:
+        raise ValueError(
+            f"{path}: report schema {report.get('schema')}, "
+            f"expected {REPORT_SCHEMA}"
+        )
+    return report
+
+
+def compare(old, new, tolerance=REGRESSION_TOLERANCE):
+    """
+    Rows present in both reports with their new / old time and memory
+    ratios; regression = either ratio above 1 + tolerance
+    """
+    def key(row):
+        return row["case"], row["variant"], row["sites"]
+
+    old_rows = {key(r): r for r in old["results"] if r["status"] == "ok"}
+    rows = []
+    for row in new["results"]:
+        before = old_rows.get(key(row))
+        if before is None or row["status"] != "ok":
+            continue
+
+        time_ratio = row["seconds"] / before["seconds"] \
+            if before["seconds"] else None
+        peak_ratio = (row["peak_mb"] / before["peak_mb"]
+                      if row["peak_mb"] is not None and before["peak_mb"]
+                      else None)
+        regression = any(
+            r is not None and r > 1 + tolerance
+            for r in (time_ratio, peak_ratio)
+        )
+        rows.append({
+            "case": row["case"], "variant": row["variant"],
+            "sites": row["sites"], "time_ratio": time_ratio,
+            "peak_ratio": peak_ratio, "regression": regression,
+        })
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'case':<28} {'sites':>9}  {'time':>7}  {'memory':>7}"]
+    for row in rows:
+        ratios = [
+            "    n/a" if r is None else f"{r:6.2f}x"
+            for r in (row["time_ratio"], row["peak_ratio"])
+        ]
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(f"{row['case'] + '/' + row['variant']:<28} "
+                     f"{row['sites']:>9,}  {ratios[0]}  {ratios[1]}{flag}")
+    return "\n".join(lines)
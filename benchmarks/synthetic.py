@@ -0,0 +1,170 @@
+# ============================================================
+# Seeded Synthetic Zones, Officers and Sites
+# ============================================================
+#
+# Zones are a jittered grid of quadrilaterals (lat1..lat4 / long1..long4)
+# around a city centre. Sites are clustered like real demand: most
+# fall around cluster centres (apartment complexes, streets), a share
+# repeats an earlier site's exact coordinates, the rest are uniform.
+# The same seed and scale always give the same tables.
+# ============================================================
+
+import numpy as np
+import pandas as pd
+
+from Geo_distance import KM_PER_DEG_LAT, KM_PER_DEG_LON
+
+# Default city centre and the side of the covered square
+CENTER_LAT = 12.9716
+CENTER_LON = 77.5946
+EXTENT_KM = 40.0
+
+# Default scale ratios against the site count
+SITES_PER_OFFICER = 50
+SITES_PER_ZONE = 2500
+
+# Site mix
+CLUSTER_SHARE = 0.7          # around cluster centres
+REPEAT_SHARE = 0.1           # exact copy of an earlier site
+SITES_PER_CLUSTER = 40
+CLUSTER_SIGMA_KM = 0.15
+
+# Vertex jitter, as a share of the zone side
+ZONE_JITTER = 0.15
+
+OFFICER_IDLE_SHARE = 0.6
+
+
+def _km_to_deg(center_lat):
+    return (1 / KM_PER_DEG_LAT,
+            1 / (KM_PER_DEG_LON * np.cos(np.radians(center_lat))))
+
+
+def make_zones(n_zones, rng, center_lat=CENTER_LAT, center_lon=CENTER_LON,
+               extent_km=EXTENT_KM):
+    """
+    Zone table with n_zones jittered grid cells (the grid may have a
+    few more cells; the first n_zones are kept)
+    """
+    deg_lat, deg_lon = _km_to_deg(center_lat)
+    cols = int(np.ceil(np.sqrt(n_zones)))
+    rows = int(np.ceil(n_zones / cols))
+
+    # Shared grid vertices, jittered once so neighbours stay adjacent
+    side_lat = extent_km * deg_lat / rows
+    side_lon = extent_km * deg_lon / cols
+    grid_lat = (center_lat - extent_km * deg_lat / 2
+                + np.arange(rows + 1)[:, None] * side_lat
+                + np.zeros((1, cols + 1)))
+    grid_lon = (center_lon - extent_km * deg_lon / 2
+                + np.arange(cols + 1)[None, :] * side_lon
+                + np.zeros((rows + 1, 1)))
+    inner = (slice(1, -1), slice(1, -1))
+    grid_lat[inner] += rng.uniform(-1, 1, grid_lat[inner].shape) \
+        * ZONE_JITTER * side_lat
+    grid_lon[inner] += rng.uniform(-1, 1, grid_lon[inner].shape) \
+        * ZONE_JITTER * side_lon
+
+    r, c = np.divmod(np.arange(n_zones), cols)
+    # Corners counter-clockwise: SW, SE, NE, NW
+    corners = [(r, c), (r, c + 1), (r + 1, c + 1), (r + 1, c)]
+
+    table = {"zone": [f"Z{z + 1}" for z in range(n_zones)]}
+    for i, (cr, cc) in enumerate(corners, 1):
+        table[f"lat{i}"] = grid_lat[cr, cc]
+        table[f"long{i}"] = grid_lon[cr, cc]
+    return pd.DataFrame(table)
+
+
+def random_points(n, rng, center_lat=CENTER_LAT, center_lon=CENTER_LON,
+                  extent_km=EXTENT_KM):
+    """
+    Uniform points over the covered square
+    """
+    deg_lat, deg_lon = _km_to_deg(center_lat)
+    half = extent_km / 2
+    return (center_lat + rng.uniform(-half, half, n) * deg_lat,
+            center_lon + rng.uniform(-half, half, n) * deg_lon)
+
+
+def make_sites(n_sites, rng, center_lat=CENTER_LAT, center_lon=CENTER_LON,
+               extent_km=EXTENT_KM):
+    """
+    Site table in the Property_la_lo / sites workbook layout
+    """
+    deg_lat, deg_lon = _km_to_deg(center_lat)
+    n_cluster = int(n_sites * CLUSTER_SHARE)
+    n_repeat = int(n_sites * REPEAT_SHARE)
+    n_uniform = n_sites - n_cluster - n_repeat
+
+    n_centres = max(1, n_cluster // SITES_PER_CLUSTER)
+    centre_lat, centre_lon = random_points(
+        n_centres, rng, center_lat, center_lon, extent_km
+    )
+    member = rng.integers(0, n_centres, n_cluster)
+    cluster_lat = (centre_lat[member]
+                   + rng.normal(0, CLUSTER_SIGMA_KM, n_cluster) * deg_lat)
+    cluster_lon = (centre_lon[member]
+                   + rng.normal(0, CLUSTER_SIGMA_KM, n_cluster) * deg_lon)
+
+    uniform_lat, uniform_lon = random_points(
+        n_uniform, rng, center_lat, center_lon, extent_km
+    )
+
+    lat = np.concatenate([cluster_lat, uniform_lat])
+    lon = np.concatenate([cluster_lon, uniform_lon])
+    if len(lat):
+        source = rng.integers(0, len(lat), n_repeat)
+        lat = np.concatenate([lat, lat[source]])
+        lon = np.concatenate([lon, lon[source]])
+
+    # Repeats and clusters spread through the table, as in real sheets
+    order = rng.permutation(len(lat))
+    ids = np.arange(1, n_sites + 1)
+    return pd.DataFrame({
+        "request_id": [f"REQ{i:07d}" for i in ids],
+        "customer_name": [f"Customer {i}" for i in ids],
+        "property_id": [f"P{i:07d}" for i in ids],
+        "property_latitude": lat[order],
+        "property_longitude": lon[order],
+    })
+
+
+def make_officers(n_officers, rng, center_lat=CENTER_LAT,
+                  center_lon=CENTER_LON, extent_km=EXTENT_KM):
+    """
+    Officer table in the officer workbook layout (allocator columns
+    plus the mapping scripts' off_id)
+    """
+    lat, lon = random_points(n_officers, rng, center_lat, center_lon,
+                             extent_km)
+    ids = [f"FO{i:05d}" for i in range(1, n_officers + 1)]
+    return pd.DataFrame({
+        "FO Id": ids,
+        "off_id": ids,
+        "Field officer Name": [f"Officer {i}"
+                               for i in range(1, n_officers + 1)],
+        "lat": lat,
+        "long": lon,
+        "Active (Y/N)": np.where(
+            rng.random(n_officers) < OFFICER_IDLE_SHARE, "Y", "N"
+        ),
+    })
+
+
+def generate(n_sites, n_officers=None, n_zones=None, seed=0, **area):
+    """
+    (zones_df, officers_df, sites_df) for one scale.
+    Officer and zone counts default to SITES_PER_OFFICER /
+    SITES_PER_ZONE ratios; area: center_lat, center_lon, extent_km
+    """
+    if n_officers is None:
+        n_officers = max(10, n_sites // SITES_PER_OFFICER)
+    if n_zones is None:
+        n_zones = max(4, n_sites // SITES_PER_ZONE)
+
+    rng = np.random.default_rng(seed)
+    zones_df = make_zones(n_zones, rng, **area)
+    officers_df = make_officers(n_officers, rng, **area)
+    sites_df = make_sites(n_sites, rng, **area)
+    return zones_df, officers_df, sites_df
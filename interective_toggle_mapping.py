@@ -1,10 +1,14 @@
-import pandas as pd
+import numpy as np
 import folium
 import matplotlib.cm as cm
 import matplotlib.colors as mcolors
-from shapely.geometry import Point, Polygon
 from folium.features import DivIcon
 
+from Data_loader import read_table
+from Map_layers import HIGH_VOLUME_SITES, ZoomLabels, fast_point_layer
+from Zone_geometry import vertex_arrays, zone_polygons
+from Zone_index import ZoneIndex
+
 # ===============================
 # 1. Read Excel files
 # ===============================
@@ -12,9 +16,14 @@ zone_file = "ZONE_INFO.xlsx"
 site_file = "Property_la_lo.xlsx"
 officer_file = "officer.xlsx"
 
-zones_df = pd.read_excel(zone_file)
-sites_df = pd.read_excel(site_file)
-officers_df = pd.read_excel(officer_file)
+# "markers": one folium marker + label per point
+# "fast"   : clustered compact layers (Map_layers), labels at high zoom
+# "auto"   : "fast" from HIGH_VOLUME_SITES sites
+render_mode = "auto"
+
+zones_df = read_table(zone_file)
+sites_df = read_table(site_file)
+officers_df = read_table(officer_file)
 
 # ===============================
 # 2. Prepare colors
@@ -28,8 +37,9 @@ def to_hex(color):
 # ===============================
 # 3. Create base map
 # ===============================
-center_lat = zones_df[["lat1", "lat2", "lat3", "lat4"]].values.mean()
-center_lon = zones_df[["long1", "long2", "long3", "long4"]].values.mean()
+vertex_lat, vertex_lon = vertex_arrays(zones_df)
+center_lat = np.nanmean(vertex_lat)
+center_lon = np.nanmean(vertex_lon)
 
 m = folium.Map(
     location=[center_lat, center_lon],
@@ -47,52 +57,47 @@ officer_layer = folium.FeatureGroup(name="Field Officers", show=True)
 # ===============================
 # 5. Build zone polygons
 # ===============================
-zone_polygons = {}
+zone_data = {}
 zone_site_count = {}
 
-for idx, row in zones_df.iterrows():
-    zone_id = row["zone_id"]
+for idx, (zone_id, polygon) in enumerate(
+    zip(zones_df["zone_id"], zone_polygons(zones_df))
+):
+    if polygon is None:
+        continue
     color = to_hex(cmap(idx))
 
-    polygon = Polygon([
-        (row["long1"], row["lat1"]),
-        (row["long2"], row["lat2"]),
-        (row["long3"], row["lat3"]),
-        (row["long4"], row["lat4"])
-    ])
-
-    zone_polygons[zone_id] = {
+    zone_data[zone_id] = {
         "polygon": polygon,
         "color": color
     }
     zone_site_count[zone_id] = 0
 
+zone_index = ZoneIndex(
+    [data["polygon"] for data in zone_data.values()],
+    zone_data.keys()
+)
+
 # ===============================
-# 6. Count sites per zone
+# 6. Label every site once & count sites per zone
 # ===============================
-for _, site in sites_df.iterrows():
-    point = Point(site["property_longitude"], site["property_latitude"])
+site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
 
-    for zone_id, data in zone_polygons.items():
-        polygon = data["polygon"]
-        if polygon.contains(point) or polygon.touches(point):
-            zone_site_count[zone_id] += 1
-            break
+site_zone = zone_index.locate_xy(site_lon, site_lat, predicate="covers")
+site_zone_label = zone_index.labels(site_zone, outside="Outside all zones")
+
+zone_site_count.update(zip(zone_index.zones, zone_index.counts(site_zone)))
 
 # ===============================
 # 7. Add zones to map
 # ===============================
-for idx, row in zones_df.iterrows():
-    zone_id = row["zone_id"]
-    color = zone_polygons[zone_id]["color"]
+for zone_id, data in zone_data.items():
+    color = data["color"]
     site_count = zone_site_count[zone_id]
 
     folium_coords = [
-        [row["lat1"], row["long1"]],
-        [row["lat2"], row["long2"]],
-        [row["lat3"], row["long3"]],
-        [row["lat4"], row["long4"]],
-        [row["lat1"], row["long1"]]
+        [lat, lon] for lon, lat in data["polygon"].exterior.coords
     ]
 
     folium.Polygon(
@@ -111,103 +116,119 @@ for idx, row in zones_df.iterrows():
 # ===============================
 # 8. Add sites (blue / black + visible labels)
 # ===============================
-for _, site in sites_df.iterrows():
-    site_id = site["property_id"]
-    lat = site["property_latitude"]
-    lon = site["property_longitude"]
-
-    point = Point(lon, lat)
-
-    inside_zone = False
-    zone_name = "Outside all zones"
-
-    for zid, data in zone_polygons.items():
-        polygon = data["polygon"]
-        if polygon.contains(point) or polygon.touches(point):
-            inside_zone = True
-            zone_name = zid
-            break
-
-    site_color = "blue" if inside_zone else "black"
+high_volume = render_mode == "fast" or (
+    render_mode == "auto" and len(sites_df) >= HIGH_VOLUME_SITES
+)
 
-    # Site marker
-    folium.CircleMarker(
-        location=[lat, lon],
-        radius=6,
-        color=site_color,
-        fill=True,
-        fill_color=site_color,
-        fill_opacity=1,
-        popup=f"""
-        <b>Site ID:</b> {site_id}<br>
-        <b>Zone:</b> {zone_name}<br>
-        <b>Latitude:</b> {lat}<br>
-        <b>Longitude:</b> {lon}
-        """
-    ).add_to(site_layer)
-
-    # Always-visible Site ID
-    folium.Marker(
-        location=[lat, lon],
-        icon=DivIcon(
-            icon_size=(120, 30),
-            icon_anchor=(0, 0),
-            html=f"""
-            <div style="
-                font-size:10px;
-                font-weight:bold;
-                color:{site_color};
-                background:white;
-                padding:1px 3px;
-                border-radius:3px;
-                border:1px solid #999;
-            ">
-                {site_id}
-            </div>
+if high_volume:
+    site_layer = fast_point_layer(
+        "Sites", site_lat, site_lon, sites_df["property_id"],
+        site_zone < 0, ["blue", "black"],
+        popups={
+            "Site ID": sites_df["property_id"],
+            "Zone": site_zone_label,
+            "Latitude": site_lat,
+            "Longitude": site_lon,
+        },
+    )
+else:
+    for i, site_id in enumerate(sites_df["property_id"]):
+        lat, lon = site_lat[i], site_lon[i]
+        zone_name = site_zone_label[i]
+
+        site_color = "blue" if site_zone[i] >= 0 else "black"
+
+        # Site marker
+        folium.CircleMarker(
+            location=[lat, lon],
+            radius=6,
+            color=site_color,
+            fill=True,
+            fill_color=site_color,
+            fill_opacity=1,
+            popup=f"""
+            <b>Site ID:</b> {site_id}<br>
+            <b>Zone:</b> {zone_name}<br>
+            <b>Latitude:</b> {lat}<br>
+            <b>Longitude:</b> {lon}
             """
-        )
-    ).add_to(site_layer)
+        ).add_to(site_layer)
+
+        # Always-visible Site ID
+        folium.Marker(
+            location=[lat, lon],
+            icon=DivIcon(
+                icon_size=(120, 30),
+                icon_anchor=(0, 0),
+                html=f"""
+                <div style="
+                    font-size:10px;
+                    font-weight:bold;
+                    color:{site_color};
+                    background:white;
+                    padding:1px 3px;
+                    border-radius:3px;
+                    border:1px solid #999;
+                ">
+                    {site_id}
+                </div>
+                """
+            )
+        ).add_to(site_layer)
 
 # ===============================
 # 9. Add field officers (with visible labels)
 # ===============================
-for _, officer in officers_df.iterrows():
-    off_id = officer["off_id"]
-    lat = officer["lat"]
-    lon = officer["long"]
-
-    # Officer marker
-    folium.Marker(
-        location=[lat, lon],
-        popup=f"""
-        <b>Officer ID:</b> {off_id}<br>
-        <b>Latitude:</b> {lat}<br>
-        <b>Longitude:</b> {lon}
-        """,
-        icon=folium.Icon(color="red", icon="user", prefix="fa")
-    ).add_to(officer_layer)
-
-    # Always-visible Officer ID
-    folium.Marker(
-        location=[lat, lon],
-        icon=DivIcon(
-            icon_size=(120, 30),
-            icon_anchor=(0, 0),
-            html=f"""
-            <div style="
-                font-size:11px;
-                font-weight:bold;
-                color:red;
-                background:white;
-                padding:2px 4px;
-                border-radius:4px;
-                border:1px solid red;
-            ">
-                {off_id}
-            </div>
-            """
-        )
-    ).add_to(officer_layer)
+if high_volume:
+    officer_lat = officers_df["lat"].to_numpy(dtype=np.float64)
+    officer_lon = officers_df["long"].to_numpy(dtype=np.float64)
+    officer_layer = fast_point_layer(
+        "Field Officers", officer_lat, officer_lon, officers_df["off_id"],
+        np.zeros(len(officers_df)), ["red"], radius=8,
+        popups={
+            "Officer ID": officers_df["off_id"],
+            "Latitude": officer_lat,
+            "Longitude": officer_lon,
+        },
+    )
+else:
+    for _, officer in officers_df.iterrows():
+        off_id = officer["off_id"]
+        lat = officer["lat"]
+        lon = officer["long"]
+
+        # Officer marker
+        folium.Marker(
+            location=[lat, lon],
+            popup=f"""
+            <b>Officer ID:</b> {off_id}<br>
+            <b>Latitude:</b> {lat}<br>
+            <b>Longitude:</b> {lon}
+            """,
+            icon=folium.Icon(color="red", icon="user", prefix="fa")
+        ).add_to(officer_layer)
+
+        # Always-visible Officer ID
+        folium.Marker(
+            location=[lat, lon],
+            icon=DivIcon(
+                icon_size=(120, 30),
+                icon_anchor=(0, 0),
+                html=f"""
+                <div style="
+                    font-size:11px;
+                    font-weight:bold;
+                    color:red;
+                    background:white;
+                    padding:2px 4px;
+                    border-radius:4px;
+                    border:1px solid red;
+                ">
+                    {off_id}
+                </div>
+                """
+            )
+        ).add_to(officer_layer)
 
 # ===============================
 # 10. Add layers & controls
@@ -216,6 +237,9 @@ zone_layer.add_to(m)
 site_layer.add_to(m)
 officer_layer.add_to(m)
 
+if high_volume:
+    m.add_child(ZoomLabels())
+
 folium.LayerControl(collapsed=False).add_to(m)
 
 # ===============================
@@ -1,11 +1,15 @@
-import pandas as pd
 import folium
 import matplotlib.cm as cm
 import matplotlib.colors as mcolors
-import re
-from shapely.geometry import Point, Polygon
+import numpy as np
 from folium.features import DivIcon
 
+from Data_loader import read_table
+from Map_bundles import export_zone_bundles
+from Map_layers import HIGH_VOLUME_SITES, ZoomLabels, fast_point_layer
+from Zone_geometry import vertex_arrays, zone_polygons
+from Zone_index import ZoneIndex
+
 # =====================================================
 # 1. FILE PATHS
 # =====================================================
@@ -13,68 +17,39 @@ ZONE_FILE = "Data_Zone-2.xlsx"
 SITE_FILE = "Property_la_lo.xlsx"
 OFFICER_FILE = "officer.xlsx"
 
-# =====================================================
-# 2. READ EXCEL FILES
-# =====================================================
-zones_df = pd.read_excel(ZONE_FILE)
-sites_df = pd.read_excel(SITE_FILE)
-officers_df = pd.read_excel(OFFICER_FILE)
+# "markers": one folium marker + label per point
+# "fast"   : clustered compact layers (Map_layers), labels at high zoom
+# "auto"   : "fast" from HIGH_VOLUME_SITES sites
+RENDER_MODE = "auto"
 
-# =====================================================
-# 3. CLEAN & NORMALIZE ZONE COLUMN NAMES (EXCEL SAFE)
-# =====================================================
-zones_df.columns = (
-    zones_df.columns
-    .astype(str)
-    .str.lower()
-    .str.replace(r"_x000d_", "", regex=True)
-    .str.replace(r"\s+", "", regex=True)
-)
+# "single" : one HTML map with every zone, site and officer
+# "bundles": light index map + per-zone files loaded on demand
+EXPORT_MODE = "single"
+BUNDLE_DIR = "zone_site_officer_map"
 
 # =====================================================
+# 2. READ EXCEL FILES
+# 3. CLEAN & NORMALIZE COLUMN NAMES (EXCEL SAFE)
 # 4. FORCE LAT/LONG COLUMNS TO NUMERIC
 # =====================================================
-for col in zones_df.columns:
-    if col.startswith("lat") or col.startswith("long"):
-        zones_df[col] = pd.to_numeric(zones_df[col], errors="coerce")
+# read_table does all three, cached until the workbook changes
+zones_df = read_table(ZONE_FILE)
+sites_df = read_table(SITE_FILE)
+officers_df = read_table(OFFICER_FILE)
 
 # =====================================================
 # 5. DETECT & SORT LAT/LONG COLUMNS (REGEX SAFE)
 # =====================================================
-lat_cols = [c for c in zones_df.columns if c.startswith("lat")]
-lon_cols = [c for c in zones_df.columns if c.startswith("long")]
-
-def extract_index(col):
-    m = re.search(r"\d+", col)
-    return int(m.group()) if m else 0
-
-lat_cols.sort(key=extract_index)
-lon_cols.sort(key=extract_index)
-
-if not lat_cols or not lon_cols:
-    raise ValueError(f"❌ No lat/long columns found: {zones_df.columns.tolist()}")
+vertex_lat, vertex_lon = vertex_arrays(zones_df)
 
 # =====================================================
 # 6. MAP CENTER (100% TYPE SAFE)
 # =====================================================
-all_lats, all_lons = [], []
-
-for _, row in zones_df.iterrows():
-    for lat_c, lon_c in zip(lat_cols, lon_cols):
-        lat = row[lat_c]
-        lon = row[lon_c]
-        if pd.notna(lat) and pd.notna(lon):
-            try:
-                all_lats.append(float(lat))
-                all_lons.append(float(lon))
-            except ValueError:
-                continue
-
-if not all_lats or not all_lons:
+if not np.isfinite(vertex_lat).any() or not np.isfinite(vertex_lon).any():
     raise ValueError("❌ No valid zone coordinates found")
 
-center_lat = sum(all_lats) / len(all_lats)
-center_lon = sum(all_lons) / len(all_lons)
+center_lat = np.nanmean(vertex_lat)
+center_lon = np.nanmean(vertex_lon)
 
 m = folium.Map(
     location=[center_lat, center_lon],
@@ -98,152 +73,171 @@ def to_hex(c): return mcolors.to_hex(c)
 # =====================================================
 # 9. BUILD ZONE POLYGONS
 # =====================================================
-zone_polygons = {}
+zone_data = {}
 zone_site_count = {}
 
-for idx, row in zones_df.iterrows():
-    zone_id = row["zone"]
-    coords = []
-
-    for lat_c, lon_c in zip(lat_cols, lon_cols):
-        lat = row[lat_c]
-        lon = row[lon_c]
-        if pd.notna(lat) and pd.notna(lon):
-            try:
-                coords.append((float(lon), float(lat)))
-            except ValueError:
-                continue
-
-    if len(coords) < 3:
+for idx, (zone_id, polygon) in enumerate(
+    zip(zones_df["zone"], zone_polygons(zones_df))
+):
+    # Zones with fewer than 3 vertices have no polygon
+    if polygon is None:
         continue
 
-    zone_polygons[zone_id] = {
-        "polygon": Polygon(coords),
-        "coords": coords,
+    zone_data[zone_id] = {
+        "polygon": polygon,
+        "coords": list(polygon.exterior.coords)[:-1],
         "color": to_hex(cmap(idx))
     }
 
     zone_site_count[zone_id] = 0
 
-# =====================================================
-# 10. COUNT SITES PER ZONE
-# =====================================================
-for _, site in sites_df.iterrows():
-    try:
-        point = Point(float(site["property_longitude"]), float(site["property_latitude"]))
-    except Exception:
-        continue
-
-    for zid, data in zone_polygons.items():
-        if data["polygon"].contains(point) or data["polygon"].touches(point):
-            zone_site_count[zid] += 1
-            break
-
-# =====================================================
-# 11. ADD ZONES TO MAP
-# =====================================================
-for zid, data in zone_polygons.items():
-    folium_coords = [[lat, lon] for lon, lat in data["coords"]]
-
-    folium.Polygon(
-        locations=folium_coords,
-        color=data["color"],
-        fill=True,
-        fill_color=data["color"],
-        fill_opacity=0.35,
-        tooltip=f"Zone {zid} | Sites: {zone_site_count[zid]}",
-        popup=f"<b>Zone:</b> {zid}<br><b>Total Sites:</b> {zone_site_count[zid]}"
-    ).add_to(zone_layer)
+zone_index = ZoneIndex(
+    [data["polygon"] for data in zone_data.values()],
+    zone_data.keys()
+)
 
 # =====================================================
-# 12. ADD SITES
-# =====================================================
-for _, site in sites_df.iterrows():
-    try:
-        site_id = site["property_id"]
-        lat = float(site["property_latitude"])
-        lon = float(site["property_longitude"])
-    except Exception:
-        continue
-
-    point = Point(lon, lat)
-    inside = False
-    zone_name = "Outside"
-
-    for zid, data in zone_polygons.items():
-        if data["polygon"].contains(point) or data["polygon"].touches(point):
-            inside = True
-            zone_name = zid
-            break
-
-    color = "blue" if inside else "black"
-
-    folium.CircleMarker(
-        location=[lat, lon],
-        radius=6,
-        color=color,
-        fill=True,
-        fill_color=color,
-        fill_opacity=1,
-        popup=f"<b>Site ID:</b> {site_id}<br><b>Zone:</b> {zone_name}"
-    ).add_to(site_layer)
-
-    folium.Marker(
-        location=[lat, lon],
-        icon=DivIcon(
-            icon_size=(30, 30),
-            icon_anchor=(0, 0),
-            html=f"""
-            <div style="font-size:10px;font-weight:bold;color:{color};
-                        background:white;padding:1px 4px;
-                        border:1px solid #888;border-radius:3px;">
-                {site_id}
-            </div>
-            """
+# 10. LABEL EVERY SITE ONCE & COUNT SITES PER ZONE
+# =====================================================
+site_lat = sites_df["property_latitude"].to_numpy(dtype=np.float64)
+site_lon = sites_df["property_longitude"].to_numpy(dtype=np.float64)
+site_valid = np.isfinite(site_lat) & np.isfinite(site_lon)
+
+# inside OR on boundary, one bulk STRtree query for all sites
+site_zone = zone_index.locate_xy(site_lon, site_lat, predicate="covers")
+site_zone_label = zone_index.labels(site_zone, outside="Outside")
+
+zone_site_count.update(zip(zone_index.zones, zone_index.counts(site_zone)))
+
+if EXPORT_MODE == "bundles":
+    officer_lat = officers_df["lat"].to_numpy(dtype=np.float64)
+    officer_lon = officers_df["long"].to_numpy(dtype=np.float64)
+
+    index_path = export_zone_bundles(
+        BUNDLE_DIR,
+        list(zone_index.zones), zone_index.polygons,
+        [data["color"] for data in zone_data.values()],
+        site_lat, site_lon, sites_df["property_id"], site_zone,
+        officer_lat, officer_lon, officers_df["off_id"],
+        zone_index.locate_xy(officer_lon, officer_lat, predicate="covers"),
+    )
+    print(f"✅ Zone bundles generated successfully: {index_path}")
+else:
+    # =====================================================
+    # 11. ADD ZONES TO MAP
+    # =====================================================
+    for zid, data in zone_data.items():
+        folium_coords = [[lat, lon] for lon, lat in data["coords"]]
+
+        folium.Polygon(
+            locations=folium_coords,
+            color=data["color"],
+            fill=True,
+            fill_color=data["color"],
+            fill_opacity=0.35,
+            tooltip=f"Zone {zid} | Sites: {zone_site_count[zid]}",
+            popup=f"<b>Zone:</b> {zid}<br><b>Total Sites:</b> {zone_site_count[zid]}"
+        ).add_to(zone_layer)
+
+    # =====================================================
+    # 12. ADD SITES
+    # =====================================================
+    high_volume = RENDER_MODE == "fast" or (
+        RENDER_MODE == "auto" and len(sites_df) >= HIGH_VOLUME_SITES
+    )
+
+    if high_volume:
+        site_layer = fast_point_layer(
+            "Sites", site_lat, site_lon, sites_df["property_id"],
+            site_zone < 0, ["blue", "black"],
+            popups={"Site ID": sites_df["property_id"], "Zone": site_zone_label},
         )
-    ).add_to(site_layer)
-
-# =====================================================
-# 13. ADD FIELD OFFICERS
-# =====================================================
-for _, off in officers_df.iterrows():
-    try:
-        off_id = off["off_id"]
-        lat = float(off["lat"])
-        lon = float(off["long"])
-    except Exception:
-        continue
-
-    folium.Marker(
-        location=[lat, lon],
-        icon=folium.Icon(color="red", icon="user", prefix="fa"),
-        popup=f"<b>Officer ID:</b> {off_id}"
-    ).add_to(officer_layer)
-
-    folium.Marker(
-        location=[lat, lon],
-        icon=DivIcon(
-            icon_size=(30, 30),
-            icon_anchor=(0, 0),
-            html=f"""
-            <div style="font-size:11px;font-weight:bold;color:red;
-                        background:white;padding:2px 4px;
-                        border:1px solid red;border-radius:4px;">
-                {off_id}
-            </div>
-            """
+    else:
+        for i in np.flatnonzero(site_valid):
+            site_id = sites_df["property_id"].iat[i]
+            lat, lon = site_lat[i], site_lon[i]
+            zone_name = site_zone_label[i]
+
+            color = "blue" if site_zone[i] >= 0 else "black"
+
+            folium.CircleMarker(
+                location=[lat, lon],
+                radius=6,
+                color=color,
+                fill=True,
+                fill_color=color,
+                fill_opacity=1,
+                popup=f"<b>Site ID:</b> {site_id}<br><b>Zone:</b> {zone_name}"
+            ).add_to(site_layer)
+
+            folium.Marker(
+                location=[lat, lon],
+                icon=DivIcon(
+                    icon_size=(30, 30),
+                    icon_anchor=(0, 0),
+                    html=f"""
+                    <div style="font-size:10px;font-weight:bold;color:{color};
+                                background:white;padding:1px 4px;
+                                border:1px solid #888;border-radius:3px;">
+                        {site_id}
+                    </div>
+                    """
+                )
+            ).add_to(site_layer)
+
+    # =====================================================
+    # 13. ADD FIELD OFFICERS
+    # =====================================================
+    if high_volume:
+        officer_layer = fast_point_layer(
+            "Field Officers",
+            officers_df["lat"].to_numpy(dtype=np.float64),
+            officers_df["long"].to_numpy(dtype=np.float64),
+            officers_df["off_id"], np.zeros(len(officers_df)), ["red"],
+            radius=8, popups={"Officer ID": officers_df["off_id"]},
         )
-    ).add_to(officer_layer)
-
-# =====================================================
-# 14. FINALIZE MAP
-# =====================================================
-zone_layer.add_to(m)
-site_layer.add_to(m)
-officer_layer.add_to(m)
-
-folium.LayerControl(collapsed=False).add_to(m)
-
-m.save("yagyank_interactive_zone_site_officer_map.html")
+    else:
+        for _, off in officers_df.iterrows():
+            try:
+                off_id = off["off_id"]
+                lat = float(off["lat"])
+                lon = float(off["long"])
+            except Exception:
+                continue
 
-print("✅ Map generated successfully: updates_interactive_zone_site_officer_map.html")
\ No newline at end of file
+            folium.Marker(
+                location=[lat, lon],
+                icon=folium.Icon(color="red", icon="user", prefix="fa"),
+                popup=f"<b>Officer ID:</b> {off_id}"
+            ).add_to(officer_layer)
+
+            folium.Marker(
+                location=[lat, lon],
+                icon=DivIcon(
+                    icon_size=(30, 30),
+                    icon_anchor=(0, 0),
+                    html=f"""
+                    <div style="font-size:11px;font-weight:bold;color:red;
+                                background:white;padding:2px 4px;
+                                border:1px solid red;border-radius:4px;">
+                        {off_id}
+                    </div>
+                    """
+                )
+            ).add_to(officer_layer)
+
+    # =====================================================
+    # 14. FINALIZE MAP
+    # =====================================================
+    zone_layer.add_to(m)
+    site_layer.add_to(m)
+    officer_layer.add_to(m)
+
+    if high_volume:
+        m.add_child(ZoomLabels())
+
+    folium.LayerControl(collapsed=False).add_to(m)
+
+    m.save("yagyank_interactive_zone_site_officer_map.html")
+
+    print("✅ Map generated successfully: updates_interactive_zone_site_officer_map.html")
\ No newline at end of file